@@ -0,0 +1,3 @@
+"""
+Benchmarks de desempenho e precisão do NotaLAB com sinais sintéticos.
+"""
@@ -0,0 +1,465 @@
+"""
+Executa os benchmarks de desempenho e precisão e compara com a baseline.
+
+Cada cenário gera um sinal sintético com gabarito conhecido (ver
+benchmarks/sinais.py), mede o tempo de cada etapa do pipeline em vários
+tamanhos de faixa e pontua o resultado de 0 a 1. Os números são comparados
+com os gravados em benchmarks/baseline.json: uma queda de pontuação ou um
+aumento de tempo além da tolerância faz o script terminar com erro.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.executar
+    python -m benchmarks.executar --duracoes 10 30 --repeticoes 1
+    python -m benchmarks.executar --atualizar-baseline
+
+Os tempos dependem da máquina: depois de trocar de computador, gere uma
+baseline nova com --atualizar-baseline antes de comparar. Etapas com
+pontuação zero não entram numa baseline nova (só com --aceitar-falhas), para
+que uma falha não vire a referência.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+import config.config as config
+from benchmarks import sinais
+
+# Arquivo com os resultados de referência
+CAMINHO_BASELINE = Path(__file__).parent / 'baseline.json'
+
+# Durações (segundos) das faixas sintéticas
+DURACOES_PADRAO = (10, 30, 60)
+
+# Quanto o tempo de uma etapa pode crescer em relação à baseline (0.5 = 50%)
+# antes de ser considerado regressão. Tempos abaixo de FOLGA_TEMPO_S de
+# diferença são ignorados (ruído de medição em etapas muito rápidas).
+TOLERANCIA_TEMPO = 0.5
+FOLGA_TEMPO_S = 0.05
+
+# Quanto a pontuação (0 a 1) pode cair antes de ser considerada regressão
+TOLERANCIA_PONTUACAO = 0.02
+
+# Tonalidades relativas (a mesma armadura de clave) valem meio ponto
+_RELATIVAS = {'maior': ('menor', 9), 'menor': ('maior', 3)}
+
+
+def _cronometrar(funcao, repeticoes):
+    """Executa a função `repeticoes` vezes e retorna (resultado, menor tempo)."""
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return resultado, melhor
+
+
+def pontuar_tom(detectado, esperado):
+    """1 para a tonalidade exata, 0.5 para a relativa, 0 caso contrário."""
+    from src.notalab.escalas import NOTAS
+
+    if detectado == esperado:
+        return 1.0
+    tonica, modo = esperado
+    modo_relativo, salto = _RELATIVAS[modo]
+    relativa = (NOTAS[(NOTAS.index(tonica) + salto) % 12], modo_relativo)
+    return 0.5 if detectado == relativa else 0.0
+
+
+def pontuar_bpm(detectado, esperado, tolerancia=0.04):
+    """
+    1 para o BPM certo, 0.5 para metade/dobro, 0 caso contrário.
+
+    A tolerância é relativa (0.04 = 4%), porque a resolução do tempograma
+    perto de 120 BPM já é de ~3 BPM.
+    """
+    if abs(detectado - esperado) <= tolerancia * esperado:
+        return 1.0
+    if any(
+        abs(detectado - esperado * f) <= tolerancia * esperado * f
+        for f in (0.5, 2.0)
+    ):
+        return 0.5
+    return 0.0
+
+
+def pontuar_acordes(detectados, esperados):
+    """Fração dos compassos do gabarito com o acorde certo."""
+    acertos = sum(int(d) == e for d, e in zip(detectados, esperados))
+    return acertos / len(esperados)
+
+
+def _grade(eventos, passo):
+    """Expande (midi, duração) numa grade de `passo` quarter notes."""
+    return np.repeat(
+        [midi for midi, _ in eventos],
+        [max(0, int(round(dur / passo))) for _, dur in eventos],
+    )
+
+
+def pontuar_notas(detectadas, gabarito, passo=0.25):
+    """
+    Precisão de pitch ao longo do tempo: fração das células da grade (em
+    quarter notes) em que a nota detectada é igual à do gabarito. Células
+    a mais ou a menos contam como erro.
+    """
+    previsto = _grade(sinais.nomes_para_midi(detectadas), passo)
+    referencia = _grade(gabarito, passo)
+    n = min(len(previsto), len(referencia))
+    acertos = np.count_nonzero(previsto[:n] == referencia[:n])
+    return acertos / max(len(previsto), len(referencia), 1)
+
+
+def pontuar_harmonias(harmonias, melodia, tom, modo):
+    """
+    Fração dos eventos em que todas as vozes têm a duração da melodia, o
+    Soprano é a própria melodia e as vozes de apoio estão na escala e dentro
+    da tessitura (TESSITURAS em config.py).
+    """
+    from src.notalab.escalas import tabela_escala
+
+    escala = {int(m) % 12 for m in tabela_escala(tom, modo, 0, 0)}
+    esperado = sinais.nomes_para_midi(melodia)
+    vozes = {voz: sinais.nomes_para_midi(notas) for voz, notas in harmonias.items()}
+    validos = 0
+    for i, (midi, duracao) in enumerate(esperado):
+        ok = vozes['Soprano'][i] == (midi, duracao)
+        for voz, (minimo, maximo) in config.TESSITURAS.items():
+            nota, dur = vozes[voz][i]
+            if dur != duracao or (nota < 0) != (midi < 0):
+                ok = False
+            elif midi >= 0 and (nota % 12 not in escala or not minimo <= nota <= maximo):
+                ok = False
+        validos += ok
+    return validos / max(len(esperado), 1)
+
+
+def pontuar_partitura(partitura, harmonias):
+    """1 se a partitura tem um elemento por evento e a duração total certa."""
+    parte = partitura.parts[0]
+    eventos = list(zip(*harmonias.values()))
+    total = sum(eventos_voz[0][1] for eventos_voz in eventos)
+    elementos = len(parte.notesAndRests)
+    return float(elementos == len(eventos) and abs(parte.highestTime - total) < 1e-6)
+
+
+def pontuar_smf(caminho, harmonias):
+    """1 se cada voz do arquivo MIDI tem o número certo de notas e a duração."""
+    import mido
+
+    arquivo = mido.MidiFile(caminho)
+    trilhas = {trilha.name: trilha for trilha in arquivo.tracks}
+    for voz, notas in harmonias.items():
+        trilha = trilhas.get(voz)
+        if trilha is None:
+            return 0.0
+        n_notas = sum(m.type == 'note_on' and m.velocity > 0 for m in trilha)
+        esperado = sum(nome != 'rest' for nome, _ in notas)
+        fim = sum(m.time for m in trilha) / arquivo.ticks_per_beat
+        ultima = max(
+            (i for i, (nome, _) in enumerate(notas) if nome != 'rest'), default=-1
+        )
+        duracao = sum(dur for _, dur in notas[: ultima + 1])
+        if n_notas != esperado or abs(fim - duracao) > 1e-3:
+            return 0.0
+    return 1.0
+
+
+def _cenario_melodia(duracao, taxa, repeticoes, pasta):
+    import soundfile as sf
+
+    from src.notalab.audio import detectar_tom
+    from src.notalab.escalas import nome_de_midi
+    from src.notalab.harmonia import extrair_notas_vocal, gerar_harmonias_vocais
+    from src.notalab.notacao import montar_harmonia
+    from src.notalab.pipeline import exportar_midi
+
+    tom, modo, bpm = 'D', 'maior', 100
+    sinal, gabarito = sinais.melodia(tom, modo, bpm, duracao, taxa)
+    caminho = os.path.join(pasta, f'melodia_{duracao}.wav')
+    sf.write(caminho, sinal, taxa)
+
+    resultados = {}
+    detectado, segundos = _cronometrar(
+        lambda: detectar_tom(sinal, taxa), repeticoes
+    )
+    resultados['detectar_tom'] = (segundos, pontuar_tom(detectado, (tom, modo)))
+
+    notas, segundos = _cronometrar(
+        # Sem o cache de etapas: cada repetição mede o rastreamento de pitch
+        lambda: extrair_notas_vocal(
+            caminho, bpm=bpm, tom=tom, modo=modo, memorizar_pitch=False
+        ),
+        repeticoes,
+    )
+    resultados['extrair_notas_vocal'] = (segundos, pontuar_notas(notas, gabarito))
+
+    # As etapas seguintes usam o gabarito como melodia, para que a pontuação
+    # não dependa da qualidade da transcrição
+    melodia = [
+        ('rest' if midi < 0 else nome_de_midi(midi), dur)
+        for midi, dur in gabarito
+    ]
+    harmonias, segundos = _cronometrar(
+        lambda: gerar_harmonias_vocais(melodia, tom=tom, modo=modo), repeticoes
+    )
+    resultados['gerar_harmonias_vocais'] = (
+        segundos,
+        pontuar_harmonias(harmonias, melodia, tom, modo),
+    )
+
+    partitura, segundos = _cronometrar(
+        lambda: montar_harmonia(harmonias), repeticoes
+    )
+    resultados['montar_harmonia'] = (
+        segundos,
+        pontuar_partitura(partitura, harmonias),
+    )
+
+    caminho_midi = os.path.join(pasta, f'melodia_{duracao}.mid')
+    _, segundos = _cronometrar(
+        lambda: exportar_midi(harmonias, caminho_midi, bpm=bpm), repeticoes
+    )
+    resultados['exportar_midi'] = (segundos, pontuar_smf(caminho_midi, harmonias))
+    return resultados
+
+
+def _cenario_cliques(duracao, taxa, repeticoes, pasta):
+    from src.notalab.audio import detectar_bpm
+
+    sinal, bpm = sinais.trilha_cliques(120, duracao, taxa)
+    detectado, segundos = _cronometrar(
+        lambda: detectar_bpm(sinal, taxa), repeticoes
+    )
+    return {'detectar_bpm': (segundos, pontuar_bpm(detectado, bpm))}
+
+
+def _cenario_progressao(duracao, taxa, repeticoes, pasta):
+    import soundfile as sf
+
+    from src.notalab.audio import detectar_acordes, detectar_bpm, detectar_tom
+    from src.notalab.streaming import analisar_em_blocos
+
+    # Am - F - C - G7: também é vi-IV-I-V7 de C maior, então o detector de
+    # tom pode ficar com a relativa (meio ponto) sem estar errado
+    bpm = 96
+    sinal, gabarito = sinais.progressao([21, 5, 0, 31], bpm, duracao, taxa)
+
+    resultados = {}
+    detectado, segundos = _cronometrar(
+        lambda: detectar_tom(sinal, taxa), repeticoes
+    )
+    resultados['detectar_tom'] = (segundos, pontuar_tom(detectado, ('A', 'menor')))
+
+    (detectado, batidas), segundos = _cronometrar(
+        lambda: detectar_bpm(sinal, taxa, retornar_batidas=True), repeticoes
+    )
+    resultados['detectar_bpm'] = (segundos, pontuar_bpm(detectado, bpm))
+
+    acordes, segundos = _cronometrar(
+        lambda: detectar_acordes(
+            sinal, taxa, bpm=detectado, batidas=batidas, completo=True
+        ),
+        repeticoes,
+    )
+    resultados['detectar_acordes'] = (segundos, pontuar_acordes(acordes, gabarito))
+
+    # A análise em blocos não tem as batidas: pontua a concordância dos seus
+    # acordes com os da análise completa (mesma fase de compasso)
+    caminho = os.path.join(pasta, f'progressao_{duracao}.wav')
+    sf.write(caminho, sinal, taxa)
+    blocos, segundos = _cronometrar(
+        lambda: analisar_em_blocos(caminho), repeticoes
+    )
+    resultados['analisar_em_blocos'] = (
+        segundos,
+        pontuar_acordes(blocos['acordes'], acordes),
+    )
+    return resultados
+
+
+# Cenários: nome -> função (duracao, taxa, repeticoes, pasta) -> resultados
+CENARIOS = {
+    'melodia': _cenario_melodia,
+    'cliques': _cenario_cliques,
+    'progressao': _cenario_progressao,
+}
+
+
+def _aquecer(taxa):
+    """
+    Roda cada etapa uma vez num sinal curto, fora da medição, para que a
+    importação dos módulos e a compilação JIT do numba não contem como tempo
+    da primeira etapa medida.
+    """
+    from src.notalab.audio import detectar_acordes, detectar_bpm, detectar_tom
+    from src.notalab.contexto import ContextoAnalise
+    from src.notalab.harmonia import gerar_harmonias_vocais, rastrear_pitch
+    from src.notalab.notacao import montar_harmonia
+
+    sinal, _ = sinais.progressao([0], 120, 2.0, taxa)
+    detectar_tom(sinal, taxa)
+    detectar_acordes(sinal, taxa, batidas=detectar_bpm(sinal, taxa, True)[1])
+    ContextoAnalise(sinal, taxa).para_etapa('onsets').envelope_onset
+    rastrear_pitch(sinal[: taxa // 2], taxa)
+    montar_harmonia(gerar_harmonias_vocais([('C4', 1.0), ('rest', 1.0)]))
+
+
+def executar_benchmarks(duracoes=DURACOES_PADRAO, repeticoes=3, taxa=44100):
+    """
+    Executa todos os cenários em todas as durações.
+
+    Returns:
+        dict: 'cenario/duracao/etapa' -> {'segundos', 'pontuacao'}
+    """
+    _aquecer(taxa)
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        for nome, cenario in CENARIOS.items():
+            for duracao in duracoes:
+                etapas = cenario(duracao, taxa, repeticoes, pasta)
+                for etapa, (segundos, pontuacao) in etapas.items():
+                    chave = f'{nome}/{duracao}s/{etapa}'
+                    resultados[chave] = {
+                        'segundos': round(segundos, 4),
+                        'pontuacao': round(float(pontuacao), 4),
+                    }
+                    print(f'{chave:45s} {segundos:8.3f} s   pontuação {pontuacao:.3f}')
+    return resultados
+
+
+def comparar_com_baseline(
+    resultados,
+    baseline,
+    tolerancia_tempo=TOLERANCIA_TEMPO,
+    tolerancia_pontuacao=TOLERANCIA_PONTUACAO,
+):
+    """
+    Compara os resultados com a baseline.
+
+    Returns:
+        list: Mensagens de regressão (vazia se tudo estiver dentro da tolerância)
+    """
+    regressoes = []
+    for chave, atual in resultados.items():
+        referencia = baseline.get(chave)
+        if referencia is None:
+            print(f'[novo] {chave} não está na baseline')
+            continue
+        if atual['pontuacao'] < referencia['pontuacao'] - tolerancia_pontuacao:
+            regressoes.append(
+                f"{chave}: pontuação {atual['pontuacao']:.3f} "
+                f"(baseline {referencia['pontuacao']:.3f})"
+            )
+        limite = referencia['segundos'] * (1 + tolerancia_tempo)
+        if (
+            atual['segundos'] > limite
+            and atual['segundos'] - referencia['segundos'] > FOLGA_TEMPO_S
+        ):
+            regressoes.append(
+                f"{chave}: {atual['segundos']:.3f} s "
+                f"(baseline {referencia['segundos']:.3f} s)"
+            )
+    return regressoes
+
+
+def _criar_parser():
+    parser = argparse.ArgumentParser(
+        description='Benchmarks de desempenho e precisão do NotaLAB'
+    )
+    parser.add_argument(
+        '--duracoes',
+        type=int,
+        nargs='+',
+        default=list(DURACOES_PADRAO),
+        help='durações (segundos) das faixas sintéticas',
+    )
+    parser.add_argument(
+        '--repeticoes',
+        type=int,
+        default=3,
+        help='execuções por etapa (vale o menor tempo)',
+    )
+    parser.add_argument(
+        '--baseline', default=str(CAMINHO_BASELINE), help='arquivo de baseline'
+    )
+    parser.add_argument(
+        '--atualizar-baseline',
+        action='store_true',
+        help='grava os resultados atuais como nova baseline',
+    )
+    parser.add_argument(
+        '--aceitar-falhas',
+        action='store_true',
+        help='grava a baseline mesmo com etapas de pontuação zero',
+    )
+    parser.add_argument(
+        '--tolerancia-tempo',
+        type=float,
+        default=TOLERANCIA_TEMPO,
+        help='aumento de tempo tolerado (0.5 = 50%%)',
+    )
+    return parser
+
+
+def main(argv=None):
+    args = _criar_parser().parse_args(argv)
+    warnings.filterwarnings('ignore')
+
+    resultados = executar_benchmarks(args.duracoes, args.repeticoes)
+
+    if args.atualizar_baseline:
+        falhas = [c for c, r in resultados.items() if r['pontuacao'] == 0]
+        if falhas and not args.aceitar_falhas:
+            print('\nEtapas com pontuação zero (baseline não gravada):')
+            for chave in falhas:
+                print(f'  - {chave}')
+            return 1
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(
+                {
+                    'maquina': {
+                        'sistema': platform.platform(),
+                        'processador': platform.processor() or platform.machine(),
+                        'nucleos': os.cpu_count(),
+                        'python': platform.python_version(),
+                    },
+                    'resultados': resultados,
+                },
+                f,
+                indent=2,
+                ensure_ascii=False,
+            )
+        print(f'\nBaseline gravada em {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'\nBaseline não encontrada: {args.baseline}')
+        print('Gere uma com --atualizar-baseline.')
+        return 1
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)['resultados']
+
+    regressoes = comparar_com_baseline(
+        resultados, baseline, tolerancia_tempo=args.tolerancia_tempo
+    )
+    if regressoes:
+        print('\nREGRESSÕES DETECTADAS:')
+        for mensagem in regressoes:
+            print(f'  - {mensagem}')
+        return 1
+
+    print('\nNenhuma regressão em relação à baseline.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+Geradores de sinais sintéticos com gabarito conhecido.
+
+Cada gerador devolve o sinal e o gabarito usado para pontuar os detectores:
+melodias com tons harmônicos numa tonalidade, trilhas de cliques num BPM
+exato e progressões de acordes com um acorde por compasso. Tudo é gerado
+offline e de forma determinística (mesma semente, mesmo sinal).
+"""
+import numpy as np
+
+from src.notalab.acordes import INTERVALOS_ACORDE, tipo_acorde
+from src.notalab.escalas import NOTAS, midi_de_nome, midi_para_hz, tabela_escala
+
+# Durações possíveis das notas da melodia (em quarter notes)
+DURACOES_MELODIA = (0.5, 1.0, 1.0, 2.0)
+
+# Amplitude relativa de cada harmônico dos tons sintéticos
+HARMONICOS = (1.0, 0.5, 0.3, 0.15)
+
+# Peso do sorteio das notas da melodia pelo intervalo (em semitons) até a
+# tônica: tônica, quinta e terça aparecem mais vezes, como numa melodia
+# tonal. Com todas as notas da escala igualmente prováveis a tonalidade
+# fica ambígua até no gabarito (ex.: D maior e A maior só diferem no G).
+PESOS_INTERVALO = {0: 4.0, 3: 2.0, 4: 2.0, 7: 3.0}
+
+# Cada frase da melodia termina numa tônica longa (cadência) a cada tantas notas
+NOTAS_POR_FRASE = 8
+
+
+def tom_harmonico(freq, duracao, taxa, harmonicos=HARMONICOS, ataque=0.01):
+    """
+    Gera um tom com harmônicos e envelope de ataque/decaimento.
+
+    Args:
+        freq (float): Frequência fundamental em Hz
+        duracao (float): Duração em segundos
+        taxa (int): Taxa de amostragem
+        harmonicos (tuple): Amplitude de cada harmônico (1 = fundamental)
+        ataque (float): Duração do ataque em segundos
+
+    Returns:
+        np.ndarray: Sinal do tom (float32)
+    """
+    t = np.arange(int(duracao * taxa)) / taxa
+    tom = np.zeros_like(t)
+    for k, amplitude in enumerate(harmonicos, start=1):
+        if freq * k < taxa / 2:
+            tom += amplitude * np.sin(2 * np.pi * freq * k * t)
+
+    # Ataque linear, decaimento exponencial e soltura curta no final
+    envelope = np.exp(-1.5 * t)
+    n_ataque = max(1, int(ataque * taxa))
+    envelope[:n_ataque] *= np.linspace(0, 1, n_ataque)
+    n_soltura = min(len(t), int(0.02 * taxa))
+    if n_soltura:
+        envelope[-n_soltura:] *= np.linspace(1, 0, n_soltura)
+    return (tom * envelope / sum(harmonicos)).astype(np.float32)
+
+
+def clique(taxa, freq=1000.0, duracao=0.03):
+    """Gera um clique curto (seno com decaimento rápido)."""
+    t = np.arange(int(duracao * taxa)) / taxa
+    return (np.sin(2 * np.pi * freq * t) * np.exp(-t * 150)).astype(np.float32)
+
+
+def melodia(tom='C', modo='maior', bpm=100, duracao=30.0, taxa=44100, semente=0):
+    """
+    Gera uma melodia de tons harmônicos com notas da escala (C4-B5) e pausas.
+
+    A tônica, a quinta e a terça são sorteadas mais vezes (ver
+    PESOS_INTERVALO) e cada frase termina na tônica, para que a tonalidade
+    do gabarito seja a pedida e não uma vizinha.
+
+    Args:
+        tom (str): Tônica
+        modo (str): 'maior' ou 'menor'
+        bpm (int): Andamento
+        duracao (float): Duração aproximada em segundos
+        taxa (int): Taxa de amostragem
+        semente (int): Semente do gerador aleatório
+
+    Returns:
+        tuple: (sinal, gabarito) onde gabarito é a lista de tuplas
+        (midi, duração em quarter notes), com midi -1 para pausas
+    """
+    rng = np.random.default_rng(semente)
+    escala = tabela_escala(tom, modo, 4, 5)
+    tonica = NOTAS.index(tom)
+    pesos = np.array(
+        [PESOS_INTERVALO.get(int(m - tonica) % 12, 1.0) for m in escala]
+    )
+    pesos /= pesos.sum()
+    seg_por_quarter = 60 / bpm
+
+    gabarito = []
+    total = 0.0
+    n_notas = 0
+    while total < duracao:
+        dur = float(rng.choice(DURACOES_MELODIA))
+        # Uma pausa a cada ~8 notas, nunca duas seguidas
+        if gabarito and gabarito[-1][0] >= 0 and rng.random() < 0.12:
+            gabarito.append((-1, dur))
+        else:
+            n_notas += 1
+            if n_notas % NOTAS_POR_FRASE == 0:
+                dur = max(DURACOES_MELODIA)
+                gabarito.append((60 + tonica, dur))
+            else:
+                gabarito.append((int(rng.choice(escala, p=pesos)), dur))
+        total += dur * seg_por_quarter
+
+    partes = []
+    for midi, dur in gabarito:
+        n = int(dur * seg_por_quarter * taxa)
+        if midi < 0:
+            partes.append(np.zeros(n, dtype=np.float32))
+        else:
+            nota = tom_harmonico(float(midi_para_hz(midi)), n / taxa, taxa)
+            partes.append(np.pad(nota, (0, n - len(nota))))
+    sinal = np.concatenate(partes)
+    return 0.8 * sinal / np.max(np.abs(sinal)), gabarito
+
+
+def trilha_cliques(bpm=120, duracao=30.0, taxa=44100):
+    """
+    Gera uma trilha de cliques num BPM exato, com acento no tempo forte.
+
+    Returns:
+        tuple: (sinal, gabarito) onde gabarito é o BPM
+    """
+    sinal = np.zeros(int(duracao * taxa), dtype=np.float32)
+    forte = clique(taxa, freq=1500.0)
+    fraco = 0.6 * clique(taxa)
+    periodo = 60 / bpm
+    for i, inicio in enumerate(np.arange(0, duracao, periodo)):
+        som = forte if i % 4 == 0 else fraco
+        a = int(inicio * taxa)
+        b = min(a + len(som), len(sinal))
+        sinal[a:b] += som[: b - a]
+    return sinal, bpm
+
+
+def progressao(acordes, bpm=100, duracao=30.0, taxa=44100):
+    """
+    Gera uma progressão com um acorde por compasso (4/4), baixo na raiz e
+    cliques de bumbo em cada batida.
+
+    Args:
+        acordes (list): Índices de acordes (0-35) repetidos em ciclo
+        bpm (int): Andamento
+        duracao (float): Duração aproximada em segundos (compassos inteiros)
+        taxa (int): Taxa de amostragem
+
+    Returns:
+        tuple: (sinal, gabarito) onde gabarito é a lista de índices de
+        acorde, um por compasso
+    """
+    seg_compasso = 4 * 60 / bpm
+    n_compassos = max(1, int(round(duracao / seg_compasso)))
+    n = int(seg_compasso * taxa)
+    bumbo = clique(taxa, freq=60.0, duracao=0.08)
+
+    gabarito = [acordes[i % len(acordes)] for i in range(n_compassos)]
+    partes = []
+    for idx in gabarito:
+        raiz = 48 + idx % 12
+        compasso = tom_harmonico(float(midi_para_hz(raiz - 12)), n / taxa, taxa)
+        for intervalo in INTERVALOS_ACORDE[tipo_acorde(idx)]:
+            compasso += 0.7 * tom_harmonico(
+                float(midi_para_hz(raiz + intervalo)), n / taxa, taxa
+            )
+        for batida in range(4):
+            a = int(batida * n / 4)
+            compasso[a : a + len(bumbo)] += 0.8 * bumbo[: n - a]
+        partes.append(compasso)
+    sinal = np.concatenate(partes)
+    return 0.8 * sinal / np.max(np.abs(sinal)), gabarito
+
+
+def nomes_para_midi(notas):
+    """Converte uma lista de (nome, duração) em (midi, duração), -1 = pausa."""
+    eventos = []
+    for nome, duracao in notas:
+        try:
+            eventos.append((midi_de_nome(nome), duracao))
+        except (TypeError, ValueError):
+            eventos.append((-1, duracao))
+    return eventos
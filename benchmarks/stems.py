@@ -0,0 +1,146 @@
+"""
+Mede tempo e pico de memória da separação de stems, inteira e em blocos.
+
+Cada medição roda num processo novo, porque o pico de memória residente
+(ru_maxrss) só cresce durante a vida do processo e o modelo do Spleeter
+fica carregado depois da primeira separação. Com a separação em blocos o
+pico deve ficar praticamente igual em todas as durações; com a faixa
+inteira ele cresce junto com a duração.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.stems
+    python -m benchmarks.stems --duracoes 60 300 600 --bloco 30
+    python -m benchmarks.stems --saida stems.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import config.config as config
+from benchmarks import sinais
+
+# Durações (segundos) das faixas sintéticas
+DURACOES_PADRAO = (60, 180, 300)
+
+
+def _medir(caminho, pasta, duracao_bloco, sobreposicao, processos, fila):
+    """Separa a faixa neste processo e envia (segundos, pico MB) pela fila."""
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    warnings.filterwarnings('ignore')
+    from src.notalab.stems import separar_stems
+    from src.utils.perfil import _pico_rss_mb
+
+    inicio = time.perf_counter()
+    separar_stems(
+        caminho,
+        pasta,
+        reaproveitar=False,
+        duracao_bloco=duracao_bloco,
+        sobreposicao=sobreposicao,
+        processos=processos,
+    )
+    fila.put((time.perf_counter() - inicio, _pico_rss_mb()))
+
+
+def medir_separacao(caminho, pasta, duracao_bloco, sobreposicao, processos):
+    """
+    Separa a faixa num processo novo.
+
+    Returns:
+        tuple: (segundos, pico de memória residente em MB)
+    """
+    contexto = multiprocessing.get_context('spawn')
+    fila = contexto.Queue()
+    processo = contexto.Process(
+        target=_medir,
+        args=(caminho, pasta, duracao_bloco, sobreposicao, processos, fila),
+    )
+    processo.start()
+    resultado = fila.get()
+    processo.join()
+    return resultado
+
+
+def executar(
+    duracoes=DURACOES_PADRAO,
+    duracao_bloco=config.DURACAO_BLOCO_STEMS,
+    sobreposicao=config.SOBREPOSICAO_STEMS,
+    processos=1,
+    taxa=44100,
+):
+    """
+    Mede a separação inteira e em blocos em cada duração.
+
+    Returns:
+        dict: 'duracao/modo' -> {'segundos', 'pico_mb'}
+    """
+    import soundfile as sf
+
+    modos = {'inteira': 0, 'blocos': duracao_bloco}
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        for duracao in duracoes:
+            # Melodia sobre uma progressão, para o modelo ter voz e acompanhamento
+            voz, _ = sinais.melodia('D', 'maior', 100, duracao, taxa)
+            acordes, _ = sinais.progressao([2, 7, 23, 2], 100, duracao, taxa)
+            n = min(len(voz), len(acordes))
+            caminho = os.path.join(pasta, f'mix_{duracao}.wav')
+            sf.write(caminho, 0.5 * (voz[:n] + acordes[:n]), taxa)
+
+            for modo, bloco in modos.items():
+                segundos, pico = medir_separacao(
+                    caminho, os.path.join(pasta, modo), bloco, sobreposicao, processos
+                )
+                chave = f'{duracao}s/{modo}'
+                resultados[chave] = {'segundos': round(segundos, 2), 'pico_mb': pico}
+                print(f'{chave:20s} {segundos:8.1f} s   pico {pico} MB')
+    return resultados
+
+
+def _criar_parser():
+    parser = argparse.ArgumentParser(
+        description='Tempo e memória da separação de stems (inteira x blocos)'
+    )
+    parser.add_argument(
+        '--duracoes',
+        type=int,
+        nargs='+',
+        default=list(DURACOES_PADRAO),
+        help='durações (segundos) das faixas sintéticas',
+    )
+    parser.add_argument(
+        '--bloco',
+        type=float,
+        default=config.DURACAO_BLOCO_STEMS,
+        help='duração dos blocos em segundos',
+    )
+    parser.add_argument(
+        '--sobreposicao',
+        type=float,
+        default=config.SOBREPOSICAO_STEMS,
+        help='sobreposição entre blocos em segundos',
+    )
+    parser.add_argument(
+        '--processos', type=int, default=1, help='blocos separados ao mesmo tempo'
+    )
+    parser.add_argument('--saida', help='grava os resultados neste JSON')
+    return parser
+
+
+def main(argv=None):
+    args = _criar_parser().parse_args(argv)
+    resultados = executar(args.duracoes, args.bloco, args.sobreposicao, args.processos)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f'\nResultados gravados em {args.saida}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -141,6 +141,17 @@ POST_AVG = 0.03
 # → RELAÇÃO COM BPM: Para BPM > 140, use valores menores (≤ 0.01)
 WAIT = 0.03
 
+# Mínimo de onsets esperado na primeira busca; abaixo disso, a sensibilidade
+# é ajustada automaticamente (busca binária no delta sobre o mesmo envelope)
+# até chegar perto de DENSIDADE_ONSETS_ALVO onsets por segundo de voz (os
+# trechos em silêncio não entram na conta)
+# → AUMENTAR MIN_ONSETS: o ajuste automático entra em mais faixas
+# → DENSIDADE_ONSETS_ALVO MAIOR (3-4): ajuste mais sensível, mais notas
+# → DENSIDADE_ONSETS_ALVO MENOR (1-1.5): ajuste conservador, menos notas
+#   • RECOMENDADO PARA: Vocais esparsos, com longos trechos de silêncio
+MIN_ONSETS = 10
+DENSIDADE_ONSETS_ALVO = 2.0
+
 # === PARÂMETROS DE ANÁLISE ESPECTRAL ===
 
 # Limite de frequência mínima para detecção de notas (em Hz)
@@ -187,6 +198,317 @@ VOICED_THRESHOLD = 0.45
 #     • EXEMPLO: Para um cantor de ópera profissional, use 0.08 (8% de tolerância)
 TOLERANCIA_AFINACAO = 0.1
 
+# Duração de cada bloco na análise em streaming (em segundos)
+# → Usada na análise com memória limitada de gravações muito longas
+#   (ensaios, shows inteiros): o arquivo nunca é carregado por completo
+# → AUMENTAR (20-60): menos blocos, um pouco mais rápido, mais memória
+# → DIMINUIR (5-10): memória mínima, útil em máquinas com pouca RAM
+DURACAO_BLOCO_STREAMING = 10.0
+
+# Taxa de amostragem (Hz) usada por cada etapa da análise
+# → O áudio é decodificado uma vez na taxa de 'decodificacao' e reamostrado
+#   uma única vez para cada taxa diferente; etapas com a mesma taxa
+#   compartilham o mesmo sinal e as mesmas features
+# → DIMINUIR (22050 ou 11025):
+#     • Cromagrama, BPM e tonalidade ficam 2-4x mais baratos quase sem perda
+#     • RECOMENDADO PARA: 'tom', 'bpm', 'acordes'
+# → MANTER EM 44100:
+#     • Precisão máxima de tempo e de frequência
+#     • RECOMENDADO PARA: 'pitch' (rastreamento da voz) e 'onsets'
+# → OBSERVAÇÃO: os parâmetros PRE_MAX, POST_MAX, PRE_AVG, POST_AVG e WAIT
+#   são contados em frames, então mudar a taxa de 'onsets' muda o seu efeito
+TAXAS_POR_ETAPA = {
+    'decodificacao': 44100,
+    'tom': 22050,
+    'bpm': 22050,
+    'acordes': 22050,
+    'onsets': 44100,
+    'pitch': 44100,
+}
+
+# Rastreamento de pitch em passagem única sobre o vocal inteiro
+# → ATIVAR (True):
+#     • O pyin roda uma só vez e cada segmento entre onsets usa sua fatia de frames
+#     • Muito mais rápido (ordem de grandeza) em faixas longas, sem efeitos de borda
+#     • RECOMENDADO PARA: Praticamente todos os casos
+# → DESATIVAR (False):
+#     • Comportamento antigo: um pyin por segmento entre onsets
+#     • RECOMENDADO PARA: Comparar resultados com versões anteriores
+PITCH_PASSAGEM_UNICA = True
+
+# Processos do rastreamento de pitch em passagem única
+# → O pyin usa um só núcleo; com mais processos o vocal é cortado em pontos
+#   de silêncio antes de um onset e cada bloco é rastreado em paralelo
+# → 1: um único pyin sobre o vocal inteiro (resultado de referência)
+# → 0: um processo por núcleo
+# → AUMENTAR (4-8): vocais de vários minutos transcrevem bem mais rápido;
+#   cada processo novo custa ~1-2 s para importar o librosa
+PROCESSOS_PITCH = 1
+
+# Duração mínima (segundos) de cada bloco do rastreamento em paralelo
+# → Vocais mais curtos que 2x este valor não são divididos
+DURACAO_MIN_BLOCO_PITCH = 20.0
+
+# === CACHE DE ÁUDIO DECODIFICADO ===
+
+# Guardar o áudio decodificado em disco (.npy) para reabrir sem decodificar
+# → ATIVAR (True):
+#     • Rodar de novo a mesma música (ex: testando outros parâmetros) começa
+#       quase instantaneamente, e o sinal é lido via memory mapping
+#     • O cache é identificado pelo conteúdo do arquivo, não pelo nome
+# → DESATIVAR (False):
+#     • Sempre decodifica o arquivo do zero, sem usar espaço em disco
+USAR_CACHE_AUDIO = True
+
+# Pasta onde o cache de áudio é guardado
+PASTA_CACHE_AUDIO = '.cache/audio'
+
+# Tamanho máximo do cache de áudio (em MB)
+# → Quando ultrapassado, os arquivos usados há mais tempo são removidos
+# → REFERÊNCIA: 1 minuto de áudio mono a 44.1 kHz ocupa cerca de 10 MB
+LIMITE_CACHE_AUDIO_MB = 2048
+
+# === CACHE DE ETAPAS ===
+
+# Guardar em disco o resultado de cada etapa do pipeline (análise da mixagem,
+# stems, pitch do vocal, notas)
+# → Cada resultado é identificado pelo conteúdo do arquivo de entrada e só
+#   pelos parâmetros que aquela etapa lê: mudar GRADE_QUANTIZACAO refaz só as
+#   notas, sem repetir a análise, a separação nem o rastreamento de pitch
+# → Um arquivo renomeado ou copiado reaproveita os mesmos resultados
+# → ATIVAR (True): re-execuções com outros parâmetros ficam muito mais rápidas
+# → DESATIVAR (False): sempre recalcula tudo, sem usar espaço em disco
+MEMOIZAR_ETAPAS = True
+
+# Pasta onde os resultados das etapas são guardados
+PASTA_CACHE_ETAPAS = '.cache/etapas'
+
+# Tamanho máximo do cache de etapas (em MB); os resultados usados há mais
+# tempo são removidos primeiro
+LIMITE_CACHE_ETAPAS_MB = 512
+
+# === ENTRADA AO VIVO ===
+
+# Taxa de amostragem da transcrição ao vivo (Hz)
+# → 22050 cobre a voz cantada com folga e custa metade de 44100 por quadro
+TAXA_AO_VIVO = 22050
+
+# Amostras lidas da fonte (arquivo, pipe ou placa de som) por vez
+# → AUMENTAR (1024-2048): menos chamadas, latência um pouco maior
+# → DIMINUIR (256): resposta mais rápida, mais custo por segundo de áudio
+QUADRO_AO_VIVO = 512
+
+# Fração do quadro mais forte até agora acima da qual há voz
+# → AUMENTAR (0.2-0.3): ignora ruído de fundo e vazamento de instrumentos
+# → DIMINUIR (0.05): capta notas suaves e finais de frase
+LIMIAR_VOZ_AO_VIVO = 0.1
+
+# Tempo (segundos) de silêncio, ou de voz depois de uma pausa, que fecha o
+# segmento aberto mesmo sem onset
+# → Limita a latência da última nota de uma frase
+# → AUMENTAR (0.2-0.3): menos notas picotadas em vibratos e consoantes
+# → DIMINUIR (0.05-0.08): resposta mais rápida no fim das frases
+SILENCIO_FECHA_NOTA = 0.1
+
+# Menor normalização do envelope de onset ao vivo (fluxo espectral em dB)
+# → No começo da captura ainda não se conhece o ataque mais forte; sem piso,
+#   o ruído dos primeiros quadros vira uma rajada de onsets falsos
+# → AUMENTAR (15-20): menos onsets falsos em microfones ruidosos
+# → DIMINUIR (5): detecta ataques suaves já no início
+PISO_ENVELOPE_AO_VIVO = 10.0
+
+# === SEPARAÇÃO DE STEMS (SPLEETER) ===
+
+# Modelo do Spleeter usado na separação
+# → 'spleeter:2stems': vocal + acompanhamento (mais rápido)
+# → 'spleeter:4stems': vocal, bateria, baixo e outros
+# → 'spleeter:5stems': como o 4stems, separando também o piano
+MODELO_STEMS = 'spleeter:4stems'
+
+# Separar só o vocal e entregá-lo em memória para a extração de notas
+# → O pipeline só usa o vocal: com o modelo de 2 stems a separação custa
+#   cerca de metade, e o vocal não é gravado nem relido do disco
+# → ATIVAR (True): usa MODELO_VOCAL; stems/<nome>/ só recebe o vocal com
+#   GRAVAR_VOCAL = True
+# → DESATIVAR (False): separa todos os stems de MODELO_STEMS em stems/<nome>/
+SOMENTE_VOCAL = True
+
+# Modelo do Spleeter usado quando SOMENTE_VOCAL = True
+MODELO_VOCAL = 'spleeter:2stems'
+
+# Com SOMENTE_VOCAL, gravar também o vocal em stems/<nome>/vocals.wav
+# → ATIVAR (True): para ouvir o vocal separado ou usá-lo em outro programa
+# → DESATIVAR (False): nada é gravado (mais rápido)
+GRAVAR_VOCAL = False
+
+# Reaproveitar stems já separados do mesmo arquivo (mesmo conteúdo e modelo)
+# → ATIVAR (True): pula a separação quando stems/<nome>/ já está válido
+# → DESATIVAR (False): sempre separa de novo
+REAPROVEITAR_STEMS = True
+
+# Threads do TensorFlow durante a separação (0 = o TensorFlow decide)
+# → THREADS_TF_INTRA: threads usadas dentro de cada operação
+# → THREADS_TF_INTER: operações executadas em paralelo
+# → RECOMENDADO: em processamento em lote com vários processos, limite
+#   as threads para não disputar núcleos (ex: núcleos / processos)
+THREADS_TF_INTRA = 0
+THREADS_TF_INTER = 0
+
+# Usar processos auxiliares do Spleeter para gravar os stems
+SPLEETER_MULTIPROCESS = True
+
+# Separação em blocos: faixas mais longas que DURACAO_BLOCO_STEMS segundos
+# são cortadas em janelas desse tamanho, separadas uma a uma e emendadas com
+# crossfade, então o pico de memória não cresce com a duração da faixa
+# → AUMENTAR (120-300): menos emendas, mais memória por bloco
+# → DIMINUIR (20-30): menos memória (abaixo de ~10 s o modelo perde contexto)
+# → 0: sempre entrega a faixa inteira ao Spleeter (comportamento antigo)
+DURACAO_BLOCO_STEMS = 60.0
+
+# Sobreposição entre blocos vizinhos, em segundos, usada no crossfade
+# → AUMENTAR (3-5): emendas mais suaves, um pouco mais de processamento
+# → DIMINUIR (0.5-1): menos processamento repetido
+SOBREPOSICAO_STEMS = 2.0
+
+# Processos que separam blocos ao mesmo tempo (cada um carrega seu modelo)
+# → 1: um bloco por vez, memória mínima
+# → AUMENTAR: mais rápido em máquinas com vários núcleos; a memória
+#   passa a ser de um modelo e um bloco por processo
+PROCESSOS_STEMS = 1
+
+# === PROCESSAMENTO EM LOTE ===
+
+# Pasta padrão onde o modo lote grava um <nome>.mid por faixa e o resumo.json
+PASTA_SAIDA_LOTE = 'data/lote'
+
+# Gravar cada etapa concluída de uma faixa em <midi>.execucao/ (análise,
+# vocal ou stems, notas brutas e quantizadas, harmonias e MIDI)
+# → ATIVAR (True): uma execução interrompida (queda, Ctrl+C, reinício da
+#   máquina) continua da etapa que faltava; no lote, faixas já concluídas
+#   são puladas ao rodar o mesmo comando de novo; ao fim de cada faixa só
+#   a análise, as notas e o MIDI ficam gravados
+# → DESATIVAR (False): nada é gravado além do MIDI
+SALVAR_EXECUCAO = True
+
+# Executar etapas independentes do pipeline ao mesmo tempo
+# → ATIVAR (True): a análise da mixagem (tom, BPM, acordes) roda enquanto o
+#   Spleeter separa os stems; o tempo por faixa cai para perto do tempo da
+#   separação mais a extração vocal
+# → DESATIVAR (False): uma etapa de cada vez (útil para depurar ou medir)
+ETAPAS_CONCORRENTES = True
+
+# === SERVIÇO LOCAL ===
+
+# Endereço e porta do serviço (python main.py servico)
+# → Só aceite conexões de fora (ex: '0.0.0.0') numa rede confiável: o
+#   serviço lê e grava arquivos com as permissões de quem o iniciou
+HOST_SERVICO = '127.0.0.1'
+PORTA_SERVICO = 8765
+
+# Tarefas executadas ao mesmo tempo pelo serviço
+# → 1: uma faixa por vez; as outras esperam na fila
+# → AUMENTAR (2-4): análises curtas não esperam uma transcrição longa
+#   (a separação de stems continua sendo uma por vez, o modelo é um só)
+TAREFAS_SERVICO = 2
+
+# Tarefas que podem esperar na fila; com a fila cheia o serviço responde
+# 503 e o cliente deve tentar de novo mais tarde
+FILA_SERVICO = 16
+
+# Pasta padrão onde o serviço grava os MIDIs das tarefas sem 'saida'
+PASTA_SAIDA_SERVICO = 'data/servico'
+
+# === HARMONIZAÇÃO ===
+
+# Harmonia gerada para as vozes de apoio (Contralto e Tenor)
+# → 'unissono': a mesma nota da melodia em outras oitavas
+# → 'tercas': contralto uma terça e tenor uma sexta abaixo (terças paralelas)
+# → 'triade': contralto uma terça e tenor uma quinta abaixo (acorde cheio)
+# → 'sextas': contralto uma sexta abaixo e tenor uma oitava abaixo
+# → Os intervalos seguem a escala detectada (tom e modo): a terça pode ser
+#   maior ou menor conforme o grau, como num arranjo vocal
+VARIACAO_HARMONIA = 'tercas'
+
+# Extensão (nota MIDI mais grave, mais aguda) de cada voz de apoio
+# → As notas fora da extensão são trazidas para dentro por oitavas inteiras
+# → REFERÊNCIA: 48 = C3, 60 = C4 (dó central), 72 = C5
+TESSITURAS = {
+    'Contralto': (48, 77),
+    'Tenor': (40, 69),
+}
+
+# === EXPORTAÇÃO ===
+
+# Incluir no MIDI uma trilha com os acordes detectados (um por compasso)
+EXPORTAR_ACORDES_MIDI = True
+
+# Gravar também a partitura em MusicXML (<nome>.musicxml ao lado do MIDI)
+# → ATIVAR (True): para abrir no MuseScore/Finale; usa o music21, que é
+#   bem mais lento que a gravação direta do MIDI em faixas longas
+# → DESATIVAR (False): só o arquivo MIDI
+EXPORTAR_MUSICXML = False
+
+# === INICIALIZAÇÃO ===
+
+# Tempo máximo (em segundos) para importar a linha de comando do NotaLAB
+# → Conferido com: python main.py --verificar-importacao
+# → A verificação também falha se TensorFlow, Spleeter, music21 ou librosa
+#   forem carregados só por abrir o programa
+ORCAMENTO_IMPORTACAO_S = 0.5
+
+# === AJUSTE AUTOMÁTICO DE PARÂMETROS ===
+
+# Valores testados por: python main.py ajustar vocal.wav referencia.mid
+# → O envelope de onset e o pitch são calculados uma vez por faixa; cada
+#   combinação só refaz a escolha de picos, o agrupamento e a quantização
+# → Cada valor a mais numa lista multiplica o número de combinações:
+#   prefira poucas opções bem espaçadas e refine depois em volta da melhor
+GRADE_VARREDURA = {
+    'sensibilidade_onset': [0.02, 0.03, 0.035, 0.045, 0.06],
+    'pre_max': [0.01, 0.03],
+    'post_max': [0.01, 0.02, 0.04],
+    'pre_avg': [0.03, 0.04, 0.1],
+    'post_avg': [0.03, 0.1],
+    'wait': [0.01, 0.03, 0.05],
+    'min_duracao': [0.02, 0.05, 0.1],
+    'limite_agrupamento': [1, 3, 6],
+    'quantizar': [True, False],
+    'grade_quantizacao': [8, 16, 32],
+}
+
+# Diferença máxima (em quarter notes) entre o início de uma nota extraída
+# e o da nota da referência para contar como acerto na pontuação
+TOLERANCIA_ONSET_AJUSTE = 0.25
+
+# Trechos de nome (sem diferenciar maiúsculas) da trilha tomada como melodia
+# num MIDI de referência quando o ajuste não recebe --trilha
+# → Sem nenhuma trilha com esses nomes, vale a trilha mais monofônica
+#   (uma trilha de acordes nunca é escolhida só por ter mais notas)
+NOMES_TRILHA_MELODIA = (
+    'melodia',
+    'melody',
+    'soprano',
+    'vocal',
+    'voz',
+    'voice',
+    'lead',
+)
+
+# === PERFIL DE DESEMPENHO ===
+
+# Medir tempo, memória e contagens de cada etapa (ver src/utils/perfil.py)
+# → ATIVAR (True): grava <nome>.perfil.json ao lado de cada MIDI e, no modo
+#   lote, um perfil_resumo.json com os totais de todas as faixas
+# → DESATIVAR (False): sem custo extra (também ativável com --perfil)
+PERFILAR = False
+
+# Medir o pico de memória de cada etapa com tracemalloc
+# → ATIVAR (True): pico de memória por etapa, mas o tracemalloc rastreia
+#   cada alocação e a análise chega a ficar 3x mais lenta (os tempos do
+#   perfil deixam de representar uma execução normal)
+# → DESATIVAR (False): registra só o pico de memória (RSS) do processo
+PERFIL_TRACEMALLOC = False
+
 """
 ===== GUIA DE CONFIGURAÇÕES POR CASO DE USO =====
 
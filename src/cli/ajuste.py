@@ -0,0 +1,97 @@
+"""
+Comando de ajuste automático dos parâmetros de extração vocal.
+
+Recebe pares (vocal, MIDI de referência), testa a grade GRADE_VARREDURA do
+config.py e grava o melhor preset em JSON, pronto para CONFIGS_POR_ESTILO.
+"""
+import json
+import time
+from pathlib import Path
+
+
+def executar_ajuste(
+    entradas,
+    saida='data/preset.json',
+    bpm=None,
+    tom=None,
+    modo=None,
+    estilo=None,
+    top=5,
+    trilha=None,
+):
+    """
+    Procura os parâmetros que mais aproximam a extração das referências.
+
+    Args:
+        entradas (list): Caminhos alternados: vocal1, referencia1.mid, vocal2, ...
+        saida (str): Arquivo JSON onde o preset é gravado
+        bpm (int): Andamento (padrão: o de cada MIDI de referência)
+        tom (str): Tônica (padrão: estimada de cada referência)
+        modo (str): 'maior' ou 'menor'
+        estilo (str): Nome do estilo usado no trecho para CONFIGS_POR_ESTILO
+        top (int): Quantas combinações listar
+        trilha (int | str): Índice ou nome da trilha da melodia nos MIDIs de
+            referência (padrão: escolhida por escolher_trilha_melodia)
+
+    Returns:
+        dict: Preset, pontuações e ranking gravados em `saida`
+
+    Raises:
+        ValueError: Se nenhuma combinação acertar uma nota da referência (o
+            preset seria só a primeira combinação da grade e não é gravado)
+    """
+    from src.notalab.varredura import (avaliar, montar_preset,
+                                       parametros_atuais, preparar_faixas,
+                                       varrer_parametros)
+
+    if len(entradas) % 2:
+        raise ValueError(
+            'Informe pares de arquivos: vocal.wav referencia.mid [vocal2 ...]'
+        )
+    pares = list(zip(entradas[::2], entradas[1::2]))
+
+    inicio = time.perf_counter()
+    faixas = preparar_faixas(pares, bpm=bpm, tom=tom, modo=modo, trilha=trilha)
+    preparo = time.perf_counter() - inicio
+
+    atual = avaliar(faixas, parametros_atuais())
+    ranking = varrer_parametros(faixas)
+    melhor_pontuacao, melhores = ranking[0]
+    if melhor_pontuacao <= 0:
+        raise ValueError(
+            'Nenhuma combinação acertou notas da referência; confira se a '
+            'trilha lida é a melodia (--trilha) e se o vocal corresponde ao MIDI'
+        )
+    preset = montar_preset(melhores)
+    print(
+        f'\nPreparo: {preparo:.1f} s; varredura: '
+        f'{time.perf_counter() - inicio - preparo:.1f} s'
+    )
+
+    print(f'\nPontuação com o config.py atual: {atual:.3f}')
+    print(f'Melhor pontuação encontrada:     {melhor_pontuacao:.3f}')
+    for pontuacao, parametros in ranking[:top]:
+        print(f'  {pontuacao:.3f}  {parametros}')
+
+    nome = estilo or 'novo_estilo'
+    print(f"\nTrecho para CONFIGS_POR_ESTILO em config.py:\n    '{nome}': {{")
+    for chave, valor in preset.items():
+        print(f'        {chave!r}: {valor!r},')
+    print('    },')
+
+    resultado = {
+        'estilo': nome,
+        'pontuacao': round(melhor_pontuacao, 4),
+        'pontuacao_config_atual': round(atual, 4),
+        'preset': preset,
+        'ranking': [
+            {'pontuacao': round(p, 4), 'parametros': parametros}
+            for p, parametros in ranking[:top]
+        ],
+        'faixas': [vocal for vocal, _ in pares],
+    }
+    Path(saida).parent.mkdir(parents=True, exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f'\nPreset salvo em: {saida}')
+    return resultado
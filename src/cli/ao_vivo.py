@@ -0,0 +1,118 @@
+"""
+Comando de transcrição ao vivo.
+
+Mostra cada nota assim que ela termina, a partir de um arquivo tocado em
+tempo real, de PCM bruto num pipe ou da placa de som, e no fim imprime (e
+opcionalmente grava) o relatório de latência por nota.
+"""
+import json
+import time
+from pathlib import Path
+
+import config.config as config
+
+
+def executar_ao_vivo(
+    entrada=None,
+    dispositivo=None,
+    bpm=120,
+    tom='C',
+    modo='maior',
+    tempo_real=True,
+    formato='float32',
+    saida=None,
+    relatorio=None,
+):
+    """
+    Transcreve a entrada em tempo real até ela acabar (ou Ctrl+C).
+
+    Args:
+        entrada (str): Arquivo de áudio, '-' para PCM bruto em stdin ou None
+            para a placa de som
+        dispositivo (str): Dispositivo de captura (padrão do sistema se None)
+        bpm (int): Andamento usado nas durações
+        tom (str): Tônica da escala de ajuste das notas
+        modo (str): 'maior' ou 'menor'
+        tempo_real (bool): Toca arquivos no ritmo real (False = o mais rápido
+            possível, útil para medir o custo de processamento)
+        formato (str): Formato do PCM em stdin: 'float32' ou 'int16'
+        saida (str): Arquivo .mid para gravar a melodia no fim
+        relatorio (str): Arquivo JSON para gravar notas e latências
+
+    Returns:
+        dict: Resumo de relatorio_latencia (None se a captura não abriu)
+    """
+    from src.notalab.ao_vivo import (TranscritorAoVivo, fonte_arquivo,
+                                     fonte_dispositivo, fonte_pipe,
+                                     relatorio_latencia)
+
+    if entrada == '-':
+        fonte = fonte_pipe(formato=formato)
+    elif entrada:
+        fonte = fonte_arquivo(entrada, tempo_real=tempo_real)
+    else:
+        try:
+            fonte = fonte_dispositivo(dispositivo=dispositivo)
+        except RuntimeError as e:
+            print(f'Erro: {e}')
+            return None
+
+    transcritor = TranscritorAoVivo(bpm=bpm, tom=tom, modo=modo)
+    print(
+        f'Ouvindo ({config.TAXA_AO_VIVO} Hz, blocos de '
+        f'{config.QUADRO_AO_VIVO} amostras, {tom} {modo}, {bpm} BPM)...'
+    )
+
+    def mostrar(notas):
+        for nota in notas:
+            print(
+                f"{nota['inicio']:8.2f} s  {nota['nota']:<5} "
+                f"{nota['duracao']:5.2f} q  latência {nota['latencia'] * 1000:4.0f} ms"
+            )
+
+    inicio = time.perf_counter()
+    try:
+        for bloco in fonte:
+            mostrar(transcritor.processar(bloco))
+    except KeyboardInterrupt:
+        pass
+    mostrar(transcritor.finalizar())
+    decorrido = time.perf_counter() - inicio
+
+    resumo = relatorio_latencia(transcritor.notas)
+    audio = transcritor.amostras / transcritor.taxa
+    print(f'\n{audio:.1f} s de áudio em {decorrido:.1f} s')
+    if resumo['notas']:
+        print(
+            f"Latência por nota: média {resumo['media_ms']} ms, mediana "
+            f"{resumo['mediana_ms']} ms, p95 {resumo['p95_ms']} ms, máxima "
+            f"{resumo['maxima_ms']} ms ({resumo['notas']} notas)"
+        )
+
+    if saida:
+        from src.notalab.smf import eventos_de_voz, gravar_smf
+
+        Path(saida).parent.mkdir(parents=True, exist_ok=True)
+        gravar_smf(
+            saida, [('Melodia', eventos_de_voz(transcritor.eventos()))], bpm=bpm
+        )
+        print(f'Melodia salva em: {saida}')
+
+    if relatorio:
+        Path(relatorio).parent.mkdir(parents=True, exist_ok=True)
+        with open(relatorio, 'w', encoding='utf-8') as f:
+            json.dump(
+                {
+                    'entrada': entrada or f'dispositivo:{dispositivo or "padrão"}',
+                    'tempo_real': tempo_real,
+                    'segundos_audio': round(audio, 3),
+                    'segundos_processamento': round(decorrido, 3),
+                    'latencia': resumo,
+                    'notas': transcritor.notas,
+                },
+                f,
+                indent=2,
+                ensure_ascii=False,
+            )
+        print(f'Relatório salvo em: {relatorio}')
+    return resumo
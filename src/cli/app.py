@@ -2,18 +2,12 @@ import os
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'   # Ignora avisos do TensorFlow
 
+import argparse
+import sys
 import warnings
 from pathlib import Path
 
-from music21 import midi
-
 import config.config as config
-from src.notalab.audio import (carregar_audio, detectar_acordes, detectar_bpm,
-                           detectar_tom)
-from src.notalab.harmonia import extrair_notas_vocal, gerar_harmonias_vocais
-from src.notalab.notacao import montar_acordes, montar_harmonia
-from src.notalab.stems import separar_stems
-from src.utils.set import selecionar_arquivo
 
 warnings.filterwarnings(
     'ignore', message='n_fft=1024 is too large for input signal'
@@ -26,10 +20,282 @@ Script principal do NotaLAB - Ferramenta de análise e geração musical
 
 Para ajustar parâmetros, edite o arquivo config.py que contém todas as 
 configurações centralizadas com explicações detalhadas.
+
+Os módulos de análise (librosa, music21, Spleeter/TensorFlow) são importados
+só quando o comando escolhido precisa deles, para o programa abrir rápido.
 """
 
 
-def main():
+def _criar_parser():
+    parser = argparse.ArgumentParser(
+        prog='NotaLAB',
+        description='Análise de áudio e transcrição musical. Sem argumentos, '
+        'abre a janela para escolher um arquivo.',
+    )
+    parser.add_argument(
+        '--no-stems',
+        dest='com_stems',
+        action='store_false',
+        help='só analisa a mixagem (tom, BPM, acordes), sem separar stems '
+        'nem carregar o TensorFlow',
+    )
+    parser.add_argument(
+        '--verificar-importacao',
+        action='store_true',
+        help='mede o tempo de inicialização e falha se passar do orçamento',
+    )
+    parser.add_argument(
+        '--perfil',
+        action='store_true',
+        default=config.PERFILAR,
+        help='mede tempo, memória e contagens de cada etapa e grava um '
+        '<nome>.perfil.json ao lado do MIDI',
+    )
+    comandos = parser.add_subparsers(dest='comando')
+
+    lote = comandos.add_parser(
+        'lote', help='processa vários arquivos sem interface gráfica'
+    )
+    lote.add_argument(
+        'entradas', nargs='+', help='pastas, padrões glob ou arquivos de áudio'
+    )
+    lote.add_argument(
+        '--saida',
+        default=config.PASTA_SAIDA_LOTE,
+        help='pasta onde cada faixa gera o seu <nome>.mid',
+    )
+    lote.add_argument(
+        '--processos',
+        type=int,
+        default=None,
+        help='número de processos (padrão: núcleos disponíveis)',
+    )
+    lote.add_argument(
+        '--stems', default='stems', help='pasta onde os stems são salvos'
+    )
+    lote.add_argument(
+        '--no-stems',
+        dest='com_stems',
+        action='store_false',
+        default=argparse.SUPPRESS,
+        help='só analisa as mixagens, sem separar stems',
+    )
+    retomar = comandos.add_parser(
+        'retomar',
+        help='continua execuções interrompidas da última etapa concluída',
+    )
+    retomar.add_argument(
+        'entradas',
+        nargs='+',
+        help='pastas <nome>.execucao ou pastas que as contenham (ex: data/lote)',
+    )
+    analisar = comandos.add_parser(
+        'analisar', help='detecta tom, BPM e acordes da mixagem'
+    )
+    analisar.add_argument('arquivo', help='arquivo de áudio')
+    analisar.add_argument(
+        '--streaming',
+        action='store_true',
+        help='lê o arquivo em blocos, com memória constante '
+        '(gravações muito longas)',
+    )
+    ajustar = comandos.add_parser(
+        'ajustar',
+        help='procura os parâmetros de extração vocal que mais se aproximam '
+        'de MIDIs de referência',
+    )
+    ajustar.add_argument(
+        'entradas',
+        nargs='+',
+        help='pares vocal e MIDI de referência: voz1.wav ref1.mid [voz2.wav ref2.mid ...]',
+    )
+    ajustar.add_argument(
+        '--saida', default='data/preset.json', help='arquivo JSON do preset'
+    )
+    ajustar.add_argument(
+        '--bpm', type=int, default=None, help='andamento (padrão: o do MIDI)'
+    )
+    ajustar.add_argument(
+        '--tom', default=None, help='tônica (padrão: estimada da referência)'
+    )
+    ajustar.add_argument('--modo', choices=('maior', 'menor'), default=None)
+    ajustar.add_argument(
+        '--estilo', default=None, help='nome do estilo para CONFIGS_POR_ESTILO'
+    )
+    ajustar.add_argument(
+        '--trilha',
+        default=None,
+        help='índice ou nome da trilha com a melodia nos MIDIs de referência '
+        '(padrão: a chamada de melodia/soprano/voz ou a mais monofônica)',
+    )
+    vivo = comandos.add_parser(
+        'ao-vivo',
+        help='transcreve em tempo real, mostrando cada nota assim que termina',
+    )
+    vivo.add_argument(
+        'entrada',
+        nargs='?',
+        default=None,
+        help='arquivo de áudio (tocado em tempo real), - para PCM bruto em '
+        'stdin ou vazio para a placa de som (precisa do sounddevice)',
+    )
+    vivo.add_argument(
+        '--dispositivo', default=None, help='dispositivo de captura'
+    )
+    vivo.add_argument('--bpm', type=int, default=120)
+    vivo.add_argument('--tom', default='C', help='tônica da escala')
+    vivo.add_argument('--modo', choices=('maior', 'menor'), default='maior')
+    vivo.add_argument(
+        '--formato',
+        choices=('float32', 'int16'),
+        default='float32',
+        help=f'formato do PCM em stdin (mono, {config.TAXA_AO_VIVO} Hz)',
+    )
+    vivo.add_argument(
+        '--sem-tempo-real',
+        dest='tempo_real',
+        action='store_false',
+        help='lê o arquivo o mais rápido possível',
+    )
+    vivo.add_argument(
+        '--saida', default=None, help='arquivo .mid para a melodia'
+    )
+    vivo.add_argument(
+        '--relatorio', default=None, help='arquivo JSON com notas e latências'
+    )
+    servico = comandos.add_parser(
+        'servico',
+        help='serviço local que mantém os modelos carregados e atende '
+        'tarefas por HTTP',
+    )
+    servico.add_argument('--host', default=config.HOST_SERVICO)
+    servico.add_argument('--porta', type=int, default=config.PORTA_SERVICO)
+    servico.add_argument(
+        '--tarefas',
+        type=int,
+        default=config.TAREFAS_SERVICO,
+        help='tarefas executadas ao mesmo tempo',
+    )
+    servico.add_argument(
+        '--fila',
+        type=int,
+        default=config.FILA_SERVICO,
+        help='tarefas que podem esperar na fila',
+    )
+    servico.add_argument(
+        '--no-stems',
+        dest='com_stems',
+        action='store_false',
+        default=argparse.SUPPRESS,
+        help='não carrega o Spleeter no aquecimento',
+    )
+    return parser
+
+
+def analisar_arquivo(caminho_audio, streaming=False):
+    """Mostra tom, BPM e acordes da mixagem, sem separar stems."""
+    from src.notalab.acordes import nome_acorde
+
+    if streaming:
+        from src.notalab.streaming import analisar_em_blocos
+
+        resultado = analisar_em_blocos(caminho_audio)
+    else:
+        from src.notalab.audio import carregar_audio
+        from src.notalab.pipeline import analisar_mix
+
+        sinal, taxa = carregar_audio(
+            caminho_audio, sr=config.TAXAS_POR_ETAPA['decodificacao']
+        )
+        resultado = analisar_mix(sinal, taxa)
+
+    print(f"Tonalidade: {resultado['tonica']} {resultado['modo']}")
+    print('BPM:', resultado['bpm'])
+    print(
+        'Acordes detectados:',
+        ', '.join(nome_acorde(idx) for idx in resultado['acordes']),
+    )
+    return resultado
+
+
+def main(argv=None):
+    args = _criar_parser().parse_args(argv)
+
+    if args.verificar_importacao:
+        from src.utils.importacao import verificar_orcamento_importacao
+
+        sys.exit(0 if verificar_orcamento_importacao() else 1)
+
+    if args.comando == 'analisar':
+        analisar_arquivo(args.arquivo, streaming=args.streaming)
+        return
+
+    if args.comando == 'ajustar':
+        from src.cli.ajuste import executar_ajuste
+
+        try:
+            executar_ajuste(
+                args.entradas,
+                saida=args.saida,
+                bpm=args.bpm,
+                tom=args.tom,
+                modo=args.modo,
+                estilo=args.estilo,
+                trilha=args.trilha,
+            )
+        except ValueError as e:
+            sys.exit(f'Erro: {e}')
+        return
+
+    if args.comando == 'ao-vivo':
+        from src.cli.ao_vivo import executar_ao_vivo
+
+        executar_ao_vivo(
+            args.entrada,
+            dispositivo=args.dispositivo,
+            bpm=args.bpm,
+            tom=args.tom,
+            modo=args.modo,
+            tempo_real=args.tempo_real,
+            formato=args.formato,
+            saida=args.saida,
+            relatorio=args.relatorio,
+        )
+        return
+
+    if args.comando == 'servico':
+        from src.cli.servico import executar_servico
+
+        executar_servico(
+            host=args.host,
+            porta=args.porta,
+            tarefas=args.tarefas,
+            fila=args.fila,
+            com_stems=args.com_stems,
+        )
+        return
+
+    if args.comando == 'retomar':
+        from src.cli.lote import executar_retomada
+
+        executar_retomada(args.entradas, perfil=args.perfil)
+        return
+
+    if args.comando == 'lote':
+        from src.cli.lote import executar_lote
+
+        executar_lote(
+            args.entradas,
+            saida=args.saida,
+            processos=args.processos,
+            saida_stems=args.stems,
+            com_stems=args.com_stems,
+            perfil=args.perfil,
+        )
+        return
+
+    from src.utils.set import selecionar_arquivo
+
     print('\n=== NotaLAB - Análise e Geração Musical ===\n')
 
     # Solicitar ao usuário que selecione o arquivo de áudio
@@ -42,89 +308,32 @@ def main():
 
     print(f'Arquivo selecionado: {caminho_audio}')
 
+    from src.notalab.audio import carregar_audio
+    from src.notalab.pipeline import processar_faixa
+
     # Carrega o áudio selecionado
     try:
-        sinal, taxa = carregar_audio(caminho_audio)
+        sinal, taxa = carregar_audio(
+            caminho_audio, sr=config.TAXAS_POR_ETAPA['decodificacao']
+        )
     except Exception as e:
         print(f'Erro ao carregar o arquivo: {e}')
         return
 
-    # Analisa características do áudio
-    print('\nAnalisando áudio...')
-    tonica, modo = detectar_tom(sinal, taxa)
-    print(f'Tonalidade: {tonica} {modo}')
-    bpm = detectar_bpm(sinal, taxa)
-    print('BPM:', bpm)
-
-    acordes_idx = detectar_acordes(sinal, taxa, bpm=bpm)
-    notas = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-    acordes_nomes = [notas[idx] for idx in acordes_idx]
-    print('Acordes detectados:', ', '.join(acordes_nomes))
-
-    # Separar os stems
-    print('\nSeparando vozes e instrumentos...')
-    print(separar_stems(caminho_audio))
-
-    # Extrai o nome do arquivo sem extensão para usar na pasta de stems
-    nome_arquivo = Path(caminho_audio).stem
+    # Obtém o caminho para a raiz do projeto (2 níveis acima de src/cli)
+    projeto_root = Path(__file__).parent.parent.parent
 
-    # Caminho para o arquivo vocal extraído pelo spleeter
-    caminho_vocal = os.path.join('stems', nome_arquivo, 'vocals.wav')
+    # Caminho completo para o arquivo MIDI na pasta data
+    caminho_midi = projeto_root / 'data' / 'harmonias_vocais.mid'
 
-    # Verifica se o arquivo de vocal existe
-    if not os.path.exists(caminho_vocal):
-        print(f'Arquivo vocal não encontrado em: {caminho_vocal}')
-        return
-
-    # Extrair notas do vocal e gerar harmonias automáticas
-    print('\nExtraindo notas do vocal e gerando harmonias...')
-
-    # Opção 1: Usar as configurações do config.py
-    notas_melodia = extrair_notas_vocal(
-        caminho_vocal,
-        bpm=bpm,
-        tom=tonica,
-        modo=modo,
-        sensibilidade_onset=config.SENSIBILIDADE_ONSET,
-        limite_agrupamento=config.LIMITE_AGRUPAMENTO,
-        min_dur=config.MIN_DURACAO_NOTA,
-        quantizar=config.QUANTIZAR,
-        grade_quantizacao=config.GRADE_QUANTIZACAO,
-        # Parâmetros avançados
-        pre_max=config.PRE_MAX,
-        post_max=config.POST_MAX,
-        pre_avg=config.PRE_AVG,
-        post_avg=config.POST_AVG,
-        wait=config.WAIT,
-    )
-
-
-    if notas_melodia:
-        print(f'Extraídas {len(notas_melodia)} notas da melodia vocal')
-        harmonias = gerar_harmonias_vocais(
-            notas_melodia, tom=tonica, modo=modo
-        )
-        partitura = montar_harmonia(harmonias)
-
-        # Obtém o caminho para a raiz do projeto (2 níveis acima de src/cli)
-        projeto_root = Path(__file__).parent.parent.parent
-        
-        # Cria o diretório data na raiz do projeto
-        data_dir = projeto_root / 'data'
-        data_dir.mkdir(exist_ok=True)
-        
-        # Caminho completo para o arquivo MIDI na pasta data
-        caminho_midi = data_dir / 'harmonias_vocais.mid'
-        
-        # Exportar para arquivo MIDI
-        mf = midi.translate.streamToMidiFile(partitura)
-        mf.open(str(caminho_midi), 'wb')
-        mf.write()
-        mf.close()
-        
-        print(f'Arquivo MIDI salvo em: {caminho_midi}')
-    else:
-        print('Não foi possível extrair notas do vocal.')
+    processar_faixa(
+        caminho_audio,
+        caminho_midi,
+        sinal=sinal,
+        taxa=taxa,
+        com_stems=args.com_stems,
+        perfil=args.perfil,
+    )
 
 
 if __name__ == '__main__':
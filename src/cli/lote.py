@@ -0,0 +1,380 @@
+"""
+Processamento em lote (sem interface gráfica) de pastas inteiras de áudio.
+
+Cada processo trabalhador mantém o seu próprio Separator carregado e tira
+as faixas de uma fila compartilhada: enquanto analisa a atual, já pega a
+próxima e a decodifica numa thread. Como cada trabalhador reserva no
+máximo uma faixa adiantada, faixas longas não atrasam a fila dos outros.
+"""
+import glob
+import json
+import multiprocessing
+import os
+import queue
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import config.config as config
+
+# Extensões consideradas ao varrer pastas
+EXTENSOES_AUDIO = ('.mp3', '.wav', '.flac', '.ogg', '.m4a')
+
+
+def listar_arquivos(entradas):
+    """
+    Expande pastas e padrões glob em uma lista ordenada de arquivos de áudio.
+
+    Args:
+        entradas (list): Pastas, padrões glob (ex: 'musicas/**/*.mp3') ou arquivos
+
+    Returns:
+        list: Caminhos únicos, na ordem em que foram encontrados
+    """
+    caminhos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            encontrados = sorted(
+                str(p)
+                for p in Path(entrada).rglob('*')
+                if p.suffix.lower() in EXTENSOES_AUDIO
+            )
+        elif glob.has_magic(entrada):
+            encontrados = sorted(glob.glob(entrada, recursive=True))
+        else:
+            encontrados = [entrada]
+        caminhos.extend(encontrados)
+    return list(dict.fromkeys(caminhos))
+
+
+def _carregar_separador(threads_tf):
+    """Carrega o Separator do trabalhador (só na primeira faixa do processo)."""
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    from src.notalab.stems import obter_separador
+
+    # Os processos do pool já paralelizam; o Spleeter grava no próprio processo
+    modelo = config.MODELO_VOCAL if config.SOMENTE_VOCAL else config.MODELO_STEMS
+    obter_separador(
+        modelo, threads_intra=threads_tf, threads_inter=1, multiprocess=False
+    )
+
+
+def nomes_de_saida(caminhos):
+    """
+    Escolhe um nome de saída único (MIDI, pasta de execução e de stems) por
+    arquivo.
+
+    Arquivos de pastas diferentes com o mesmo nome ganham um sufixo com o
+    início do hash do conteúdo (ex: 'intro-1a2b3c4d'); se até o conteúdo for
+    igual, só o primeiro é processado.
+
+    Args:
+        caminhos (list): Caminhos dos arquivos de áudio
+
+    Returns:
+        tuple: (dict caminho -> nome, dict caminho repetido -> caminho
+        original)
+    """
+    from src.notalab.cache_audio import hash_arquivo
+
+    por_nome = {}
+    for caminho in caminhos:
+        por_nome.setdefault(Path(caminho).stem.casefold(), []).append(caminho)
+
+    nomes, repetidos, usados = {}, {}, {}
+    for caminho in caminhos:
+        nome = Path(caminho).stem
+        if len(por_nome[nome.casefold()]) > 1:
+            nome = f'{nome}-{hash_arquivo(caminho)[:8]}'
+        if nome.casefold() in usados:
+            repetidos[caminho] = usados[nome.casefold()]
+            continue
+        usados[nome.casefold()] = caminho
+        nomes[caminho] = nome
+    return nomes, repetidos
+
+
+def _pre_carregar(caminho, caminho_midi):
+    """Decodifica uma faixa na taxa do pipeline ((None, None) se já concluída)."""
+    from src.notalab.audio import carregar_audio
+    from src.notalab.execucao import execucao_concluida, pasta_execucao
+
+    # Faixas já concluídas numa execução anterior não precisam do áudio
+    if config.SALVAR_EXECUCAO and execucao_concluida(pasta_execucao(caminho_midi)):
+        return None, None
+    return carregar_audio(caminho, config.TAXAS_POR_ETAPA['decodificacao'])
+
+
+def _processar_arquivo(
+    caminho,
+    nome,
+    pre_carga,
+    saida,
+    saida_stems,
+    threads_tf,
+    com_stems=True,
+    perfil=False,
+):
+    """
+    Processa uma faixa dentro de um trabalhador.
+
+    Falhas ao carregar o Separator ou ao decodificar o áudio viram o 'erro'
+    da faixa, como as do próprio pipeline.
+    """
+    from src.notalab.pipeline import processar_faixa
+
+    try:
+        if com_stems:
+            _carregar_separador(threads_tf)
+        sinal, taxa = pre_carga.result()
+        resultado = processar_faixa(
+            caminho,
+            Path(saida) / f'{nome}.mid',
+            sinal=sinal,
+            taxa=taxa,
+            saida_stems=saida_stems,
+            log=None,
+            com_stems=com_stems,
+            perfil=perfil,
+            nome_stems=nome,
+        )
+    except Exception as e:
+        return {'arquivo': caminho, 'erro': str(e)}
+
+    resumo = {
+        'arquivo': caminho,
+        'tonica': resultado['tonica'],
+        'modo': resultado['modo'],
+        'bpm': resultado['bpm'],
+        'notas': len(resultado['notas']),
+        'midi': resultado['caminho_midi'],
+    }
+    if perfil:
+        resumo['perfil'] = resultado['perfil']
+    return resumo
+
+
+def _trabalhar(
+    fila, concluidas, saida, saida_stems, threads_tf, com_stems=True, perfil=False
+):
+    """
+    Processa faixas da fila até ela esvaziar, devolvendo cada resultado em
+    `concluidas` assim que a faixa termina.
+
+    Enquanto uma faixa é analisada, a próxima da fila já é decodificada
+    numa thread e entra no pipeline como processar_faixa(sinal=..., taxa=...).
+    """
+    with ThreadPoolExecutor(max_workers=1) as decodificacao:
+
+        def proxima():
+            try:
+                caminho, nome = fila.get_nowait()
+            except queue.Empty:
+                return None
+            caminho_midi = Path(saida) / f'{nome}.mid'
+            return caminho, nome, decodificacao.submit(
+                _pre_carregar, caminho, caminho_midi
+            )
+
+        atual = proxima()
+        while atual is not None:
+            seguinte = proxima()
+            concluidas.put(
+                _processar_arquivo(
+                    *atual, saida, saida_stems, threads_tf, com_stems, perfil
+                )
+            )
+            atual = seguinte
+
+
+def _mostrar(resultado):
+    if 'erro' in resultado:
+        print(f"[erro] {resultado['arquivo']}: {resultado['erro']}")
+    else:
+        print(
+            f"[ok] {resultado['arquivo']}: "
+            f"{resultado['tonica']} {resultado['modo']}, "
+            f"{resultado['bpm']} BPM, {resultado['notas']} notas"
+        )
+
+
+def executar_lote(
+    entradas,
+    saida=config.PASTA_SAIDA_LOTE,
+    processos=None,
+    saida_stems='stems',
+    com_stems=True,
+    perfil=config.PERFILAR,
+):
+    """
+    Executa o pipeline completo sobre vários arquivos em um pool de processos.
+
+    Se um trabalhador morrer (ex: falha ao importar o TensorFlow), as faixas
+    que ainda não terminaram são marcadas com 'erro' e o resumo.json é
+    gravado mesmo assim.
+
+    Args:
+        entradas (list): Pastas, padrões glob ou arquivos de áudio
+        saida (str): Pasta onde cada faixa gera o seu <nome>.mid (ver
+            nomes_de_saida)
+        processos (int): Número de processos (padrão: núcleos disponíveis)
+        saida_stems (str): Pasta onde os stems são salvos
+        com_stems (bool): Se False, só analisa as mixagens (sem TensorFlow)
+        perfil (bool): Grava o perfil de cada faixa e o perfil_resumo.json
+
+    Returns:
+        list: Um dicionário de resultado por faixa (com 'erro' em caso de falha)
+    """
+    caminhos = listar_arquivos(entradas)
+    if not caminhos:
+        print('Nenhum arquivo de áudio encontrado.')
+        return []
+
+    nomes, repetidos = nomes_de_saida(caminhos)
+    resultados = []
+    for caminho, original in repetidos.items():
+        resultado = {
+            'arquivo': caminho,
+            'erro': f"mesmo nome e conteúdo de '{original}'",
+        }
+        _mostrar(resultado)
+        resultados.append(resultado)
+
+    processos = min(processos or os.cpu_count() or 1, max(1, len(nomes)))
+    threads_tf = max(1, (os.cpu_count() or 1) // processos)
+    Path(saida).mkdir(parents=True, exist_ok=True)
+    print(f'Processando {len(nomes)} arquivo(s) com {processos} processo(s)')
+
+    pendentes = dict(nomes)
+    with multiprocessing.Manager() as gerente:
+        fila, concluidas = gerente.Queue(), gerente.Queue()
+        for item in nomes.items():
+            fila.put(item)
+
+        def receber(resultado):
+            pendentes.pop(resultado['arquivo'], None)
+            _mostrar(resultado)
+            resultados.append(resultado)
+
+        with ProcessPoolExecutor(max_workers=processos) as pool:
+            futuros = [
+                pool.submit(
+                    _trabalhar,
+                    fila,
+                    concluidas,
+                    saida,
+                    saida_stems,
+                    threads_tf,
+                    com_stems,
+                    perfil,
+                )
+                for _ in range(processos)
+            ]
+            while pendentes and not all(f.done() for f in futuros):
+                try:
+                    receber(concluidas.get(timeout=0.5))
+                except queue.Empty:
+                    pass
+            # Resultados entregues logo antes de o último trabalhador sair
+            while not concluidas.empty():
+                receber(concluidas.get())
+
+            # BrokenProcessPool (processo morto) ou erro fora de uma faixa
+            falha = None
+            for futuro in futuros:
+                try:
+                    futuro.result()
+                except Exception as e:
+                    falha = falha or e
+
+    for caminho in pendentes:
+        resultado = {
+            'arquivo': caminho,
+            'erro': f'trabalhador interrompido: {falha or "faixa não processada"}',
+        }
+        _mostrar(resultado)
+        resultados.append(resultado)
+
+    perfis = [r.pop('perfil') for r in resultados if 'perfil' in r]
+    if perfis:
+        from src.utils.perfil import gravar_relatorio, resumir_perfis
+
+        gravar_relatorio(resumir_perfis(perfis), Path(saida) / 'perfil_resumo.json')
+
+    with open(Path(saida) / 'resumo.json', 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+    falhas = sum('erro' in r for r in resultados)
+    print(f'\nConcluído: {len(resultados) - falhas} ok, {falhas} com erro')
+    return resultados
+
+
+def listar_execucoes(entradas):
+    """
+    Encontra as pastas de execução (<nome>.execucao/) nas entradas.
+
+    Uma entrada pode ser a própria pasta de execução ou uma pasta que as
+    contenha (ex: a saída de um lote).
+    """
+    from src.notalab.execucao import NOME_ESTADO
+
+    pastas = []
+    for entrada in entradas:
+        entrada = Path(entrada)
+        if (entrada / NOME_ESTADO).is_file():
+            pastas.append(entrada)
+        elif entrada.is_dir():
+            pastas.extend(
+                sorted(p.parent for p in entrada.rglob(f'*.execucao/{NOME_ESTADO}'))
+            )
+    return list(dict.fromkeys(pastas))
+
+
+def executar_retomada(entradas, perfil=config.PERFILAR):
+    """
+    Continua execuções interrompidas a partir da última etapa concluída.
+
+    Cada pasta de execução guarda o áudio, o MIDI e as opções da execução
+    original; as faixas já concluídas são puladas.
+
+    Args:
+        entradas (list): Pastas de execução ou pastas que as contenham
+        perfil (bool): Grava o perfil de cada faixa retomada
+
+    Returns:
+        list: Um dicionário de resultado por faixa retomada
+    """
+    from src.notalab.execucao import execucao_concluida, ler_estado
+    from src.notalab.pipeline import processar_faixa
+
+    pastas = listar_execucoes(entradas)
+    pendentes = [p for p in pastas if not execucao_concluida(p)]
+    print(
+        f'{len(pastas)} execução(ões) encontrada(s), '
+        f'{len(pendentes)} para retomar'
+    )
+    resultados = []
+    for pasta in pendentes:
+        estado = ler_estado(pasta)
+        try:
+            resultado = processar_faixa(
+                estado['audio'],
+                estado['midi'],
+                saida_stems=estado['stems'],
+                log=None,
+                com_stems=estado['com_stems'],
+                perfil=perfil,
+                somente_vocal=estado['somente_vocal'],
+                nome_stems=estado.get('nome_stems'),
+            )
+            resultados.append(
+                {
+                    'arquivo': estado['audio'],
+                    'notas': len(resultado['notas']),
+                    'midi': resultado['caminho_midi'],
+                }
+            )
+            print(f"[ok] {estado['audio']}: {len(resultado['notas'])} notas")
+        except Exception as e:
+            resultados.append({'arquivo': estado['audio'], 'erro': str(e)})
+            print(f"[erro] {estado['audio']}: {e}")
+    return resultados
@@ -0,0 +1,480 @@
+"""
+Serviço local de análise que mantém os modelos carregados.
+
+O processo é iniciado uma vez (python main.py servico): importa librosa e o
+pipeline, carrega o Separator do Spleeter e roda um aquecimento curto (JIT
+do numba, bancos de filtros, grafo do TensorFlow). Depois atende tarefas por
+HTTP em localhost sem pagar de novo a inicialização, então um trecho curto
+volta em bem menos de um segundo.
+
+Protocolo:
+    POST /tarefas  Corpo JSON (Content-Type: application/json, o que obriga
+                   o navegador a pedir permissão CORS antes de enviar) com
+                   'tipo' e os argumentos da tarefa. A
+                   resposta é NDJSON (um evento JSON por linha) enviada aos
+                   poucos: 'aceita', 'inicio', 'progresso'... e por fim
+                   'resultado' ou 'erro'. Com a fila cheia, responde 503.
+    GET /estado    Tarefas na fila, em execução, concluídas e com erro.
+
+Só são aceitos pedidos com Host 127.0.0.1 ou localhost (na porta do
+serviço), para que uma página aberta no navegador não consiga usá-lo.
+
+Tipos de tarefa:
+    analise      {'caminho'}: tom, BPM e acordes da mixagem
+    transcricao  {'caminho', 'saida'?, 'stems'?}: pipeline completo (notas
+                 e MIDI)
+    midi         {'notas', 'tom'?, 'modo'?, 'bpm'?, 'saida'}: harmonias e
+                 MIDI a partir de notas já transcritas ([nome, duração])
+
+'saida' e 'stems' são caminhos relativos a PASTA_SAIDA_SERVICO; caminhos
+absolutos ou com '..' são recusados.
+
+Exemplo:
+    curl -N -H 'Content-Type: application/json' \\
+        -d '{"tipo": "analise", "caminho": "musica.mp3"}' \\
+        http://127.0.0.1:8765/tarefas
+"""
+import http.client
+import itertools
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import config.config as config
+
+# Eventos que encerram o fluxo de uma tarefa
+EVENTOS_FINAIS = ('resultado', 'erro')
+
+# Nomes aceitos no cabeçalho Host (além do endereço de escuta)
+HOSTS_LOCAIS = ('127.0.0.1', 'localhost')
+
+# Uma trava por arquivo de saída: duas tarefas que gravariam o mesmo MIDI
+# (e a mesma pasta de execução) rodam uma depois da outra
+_travas_saida = {}
+_trava_travas = threading.Lock()
+
+
+def _trava_da_saida(caminho):
+    with _trava_travas:
+        return _travas_saida.setdefault(str(caminho), threading.Lock())
+
+
+def caminho_de_saida(relativo, base=None):
+    """
+    Resolve um caminho pedido pelo cliente dentro da pasta de saída.
+
+    Raises:
+        ValueError: Caminho absoluto ou com '..'
+    """
+    base = Path(base or config.PASTA_SAIDA_SERVICO)
+    relativo = Path(relativo)
+    if relativo.is_absolute() or relativo.anchor or '..' in relativo.parts:
+        raise ValueError(
+            f"caminho de saída deve ser relativo a '{base}' e sem '..': "
+            f"'{relativo}'"
+        )
+    return base / relativo
+
+
+def _para_json(valor):
+    """Converte arrays e escalares do numpy (e Eventos) para JSON."""
+    if hasattr(valor, 'tolist'):
+        return valor.tolist()
+    if hasattr(valor, '__iter__'):
+        return list(valor)
+    return str(valor)
+
+
+def _argumento(argumentos, nome):
+    if nome not in argumentos:
+        raise ValueError(f"argumento obrigatório ausente: '{nome}'")
+    return argumentos[nome]
+
+
+def _resumo_analise(resultado):
+    from src.notalab.acordes import nome_acorde
+
+    return {
+        'tonica': resultado['tonica'],
+        'modo': resultado['modo'],
+        'bpm': resultado['bpm'],
+        'acordes': [nome_acorde(idx) for idx in resultado['acordes']],
+    }
+
+
+def tarefa_analise(argumentos, progresso):
+    """Tom, BPM e acordes da mixagem (sem separar stems)."""
+    from src.notalab.pipeline import processar_faixa
+
+    resultado = processar_faixa(
+        _argumento(argumentos, 'caminho'),
+        None,
+        log=progresso,
+        com_stems=False,
+        perfil=False,
+    )
+    return _resumo_analise(resultado)
+
+
+def tarefa_transcricao(argumentos, progresso):
+    """Pipeline completo: análise, vocal, notas, harmonias e MIDI."""
+    from src.notalab.cache_audio import hash_arquivo
+    from src.notalab.pipeline import processar_faixa
+
+    caminho = _argumento(argumentos, 'caminho')
+    if argumentos.get('saida'):
+        saida = caminho_de_saida(argumentos['saida'])
+    else:
+        # O hash no nome separa faixas homônimas de pastas diferentes
+        saida = caminho_de_saida(
+            f'{Path(caminho).stem}-{hash_arquivo(caminho)[:12]}.mid'
+        )
+    stems = caminho_de_saida(argumentos.get('stems', 'stems'))
+    # Os stems ficam em stems/<nome do MIDI>, para que faixas homônimas não
+    # gravem na mesma pasta fora da trava da saída
+    with _trava_da_saida(saida.resolve()):
+        resultado = processar_faixa(
+            caminho,
+            saida,
+            saida_stems=stems,
+            log=progresso,
+            nome_stems=saida.stem,
+        )
+    return {
+        **_resumo_analise(resultado),
+        'notas': list(resultado['notas']),
+        'midi': resultado['caminho_midi'],
+    }
+
+
+def tarefa_midi(argumentos, progresso):
+    """Gera as harmonias de notas já transcritas e grava o MIDI."""
+    from src.notalab.harmonia import gerar_harmonias_vocais
+    from src.notalab.pipeline import exportar_midi
+
+    notas = [(nome, float(dur)) for nome, dur in _argumento(argumentos, 'notas')]
+    saida = caminho_de_saida(_argumento(argumentos, 'saida'))
+    harmonias = gerar_harmonias_vocais(
+        notas,
+        tom=argumentos.get('tom', 'C'),
+        modo=argumentos.get('modo', 'maior'),
+    )
+    with _trava_da_saida(saida.resolve()):
+        exportar_midi(harmonias, saida, bpm=argumentos.get('bpm', 120))
+    progresso(f'Arquivo MIDI salvo em: {saida}')
+    return {'midi': str(saida), 'vozes': list(harmonias)}
+
+
+# Tipo de tarefa -> função (argumentos, progresso) -> resultado
+TIPOS = {
+    'analise': tarefa_analise,
+    'transcricao': tarefa_transcricao,
+    'midi': tarefa_midi,
+}
+
+
+class Tarefa:
+    """
+    Uma tarefa na fila do serviço.
+
+    Os eventos (dicionários) são publicados pela thread que executa a tarefa
+    e lidos pela thread da conexão HTTP, que os repassa ao cliente.
+    """
+
+    def __init__(self, identificador, tipo, argumentos):
+        self.id = identificador
+        self.tipo = tipo
+        self.argumentos = argumentos
+        self.eventos = queue.Queue()
+        self.criada = time.perf_counter()
+
+    def publicar(self, evento, **dados):
+        self.eventos.put({'evento': evento, 'id': self.id, **dados})
+
+    def progresso(self, *partes):
+        """Recebe as mensagens de log do pipeline (mesma assinatura do print)."""
+        mensagem = ' '.join(str(p) for p in partes).strip()
+        if mensagem:
+            self.publicar('progresso', mensagem=mensagem)
+
+
+class Servico:
+    """
+    Fila limitada de tarefas atendida por um número fixo de threads.
+
+    Args:
+        tarefas (int): Tarefas executadas ao mesmo tempo
+        fila (int): Tarefas que podem esperar na fila
+    """
+
+    def __init__(self, tarefas=config.TAREFAS_SERVICO, fila=config.FILA_SERVICO):
+        self.fila = queue.Queue(maxsize=max(1, fila))
+        self._ids = itertools.count(1)
+        self._trava = threading.Lock()
+        self.em_execucao = 0
+        self.concluidas = 0
+        self.falhas = 0
+        self._threads = [
+            threading.Thread(target=self._trabalhar, daemon=True)
+            for _ in range(max(1, tarefas))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def enviar(self, tipo, argumentos):
+        """
+        Coloca uma tarefa na fila.
+
+        Returns:
+            Tarefa: Tarefa criada (ler os eventos em tarefa.eventos)
+
+        Raises:
+            ValueError: Tipo de tarefa desconhecido
+            queue.Full: A fila está cheia
+        """
+        if tipo not in TIPOS:
+            raise ValueError(
+                f"tipo de tarefa desconhecido: '{tipo}' "
+                f"(use {', '.join(TIPOS)})"
+            )
+        tarefa = Tarefa(next(self._ids), tipo, argumentos)
+        # Publicado antes de entrar na fila para vir antes do 'inicio'
+        tarefa.publicar('aceita', tipo=tipo, posicao=self.fila.qsize() + 1)
+        self.fila.put_nowait(tarefa)
+        return tarefa
+
+    def estado(self):
+        with self._trava:
+            return {
+                'fila': self.fila.qsize(),
+                'capacidade_fila': self.fila.maxsize,
+                'em_execucao': self.em_execucao,
+                'concluidas': self.concluidas,
+                'falhas': self.falhas,
+                'threads': len(self._threads),
+            }
+
+    def encerrar(self):
+        """Termina as threads depois das tarefas já aceitas."""
+        for _ in self._threads:
+            self.fila.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _trabalhar(self):
+        while True:
+            tarefa = self.fila.get()
+            if tarefa is None:
+                return
+            with self._trava:
+                self.em_execucao += 1
+            inicio = time.perf_counter()
+            tarefa.publicar('inicio', espera=round(inicio - tarefa.criada, 3))
+            try:
+                resultado = TIPOS[tarefa.tipo](tarefa.argumentos, tarefa.progresso)
+            except Exception as e:
+                with self._trava:
+                    self.falhas += 1
+                tarefa.publicar('erro', mensagem=f'{type(e).__name__}: {e}')
+            else:
+                with self._trava:
+                    self.concluidas += 1
+                tarefa.publicar(
+                    'resultado',
+                    resultado=resultado,
+                    segundos=round(time.perf_counter() - inicio, 3),
+                )
+            finally:
+                with self._trava:
+                    self.em_execucao -= 1
+
+
+class _Manipulador(BaseHTTPRequestHandler):
+    # HTTP/1.1 para enviar a resposta em partes (chunked)
+    protocol_version = 'HTTP/1.1'
+
+    def _responder_json(self, status, dados):
+        corpo = json.dumps(dados, ensure_ascii=False, default=_para_json).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        if status >= 400:
+            # O corpo do pedido recusado pode não ter sido lido
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _enviar_parte(self, dados):
+        linha = json.dumps(dados, ensure_ascii=False, default=_para_json) + '\n'
+        parte = linha.encode()
+        self.wfile.write(f'{len(parte):X}\r\n'.encode() + parte + b'\r\n')
+        self.wfile.flush()
+
+    def _host_local(self):
+        """Recusa Host de fora (DNS rebinding de uma página da web)."""
+        host, porta = self.server.server_address[:2]
+        aceitos = {f'{nome}:{porta}' for nome in (*HOSTS_LOCAIS, host)}
+        if self.headers.get('Host', '').lower() in aceitos:
+            return True
+        self._responder_json(403, {'erro': 'Host não permitido'})
+        return False
+
+    def do_GET(self):
+        if not self._host_local():
+            return
+        if self.path.rstrip('/') == '/estado':
+            self._responder_json(200, self.server.servico.estado())
+        else:
+            self._responder_json(404, {'erro': 'use GET /estado ou POST /tarefas'})
+
+    def do_POST(self):
+        if not self._host_local():
+            return
+        if self.path.rstrip('/') != '/tarefas':
+            self._responder_json(404, {'erro': 'use POST /tarefas'})
+            return
+        # Um formulário ou fetch 'simples' de outra origem não consegue
+        # enviar application/json sem passar pela verificação CORS
+        tipo_conteudo = self.headers.get('Content-Type', '')
+        if tipo_conteudo.split(';')[0].strip().lower() != 'application/json':
+            self._responder_json(
+                415, {'erro': 'Content-Type deve ser application/json'}
+            )
+            return
+        try:
+            tamanho = int(self.headers.get('Content-Length', 0))
+            pedido = json.loads(self.rfile.read(tamanho) or b'{}')
+            if not isinstance(pedido, dict):
+                raise ValueError('o corpo deve ser um objeto JSON')
+            tarefa = self.server.servico.enviar(
+                pedido.pop('tipo', None), pedido
+            )
+        except ValueError as e:
+            self._responder_json(400, {'erro': str(e)})
+            return
+        except queue.Full:
+            self._responder_json(503, {'erro': 'fila cheia, tente mais tarde'})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        conectado = True
+        while True:
+            evento = tarefa.eventos.get()
+            if conectado:
+                try:
+                    self._enviar_parte(evento)
+                except (BrokenPipeError, ConnectionResetError):
+                    # O cliente desistiu; a tarefa continua até o fim
+                    conectado = False
+            if evento['evento'] in EVENTOS_FINAIS:
+                break
+        if conectado:
+            self.wfile.write(b'0\r\n\r\n')
+
+    def log_message(self, formato, *args):
+        print(f'[{self.log_date_time_string()}] {formato % args}')
+
+
+def aquecer(com_stems=True):
+    """
+    Importa os módulos e roda cada etapa uma vez num sinal curto, para que
+    a primeira tarefa não pague JIT, filtros nem carregamento do modelo.
+    """
+    import numpy as np
+
+    from src.notalab.harmonia import rastrear_pitch
+    from src.notalab.pipeline import analisar_mix
+
+    taxa = config.TAXAS_POR_ETAPA['decodificacao']
+    t = np.arange(2 * taxa) / taxa
+    sinal = sum(
+        np.sin(2 * np.pi * f * t) for f in (261.63, 329.63, 392.0)
+    ).astype(np.float32) / 3
+    analisar_mix(sinal, taxa)
+    rastrear_pitch(sinal[: taxa // 2], taxa)
+
+    if com_stems:
+        from src.notalab.stems import TAXA_SPLEETER, obter_separador
+
+        modelo = config.MODELO_VOCAL if config.SOMENTE_VOCAL else config.MODELO_STEMS
+        # A primeira separação monta o grafo de predição do TensorFlow
+        obter_separador(modelo).separate(
+            np.zeros((TAXA_SPLEETER, 2), dtype=np.float32), 'aquecimento'
+        )
+
+
+def executar_servico(
+    host=config.HOST_SERVICO,
+    porta=config.PORTA_SERVICO,
+    tarefas=config.TAREFAS_SERVICO,
+    fila=config.FILA_SERVICO,
+    com_stems=True,
+):
+    """
+    Aquece os modelos e atende tarefas até Ctrl+C.
+
+    Args:
+        host (str): Endereço de escuta
+        porta (int): Porta TCP
+        tarefas (int): Tarefas executadas ao mesmo tempo
+        fila (int): Tarefas que podem esperar na fila
+        com_stems (bool): Carrega o Spleeter no aquecimento (sem ele, a
+            primeira transcrição é que paga o carregamento)
+    """
+    inicio = time.perf_counter()
+    print('Aquecendo modelos...')
+    aquecer(com_stems)
+    print(f'Pronto em {time.perf_counter() - inicio:.1f} s')
+
+    servidor = ThreadingHTTPServer((host, porta), _Manipulador)
+    servidor.daemon_threads = True
+    servidor.servico = Servico(tarefas, fila)
+    print(
+        f'Serviço em http://{host}:{porta} '
+        f'({tarefas} tarefa(s) ao mesmo tempo, fila de {fila})'
+    )
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print('\nEncerrando...')
+    finally:
+        servidor.server_close()
+        servidor.servico.encerrar()
+
+
+def enviar_tarefa(
+    tipo, host=config.HOST_SERVICO, porta=config.PORTA_SERVICO, **argumentos
+):
+    """
+    Envia uma tarefa a um serviço em execução e devolve os eventos à medida
+    que chegam.
+
+    Yields:
+        dict: Eventos da tarefa; o último é 'resultado' ou 'erro'
+
+    Raises:
+        RuntimeError: O serviço recusou a tarefa (fila cheia, tipo inválido)
+    """
+    conexao = http.client.HTTPConnection(host, porta)
+    try:
+        conexao.request(
+            'POST',
+            '/tarefas',
+            body=json.dumps({'tipo': tipo, **argumentos}),
+            headers={'Content-Type': 'application/json'},
+        )
+        resposta = conexao.getresponse()
+        if resposta.status != 200:
+            raise RuntimeError(json.loads(resposta.read())['erro'])
+        for linha in resposta:
+            if linha.strip():
+                yield json.loads(linha)
+    finally:
+        conexao.close()
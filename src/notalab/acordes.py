@@ -0,0 +1,153 @@
+"""
+Módulo com o motor de reconhecimento de acordes por templates.
+Pontua todos os acordes maiores, menores e com sétima de uma vez e suaviza
+a sequência com um Viterbi vetorizado.
+"""
+import numpy as np
+
+from src.notalab.escalas import NOTAS
+
+# Tipos de acorde na ordem dos blocos de 12 templates
+TIPOS_ACORDE = ('maior', 'menor', '7')
+
+# Intervalos (em semitons a partir da raiz) de cada tipo
+INTERVALOS_ACORDE = {
+    'maior': (0, 4, 7),
+    'menor': (0, 3, 7),
+    '7': (0, 4, 7, 10),
+}
+
+# Sufixo usado no nome do acorde (ex: 'A' + 'm' = 'Am')
+SUFIXOS_ACORDE = {'maior': '', 'menor': 'm', '7': '7'}
+
+
+def _montar_templates():
+    """Monta a matriz (36, 12) de templates normalizados (norma unitária)."""
+    templates = np.zeros((len(TIPOS_ACORDE) * 12, 12))
+    for t, tipo in enumerate(TIPOS_ACORDE):
+        for raiz in range(12):
+            for intervalo in INTERVALOS_ACORDE[tipo]:
+                templates[t * 12 + raiz, (raiz + intervalo) % 12] = 1.0
+    templates /= np.linalg.norm(templates, axis=1, keepdims=True)
+    return templates
+
+
+TEMPLATES = _montar_templates()
+
+
+def raiz_acorde(idx):
+    """Retorna o índice (0-11) da raiz do acorde."""
+    return int(idx) % 12
+
+
+def tipo_acorde(idx):
+    """Retorna o tipo do acorde ('maior', 'menor' ou '7')."""
+    return TIPOS_ACORDE[int(idx) // 12]
+
+
+def nome_acorde(idx):
+    """Retorna o nome do acorde, ex.: 0 -> 'C', 21 -> 'Am', 31 -> 'G7'."""
+    return NOTAS[raiz_acorde(idx)] + SUFIXOS_ACORDE[tipo_acorde(idx)]
+
+
+def notas_acorde(idx, oitava=3):
+    """
+    Retorna os nomes (com oitava) das notas do acorde em posição fundamental.
+
+    Args:
+        idx (int): Índice do acorde (0-35)
+        oitava (int): Oitava da raiz
+
+    Returns:
+        list: Nomes das notas, ex.: ['A3', 'C4', 'E4']
+    """
+    raiz = 12 * (oitava + 1) + raiz_acorde(idx)
+    return [
+        f'{NOTAS[(raiz + i) % 12]}{(raiz + i) // 12 - 1}'
+        for i in INTERVALOS_ACORDE[tipo_acorde(idx)]
+    ]
+
+
+def pontuar_acordes(croma):
+    """
+    Pontua todos os templates contra cada coluna do cromagrama.
+
+    Args:
+        croma (np.ndarray): Cromagrama (12, n) já agregado por compasso/batida
+
+    Returns:
+        np.ndarray: Similaridade de cosseno (36, n) entre templates e colunas
+    """
+    norma = np.linalg.norm(croma, axis=0, keepdims=True)
+    return TEMPLATES @ (croma / np.maximum(norma, 1e-12))
+
+
+def pontuacao_compassos(pontuacoes, marcas):
+    """
+    Média do melhor template nos compassos inteiros de uma fase.
+
+    O trecho antes da primeira marca (anacruse ou silêncio inicial) e o
+    depois da última não são compassos completos e ficam de fora; senão a
+    fase cujo primeiro trecho é silêncio perde para uma deslocada.
+
+    Args:
+        pontuacoes (np.ndarray): Saída de pontuar_acordes para os trechos
+            de librosa.util.sync(croma, marcas)
+        marcas (np.ndarray): Frames (ou colunas) onde começa cada compasso
+
+    Returns:
+        float: Pontuação da fase (maior = compassos mais parecidos com acordes)
+    """
+    melhores = pontuacoes.max(axis=0)
+    inicio = 1 if marcas[0] > 0 else 0
+    inteiros = melhores[inicio : inicio + len(marcas) - 1]
+    return (inteiros if len(inteiros) else melhores).mean()
+
+
+def viterbi_acordes(pontuacoes, prob_permanencia=0.6, temperatura=60.0):
+    """
+    Suaviza a sequência de acordes com Viterbi.
+
+    A transição tem só duas opções (permanecer no acorde ou trocar para
+    qualquer outro com a mesma probabilidade), então cada passo é resolvido
+    com operações vetorizadas sobre os 36 estados.
+
+    Args:
+        pontuacoes (np.ndarray): Saída de pontuar_acordes (36, n)
+        prob_permanencia (float): Probabilidade de manter o acorde anterior
+        temperatura (float): Escala das pontuações antes do softmax. Acordes
+            que dividem duas notas (ex: Am e F) ficam a ~0.1 de cosseno um do
+            outro; com escala baixa essa diferença custa menos que uma troca
+            e o Viterbi emenda o acorde certo no vizinho
+
+    Returns:
+        np.ndarray: Índice do acorde escolhido para cada coluna
+    """
+    n_estados, n = pontuacoes.shape
+    if n == 0:
+        return np.zeros(0, dtype=int)
+
+    # Log-probabilidades de emissão via softmax por coluna
+    logits = temperatura * pontuacoes
+    logits -= logits.max(axis=0, keepdims=True)
+    emissao = logits - np.log(np.exp(logits).sum(axis=0, keepdims=True))
+
+    log_ficar = np.log(prob_permanencia)
+    log_trocar = np.log((1.0 - prob_permanencia) / (n_estados - 1))
+
+    delta = emissao[:, 0] - np.log(n_estados)
+    retorno = np.zeros((n, n_estados), dtype=int)
+    estados = np.arange(n_estados)
+    for t in range(1, n):
+        melhor = int(np.argmax(delta))
+        ficar = delta + log_ficar
+        trocar = delta[melhor] + log_trocar
+        usa_ficar = ficar >= trocar
+        retorno[t] = np.where(usa_ficar, estados, melhor)
+        delta = np.where(usa_ficar, ficar, trocar) + emissao[:, t]
+
+    caminho = np.zeros(n, dtype=int)
+    caminho[-1] = int(np.argmax(delta))
+    for t in range(n - 1, 0, -1):
+        caminho[t - 1] = retorno[t, caminho[t]]
+    return caminho
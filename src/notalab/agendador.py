@@ -0,0 +1,156 @@
+"""
+Agendador de etapas do pipeline por grafo de dependências.
+
+Etapas independentes (ex: análise da mixagem e separação de stems) rodam ao
+mesmo tempo num pool de threads: as etapas do pipeline são closures sobre o
+sinal já decodificado e passam a maior parte do tempo em numpy, librosa e
+TensorFlow, que liberam o GIL. Ao final, o agendador informa quanto cada
+etapa levou e qual foi o caminho crítico da execução.
+"""
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class Agendador:
+    """
+    Executa funções respeitando as dependências entre elas.
+
+    Cada etapa recebe como argumentos nomeados os resultados das etapas das
+    quais depende (o nome da etapa vira o nome do argumento).
+
+    Args:
+        max_threads (int): Threads do pool de threads (1 = sequencial)
+    """
+
+    def __init__(self, max_threads=None):
+        self.max_threads = max_threads
+        self.etapas = {}
+        self.resultados = {}
+        self.tempos = {}
+
+    def adicionar(self, nome, funcao, dependencias=()):
+        """
+        Registra uma etapa.
+
+        Args:
+            nome (str): Nome da etapa (também o nome do argumento nas dependentes)
+            funcao (callable): Função chamada com os resultados das dependências
+            dependencias (tuple): Nomes das etapas que precisam terminar antes
+        """
+        if nome in self.etapas:
+            raise ValueError(f'Etapa duplicada: {nome}')
+        self.etapas[nome] = (funcao, tuple(dependencias))
+
+    def _ordem_topologica(self):
+        ordem = []
+        estado = {}
+
+        def visitar(nome, pilha):
+            if estado.get(nome) == 'feito':
+                return
+            if nome in pilha:
+                raise ValueError(f"Dependência circular: {' -> '.join(pilha + [nome])}")
+            if nome not in self.etapas:
+                raise ValueError(f'Etapa desconhecida: {nome}')
+            for dependencia in self.etapas[nome][1]:
+                visitar(dependencia, pilha + [nome])
+            estado[nome] = 'feito'
+            ordem.append(nome)
+
+        for nome in self.etapas:
+            visitar(nome, [])
+        return ordem
+
+    def executar(self):
+        """
+        Executa todas as etapas, o máximo possível em paralelo.
+
+        Returns:
+            dict: Resultado de cada etapa, pelo nome
+
+        Raises:
+            Exception: A primeira exceção lançada por uma etapa
+        """
+        self._ordem_topologica()
+        pendentes = dict(self.etapas)
+        em_execucao = {}
+        self.inicio = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_threads) as pool_threads:
+            try:
+                while pendentes or em_execucao:
+                    prontas = [
+                        nome
+                        for nome, (_, dependencias) in pendentes.items()
+                        if all(d in self.resultados for d in dependencias)
+                    ]
+                    for nome in prontas:
+                        funcao, dependencias = pendentes.pop(nome)
+                        argumentos = {d: self.resultados[d] for d in dependencias}
+                        self.tempos[nome] = [time.perf_counter(), None]
+                        # A etapa enxerga o contexto de quem chamou executar()
+                        # (ex: o perfil ativo, ver src.utils.perfil)
+                        futuro = pool_threads.submit(
+                            contextvars.copy_context().run, funcao, **argumentos
+                        )
+                        em_execucao[futuro] = nome
+
+                    concluidos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+                    for futuro in concluidos:
+                        nome = em_execucao.pop(futuro)
+                        self.tempos[nome][1] = time.perf_counter()
+                        self.resultados[nome] = futuro.result()
+            except BaseException:
+                for futuro in em_execucao:
+                    futuro.cancel()
+                raise
+
+        self.fim = time.perf_counter()
+        return self.resultados
+
+    def caminho_critico(self):
+        """
+        Calcula a cadeia de dependências de maior duração somada.
+
+        Returns:
+            tuple: (lista de etapas do caminho, duração total em segundos)
+        """
+        acumulado = {}
+        anterior = {}
+        for nome in self._ordem_topologica():
+            inicio, fim = self.tempos.get(nome, (0.0, 0.0))
+            duracao = (fim or inicio) - inicio
+            dependencias = self.etapas[nome][1]
+            melhor = max(dependencias, key=lambda d: acumulado[d], default=None)
+            acumulado[nome] = duracao + (acumulado[melhor] if melhor else 0.0)
+            anterior[nome] = melhor
+
+        if not acumulado:
+            return [], 0.0
+        nome = max(acumulado, key=acumulado.get)
+        total = acumulado[nome]
+        caminho = []
+        while nome is not None:
+            caminho.append(nome)
+            nome = anterior[nome]
+        return caminho[::-1], total
+
+    def relatorio(self):
+        """
+        Resume a execução: duração de cada etapa, tempo total e caminho crítico.
+
+        Returns:
+            dict: 'etapas' (segundos por etapa), 'total' e 'caminho_critico'
+        """
+        caminho, duracao_caminho = self.caminho_critico()
+        return {
+            'etapas': {
+                nome: round(fim - inicio, 3)
+                for nome, (inicio, fim) in self.tempos.items()
+                if fim is not None
+            },
+            'total': round(self.fim - self.inicio, 3),
+            'caminho_critico': caminho,
+            'duracao_caminho_critico': round(duracao_caminho, 3),
+        }
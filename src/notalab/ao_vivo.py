@@ -0,0 +1,443 @@
+"""
+Transcrição ao vivo: notas emitidas enquanto o áudio chega, em quadros curtos.
+
+A fonte de áudio é qualquer iterável de blocos mono na taxa de análise
+(arquivo tocado em tempo real, pipe com PCM bruto ou placa de som). Cada bloco
+atualiza o envelope de onset (fluxo espectral mel, como em streaming.py), a
+escolha incremental de picos e um rastreador de pitch quadro a quadro (YIN).
+Um segmento é fechado num onset confirmado, quando a voz entra ou sai ou
+quando a altura muda (legato) por SILENCIO_FECHA_NOTA segundos. Ele vira
+nota pela mesma regra de segmentar_notas: mediana do pitch dos quadros com
+voz, ajustada à escala.
+
+Cada nota guarda a latência medida entre a chegada do áudio do seu fim e a
+sua emissão.
+"""
+import sys
+import time
+from collections import deque
+
+import librosa
+import numpy as np
+
+import config.config as config
+from src.notalab.escalas import ajustar_a_escala, hz_para_midi, nome_de_midi
+from src.notalab.eventos import Eventos
+from src.notalab.streaming import DetectorOnsetsIncremental
+
+# Distância (semitons) da mediana do segmento que conta como troca de nota
+DESVIO_TROCA_NOTA = 0.75
+
+
+def fonte_arquivo(
+    caminho,
+    taxa=config.TAXA_AO_VIVO,
+    quadro=config.QUADRO_AO_VIVO,
+    tempo_real=True,
+):
+    """
+    Lê um arquivo em blocos de `quadro` amostras.
+
+    Args:
+        caminho (str): Arquivo de áudio
+        taxa (int): Taxa de amostragem de análise
+        quadro (int): Amostras por bloco
+        tempo_real (bool): Entrega cada bloco só quando ele "tocaria", como
+            se viesse de um microfone; sem isso, entrega o mais rápido possível
+
+    Yields:
+        np.ndarray: Blocos mono float32
+    """
+    from src.notalab.audio import carregar_audio
+
+    sinal, _ = carregar_audio(caminho, sr=taxa)
+    inicio = time.perf_counter()
+    for posicao in range(0, len(sinal), quadro):
+        bloco = np.asarray(sinal[posicao:posicao + quadro], dtype=np.float32)
+        if tempo_real:
+            espera = inicio + (posicao + len(bloco)) / taxa - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+        yield bloco
+
+
+def fonte_pipe(
+    entrada=None, quadro=config.QUADRO_AO_VIVO, formato='float32', canais=1
+):
+    """
+    Lê PCM bruto intercalado de um arquivo binário (padrão: stdin).
+
+    Ex.: ffmpeg -i voz.mp3 -f f32le -ac 1 -ar 22050 - | python main.py ao-vivo -
+
+    Args:
+        entrada: Objeto binário com read() (padrão: sys.stdin.buffer)
+        quadro (int): Amostras (por canal) por bloco
+        formato (str): 'float32' ou 'int16'
+        canais (int): Canais intercalados na entrada (a saída é a média)
+
+    Yields:
+        np.ndarray: Blocos mono float32
+    """
+    entrada = entrada or sys.stdin.buffer
+    tipo = np.dtype(np.float32 if formato == 'float32' else np.int16)
+    tamanho = quadro * canais * tipo.itemsize
+    resto = b''
+    while True:
+        dados = entrada.read(tamanho - len(resto))
+        if not dados:
+            break
+        resto += dados
+        if len(resto) < tamanho:
+            continue
+        yield _pcm_para_mono(resto, tipo, canais)
+        resto = b''
+    # Amostras completas que sobraram no fim do pipe
+    util = len(resto) - len(resto) % (tipo.itemsize * canais)
+    if util:
+        yield _pcm_para_mono(resto[:util], tipo, canais)
+
+
+def _pcm_para_mono(dados, tipo, canais):
+    amostras = np.frombuffer(dados, dtype=tipo).astype(np.float32)
+    if tipo == np.int16:
+        amostras /= 32768.0
+    return amostras.reshape(-1, canais).mean(axis=1)
+
+
+def fonte_dispositivo(
+    taxa=config.TAXA_AO_VIVO, quadro=config.QUADRO_AO_VIVO, dispositivo=None
+):
+    """
+    Captura blocos de uma placa de som com o pacote opcional sounddevice.
+
+    A captura termina com Ctrl+C.
+
+    Returns:
+        iterator: Blocos mono float32
+
+    Raises:
+        RuntimeError: Se o sounddevice não estiver instalado
+    """
+    try:
+        import sounddevice
+    except ImportError:
+        raise RuntimeError(
+            'A captura da placa de som precisa do pacote sounddevice '
+            '(pip install sounddevice)'
+        ) from None
+
+    def capturar():
+        with sounddevice.InputStream(
+            samplerate=taxa,
+            blocksize=quadro,
+            device=dispositivo,
+            channels=1,
+            dtype='float32',
+        ) as fluxo:
+            try:
+                while True:
+                    bloco, _ = fluxo.read(quadro)
+                    yield bloco[:, 0].copy()
+            except KeyboardInterrupt:
+                return
+
+    return capturar()
+
+
+class _AnaliseQuadros:
+    """
+    Envelope de onset, pitch (YIN) e RMS por quadro, bloco a bloco.
+
+    Os quadros não são centralizados: o quadro j cobre as amostras
+    [j * hop, j * hop + n_fft) e as amostras que ainda não completam um
+    quadro ficam guardadas para o próximo bloco.
+    """
+
+    def __init__(self, taxa, n_fft, hop_length, fmin, fmax):
+        self.taxa = taxa
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.fmin = fmin
+        self.fmax = fmax
+        self.resto = np.zeros(0, dtype=np.float32)
+        self.ultimo_mel = None
+
+    def adicionar(self, bloco):
+        amostras = np.concatenate([self.resto, bloco])
+        if len(amostras) < self.n_fft:
+            self.resto = amostras
+            vazio = np.zeros(0)
+            return vazio, vazio, vazio
+
+        n_quadros = 1 + (len(amostras) - self.n_fft) // self.hop_length
+        usadas = amostras[: (n_quadros - 1) * self.hop_length + self.n_fft]
+        self.resto = amostras[n_quadros * self.hop_length:]
+
+        potencia = (
+            np.abs(
+                librosa.stft(
+                    usadas,
+                    n_fft=self.n_fft,
+                    hop_length=self.hop_length,
+                    center=False,
+                )
+            )
+            ** 2
+        )
+        mel = librosa.power_to_db(
+            librosa.feature.melspectrogram(S=potencia, sr=self.taxa), top_db=None
+        )
+        anterior = mel[:, :1] if self.ultimo_mel is None else self.ultimo_mel
+        envelope = np.maximum(
+            0.0, np.diff(np.concatenate([anterior, mel], axis=1), axis=1)
+        ).mean(axis=0)
+        self.ultimo_mel = mel[:, -1:]
+
+        f0 = librosa.yin(
+            usadas,
+            fmin=self.fmin,
+            fmax=self.fmax,
+            sr=self.taxa,
+            frame_length=self.n_fft,
+            hop_length=self.hop_length,
+            center=False,
+        )
+        rms = librosa.feature.rms(
+            y=usadas,
+            frame_length=self.n_fft,
+            hop_length=self.hop_length,
+            center=False,
+        )[0]
+        return envelope, f0, rms
+
+
+class TranscritorAoVivo:
+    """
+    Transforma blocos de áudio em notas à medida que eles chegam.
+
+    Uso:
+        transcritor = TranscritorAoVivo(bpm=100, tom='D')
+        for bloco in fonte_arquivo('voz.wav'):
+            for nota in transcritor.processar(bloco):
+                print(nota)
+        transcritor.finalizar()
+    """
+
+    def __init__(
+        self,
+        taxa=config.TAXA_AO_VIVO,
+        bpm=120,
+        tom='C',
+        modo='maior',
+        min_dur=config.MIN_DURACAO_NOTA,
+        sensibilidade_onset=config.SENSIBILIDADE_ONSET,
+        pre_max=config.PRE_MAX,
+        post_max=config.POST_MAX,
+        pre_avg=config.PRE_AVG,
+        post_avg=config.POST_AVG,
+        wait=config.WAIT,
+        limiar_voz=config.LIMIAR_VOZ_AO_VIVO,
+        silencio=config.SILENCIO_FECHA_NOTA,
+        n_fft=2048,
+        hop_length=512,
+    ):
+        self.taxa = taxa
+        self.bpm = bpm
+        self.tom = tom
+        self.modo = modo
+        self.min_dur = min_dur
+        self.limiar_voz = limiar_voz
+        self.hop_length = hop_length
+        self.n_fft = n_fft
+        self.quadros_silencio = max(1, int(round(silencio * taxa / hop_length)))
+
+        self.analise = _AnaliseQuadros(
+            taxa, n_fft, hop_length, config.FMIN, config.FMAX
+        )
+        self.detector = DetectorOnsetsIncremental(
+            pre_max,
+            post_max,
+            pre_avg,
+            post_avg,
+            sensibilidade_onset,
+            wait,
+            piso=config.PISO_ENVELOPE_AO_VIVO,
+        )
+
+        # Quadros do segmento aberto (a partir de self.inicio)
+        self.f0 = np.zeros(0)
+        self.rms = np.zeros(0)
+        self.inicio = 0            # quadro global onde o segmento começa
+        self.processado_ate = 0    # quadros globais < este já foram avaliados
+        self.onsets_lidos = 0
+        self.rms_maximo = 0.0
+        self.com_voz = False       # estado voz/silêncio do segmento aberto
+        self.sequencia = 0         # quadros seguidos no estado oposto
+        self.mudanca = 0           # quadros seguidos longe da altura do segmento
+
+        self.amostras = 0
+        self.chegadas = deque()    # (amostra final do bloco, relógio da chegada)
+        self.notas = []
+
+    def _tempo(self, quadro):
+        return quadro * self.hop_length / self.taxa
+
+    def _chegada(self, quadro):
+        """Relógio da chegada do bloco com o centro do quadro dado."""
+        amostra = quadro * self.hop_length + self.n_fft // 2
+        while len(self.chegadas) > 1 and self.chegadas[0][0] < amostra:
+            self.chegadas.popleft()
+        return self.chegadas[0][1]
+
+    def _fechar(self, fim):
+        """Fecha o segmento [self.inicio, fim) e emite a nota (ou pausa)."""
+        n = fim - self.inicio
+        f0, rms = self.f0[:n], self.rms[:n]
+        self.f0, self.rms = self.f0[n:], self.rms[n:]
+        inicio, self.inicio = self.inicio, fim
+
+        duracao = self._tempo(n)
+        if n <= 0 or (duracao < self.min_dur and inicio > 0):
+            return None
+
+        vozeados = rms > self.limiar_voz * self.rms_maximo
+        midi = -1
+        if vozeados.any():
+            midis, distancias = ajustar_a_escala(
+                [np.median(f0[vozeados])], self.tom, self.modo, 2, 5
+            )
+            # Mesma regra de segmentar_notas: perto da escala ou com energia
+            if midis[0] >= 0 and (distancias[0] < 0.15 or vozeados.mean() >= 0.5):
+                midi = int(midis[0])
+
+        nota = {
+            'nota': nome_de_midi(midi) if midi >= 0 else 'rest',
+            'midi': midi,
+            'inicio': self._tempo(inicio),
+            'duracao': duracao * self.bpm / 60,
+            'latencia': time.perf_counter() - self._chegada(fim),
+        }
+        self.notas.append(nota)
+        return nota
+
+    def _avaliar(self, ate, final=False):
+        """Percorre os quadros decididos, fechando segmentos nas fronteiras."""
+        emitidas = []
+        onsets = self.detector.onsets
+        limiar = self.limiar_voz * self.rms_maximo
+        for quadro in range(self.processado_ate, ate):
+            fronteiras = []
+            posicao = quadro - self.inicio
+
+            # Entrada ou saída da voz sustentada por quadros_silencio quadros
+            voz = self.rms[posicao] > limiar
+            self.sequencia = self.sequencia + 1 if voz != self.com_voz else 0
+            if self.sequencia >= self.quadros_silencio:
+                fronteiras.append(quadro + 1 - self.sequencia)
+                self.com_voz = voz
+                self.sequencia = 0
+                self.mudanca = 0
+
+            # Troca de nota sem ataque (legato): a altura se afasta da
+            # mediana do segmento por mais de DESVIO_TROCA_NOTA semitons
+            elif voz and self.com_voz:
+                anteriores = slice(0, posicao - self.mudanca)
+                vozeados = self.rms[anteriores] > limiar
+                if vozeados.any():
+                    referencia = np.median(hz_para_midi(self.f0[anteriores][vozeados]))
+                    desvio = abs(hz_para_midi(self.f0[posicao]) - referencia)
+                    self.mudanca = self.mudanca + 1 if desvio > DESVIO_TROCA_NOTA else 0
+                    if self.mudanca >= self.quadros_silencio:
+                        fronteiras.append(quadro + 1 - self.mudanca)
+                        self.mudanca = 0
+
+            while self.onsets_lidos < len(onsets) and onsets[self.onsets_lidos] <= quadro:
+                if onsets[self.onsets_lidos] == quadro:
+                    fronteiras.append(quadro)
+                    self.com_voz = voz
+                    self.sequencia = 0
+                    self.mudanca = 0
+                self.onsets_lidos += 1
+
+            # Fronteiras muito próximas (ex.: o onset e a troca de altura da
+            # mesma nota) não criam fragmentos: o trecho curto fica no
+            # segmento seguinte
+            for fronteira in fronteiras:
+                if fronteira - self.inicio >= self.quadros_silencio:
+                    emitidas.append(self._fechar(fronteira))
+        self.processado_ate = max(self.processado_ate, ate)
+
+        if final:
+            emitidas.append(self._fechar(self.inicio + len(self.f0)))
+        return [nota for nota in emitidas if nota is not None]
+
+    def processar(self, bloco, chegada=None):
+        """
+        Consome um bloco de áudio e devolve as notas que ele completou.
+
+        Args:
+            bloco (np.ndarray): Amostras mono na taxa de análise
+            chegada (float): time.perf_counter() da chegada do bloco
+                (padrão: agora)
+
+        Returns:
+            list: Dicionários com 'nota', 'midi', 'inicio' (segundos),
+            'duracao' (quarter notes) e 'latencia' (segundos)
+        """
+        self.amostras += len(bloco)
+        self.chegadas.append(
+            (self.amostras, time.perf_counter() if chegada is None else chegada)
+        )
+
+        envelope, f0, rms = self.analise.adicionar(bloco)
+        if len(f0) == 0:
+            return []
+        self.f0 = np.concatenate([self.f0, f0])
+        self.rms = np.concatenate([self.rms, rms])
+        self.rms_maximo = max(self.rms_maximo, float(rms.max()))
+
+        self.detector.adicionar(envelope)
+        return self._avaliar(self.detector.decidido_ate)
+
+    def finalizar(self):
+        """Decide os últimos quadros e fecha o segmento aberto."""
+        self.detector.adicionar(np.zeros(0), final=True)
+        return self._avaliar(self.inicio + len(self.f0), final=True)
+
+    def eventos(
+        self,
+        limite_agrupamento=config.LIMITE_AGRUPAMENTO,
+        quantizar=config.QUANTIZAR,
+        grade_quantizacao=config.GRADE_QUANTIZACAO,
+    ):
+        """
+        Notas emitidas até agora com o agrupamento e a quantização de
+        extrair_notas_vocal.
+
+        Returns:
+            Eventos: Melodia transcrita
+        """
+        eventos = Eventos(
+            [nota['midi'] for nota in self.notas],
+            [nota['duracao'] for nota in self.notas],
+        ).agrupar(limite_agrupamento * (60 / self.bpm))
+        return eventos.quantizar(grade_quantizacao) if quantizar else eventos
+
+
+def relatorio_latencia(notas):
+    """
+    Resume as latências medidas (em milissegundos).
+
+    Returns:
+        dict: 'notas', 'media_ms', 'mediana_ms', 'p95_ms' e 'maxima_ms'
+    """
+    latencias = np.array([nota['latencia'] for nota in notas]) * 1000
+    if len(latencias) == 0:
+        return {'notas': 0}
+    return {
+        'notas': len(latencias),
+        'media_ms': round(float(latencias.mean()), 1),
+        'mediana_ms': round(float(np.median(latencias)), 1),
+        'p95_ms': round(float(np.percentile(latencias, 95)), 1),
+        'maxima_ms': round(float(latencias.max()), 1),
+    }
@@ -5,42 +5,73 @@ Contém funções para carregamento e análise de características musicais.
 import librosa
 import numpy as np
 
+import config.config as config
+from src.notalab.acordes import (pontuacao_compassos, pontuar_acordes,
+                                 raiz_acorde, viterbi_acordes)
+from src.notalab.cache_audio import carregar_com_cache
+from src.notalab.contexto import ContextoAnalise
+from src.utils.perfil import contar, medir_etapa
 
-def carregar_audio(caminho, sr=44100):
+
+@medir_etapa('audio.carregar_audio')
+def carregar_audio(caminho, sr=44100, usar_cache=config.USAR_CACHE_AUDIO):
     """
     Carrega um arquivo de áudio e retorna o sinal e a taxa de amostragem.
 
+    Com usar_cache=True o áudio decodificado fica guardado em disco (ver
+    src.notalab.cache_audio) e é reaberto via memory mapping nas próximas vezes.
+
     Args:
         caminho (str): Caminho para o arquivo de áudio
         sr (int): Taxa de amostragem desejada
+        usar_cache (bool): Usa o cache de áudio decodificado
 
     Returns:
         tuple: (sinal, taxa) onde:
             sinal (np.ndarray): série temporal do áudio (amplitudes)
             taxa (int): taxa de amostragem do áudio
     """
+    if usar_cache and sr:
+        return carregar_com_cache(
+            caminho, sr, lambda: librosa.load(caminho, sr=sr)
+        )
     sinal, taxa = librosa.load(caminho, sr=sr)
     return sinal, taxa
 
 
-def detectar_tom(sinal, taxa):
+@medir_etapa('audio.detectar_tom')
+def detectar_tom(sinal, taxa, contexto=None):
     """
     Detecta a tonalidade (tônica e modo) usando análise por perfil tonal.
 
     Args:
         sinal (np.ndarray): Sinal de áudio
         taxa (int): Taxa de amostragem
+        contexto (ContextoAnalise): Features compartilhadas do mesmo sinal
 
     Returns:
         tuple: (tônica, modo) onde tônica é a nota base e modo é 'maior' ou 'menor'
     """
-    # Cromagrama com janela maior para melhor resolução espectral
-    hop_length = 512
-    n_fft = 4096
-    cromagrama = librosa.feature.chroma_cqt(
-        y=sinal, sr=taxa, hop_length=hop_length
-    )
+    contexto = (contexto or ContextoAnalise(sinal, taxa)).para_etapa('tom')
+    cromagrama = contexto.croma
+
+    # Distribuição de notas no cromagrama
+    dist_notas = np.mean(cromagrama, axis=1)
+    dist_notas = dist_notas / np.sum(dist_notas)
+
+    return tom_por_distribuicao(dist_notas)
+
+
+def tom_por_distribuicao(dist_notas):
+    """
+    Escolhe a tonalidade que melhor correlaciona com a distribuição de notas.
+
+    Args:
+        dist_notas (np.ndarray): Energia média de cada classe de nota (12,)
 
+    Returns:
+        tuple: (tônica, modo) onde tônica é a nota base e modo é 'maior' ou 'menor'
+    """
     # Perfis tonais de Krumhansl-Schmuckler para correlação
     perfil_maior = np.array(
         [
@@ -79,10 +110,6 @@ def detectar_tom(sinal, taxa):
     perfil_maior = perfil_maior / np.sum(perfil_maior)
     perfil_menor = perfil_menor / np.sum(perfil_menor)
 
-    # Distribuição de notas no cromagrama
-    dist_notas = np.mean(cromagrama, axis=1)
-    dist_notas = dist_notas / np.sum(dist_notas)
-
     # Calcular correlação para todas as possíveis tonalidades
     correlacoes_maior = np.zeros(12)
     correlacoes_menor = np.zeros(12)
@@ -111,36 +138,125 @@ def detectar_tom(sinal, taxa):
         return (notas[idx_menor], 'menor')
 
 
-def detectar_bpm(sinal, taxa):
+@medir_etapa('audio.detectar_bpm')
+def detectar_bpm(sinal, taxa, retornar_batidas=False, contexto=None):
     """
     Estima o BPM (batidas por minuto) do áudio.
 
     Args:
         sinal (np.ndarray): Sinal de áudio
         taxa (int): Taxa de amostragem
+        retornar_batidas (bool): Se True, também retorna as posições das batidas
+        contexto (ContextoAnalise): Features compartilhadas do mesmo sinal
 
     Returns:
         int: BPM estimado, arredondado para o inteiro mais próximo
+        (ou tupla (bpm, batidas) com os instantes das batidas em segundos)
     """
-    bpm, _ = librosa.beat.beat_track(y=sinal, sr=taxa)
-    return round(float(bpm))
+    contexto = (contexto or ContextoAnalise(sinal, taxa)).para_etapa('bpm')
+    # Envelope pela média das bandas, como o beat_track faz sozinho: pela
+    # mediana, batidas graves (só algumas bandas) somem e sobram as trocas de
+    # acorde, o que dá o andamento do compasso em vez do da batida
+    bpm, batidas = librosa.beat.beat_track(
+        onset_envelope=contexto.envelope_onset,
+        sr=contexto.taxa,
+        hop_length=contexto.hop_length,
+    )
+    bpm = round(float(np.atleast_1d(bpm)[0]))
+    if retornar_batidas:
+        return bpm, librosa.frames_to_time(
+            batidas, sr=contexto.taxa, hop_length=contexto.hop_length
+        )
+    return bpm
 
 
-def detectar_acordes(sinal, taxa, bpm=120):
+@medir_etapa('audio.detectar_acordes')
+def detectar_acordes(
+    sinal,
+    taxa,
+    bpm=120,
+    batidas=None,
+    por_batida=False,
+    completo=False,
+    suavizar=True,
+    contexto=None,
+    retornar_tempos=False,
+):
     """
-    Extrai acordes por compasso (1 acorde por compasso).
+    Extrai acordes por compasso (1 acorde por compasso) ou por batida.
+
+    O cromagrama é calculado uma única vez para a faixa inteira e agregado
+    por compasso/batida via índices de frame. Todos os templates (maiores,
+    menores e com sétima) são pontuados numa multiplicação de matrizes e a
+    sequência é suavizada com Viterbi.
+
+    Args:
+        sinal (np.ndarray): Sinal de áudio
+        taxa (int): Taxa de amostragem
+        bpm (int): Andamento, usado na grade fixa quando não há batidas
+        batidas (np.ndarray): Instantes das batidas em segundos (de detectar_bpm)
+        por_batida (bool): Se True, um acorde por batida em vez de por compasso
+        completo (bool): Se True, retorna índices de acorde (0-35, ver
+            src.notalab.acordes); se False, apenas a raiz (0-11)
+        suavizar (bool): Aplica Viterbi em vez do melhor template isolado
+        contexto (ContextoAnalise): Features compartilhadas do mesmo sinal
+        retornar_tempos (bool): Se True, também retorna o início de cada
+            compasso/batida
+
+    Returns:
+        list: Um índice de acorde (ou raiz) por compasso/batida (ou tupla
+        (acordes, inícios em segundos); o primeiro trecho, antes da primeira
+        marca, começa em 0)
     """
-    duracao_total = librosa.get_duration(y=sinal, sr=taxa)
-    segundos_por_compasso = 4 * 60 / bpm  # 4/4
-    acordes = []
-    for inicio in np.arange(0, duracao_total, segundos_por_compasso):
-        fim = min(inicio + segundos_por_compasso, duracao_total)
-        ini_sample = int(inicio * taxa)
-        fim_sample = int(fim * taxa)
-        trecho = sinal[ini_sample:fim_sample]
-        if len(trecho) == 0:
-            continue
-        crom = librosa.feature.chroma_cqt(y=trecho, sr=taxa).mean(axis=1)
-        raiz = int(np.argmax(crom))
-        acordes.append(raiz)
-    return acordes
+    contexto = (contexto or ContextoAnalise(sinal, taxa)).para_etapa('acordes')
+    hop_length = contexto.hop_length
+    croma = contexto.croma
+
+    if batidas is not None and len(batidas) > 0:
+        marcas = np.asarray(batidas)
+    else:
+        duracao_total = contexto.duracao
+        segundos_por_unidade = (1 if por_batida else 4) * 60 / bpm
+        marcas = np.arange(0, duracao_total, segundos_por_unidade)
+
+    limites = librosa.time_to_frames(
+        marcas, sr=contexto.taxa, hop_length=hop_length
+    )
+    limites = limites[limites < croma.shape[1]]
+
+    if batidas is not None and len(limites) > 0 and not por_batida:
+        # Compassos 4/4: a batida que abre o compasso não é conhecida, então
+        # testamos as 4 fases e ficamos com a que melhor casa com os templates
+        candidatos = [
+            (
+                pontuar_acordes(
+                    librosa.util.sync(croma, limites[fase::4], aggregate=np.mean)
+                ),
+                limites[fase::4],
+            )
+            for fase in range(min(4, len(limites)))
+        ]
+        contar('fases_compasso', len(candidatos))
+        pontuacoes, limites = max(
+            candidatos, key=lambda c: pontuacao_compassos(*c)
+        )
+    else:
+        croma_sinc = librosa.util.sync(croma, limites, aggregate=np.mean)
+        pontuacoes = pontuar_acordes(croma_sinc)
+
+    if suavizar:
+        indices = viterbi_acordes(pontuacoes)
+    else:
+        indices = np.argmax(pontuacoes, axis=0)
+
+    if completo:
+        acordes = [int(idx) for idx in indices]
+    else:
+        acordes = [raiz_acorde(idx) for idx in indices]
+    if not retornar_tempos:
+        return acordes
+
+    # Mesmos trechos do sync: de 0 até a primeira marca e entre as marcas
+    inicios = librosa.util.fix_frames(limites, x_min=0, x_max=croma.shape[1])[:-1]
+    tempos = librosa.frames_to_time(inicios, sr=contexto.taxa, hop_length=hop_length)
+    return acordes, [float(t) for t in tempos]
@@ -0,0 +1,135 @@
+"""
+Módulo de cache do áudio decodificado.
+
+O sinal decodificado e reamostrado é salvo como PCM float32 em arquivos .npy,
+identificados pelo hash do conteúdo do arquivo original e pela taxa de
+amostragem. Nas execuções seguintes ele é reaberto com memory mapping, sem
+decodificar de novo nem copiar a faixa inteira para a RAM.
+"""
+import hashlib
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+import config.config as config
+
+
+def hash_arquivo(caminho, tamanho_bloco=1 << 20):
+    """
+    Calcula o hash do conteúdo de um arquivo (independe do nome e da pasta).
+
+    O resultado fica guardado neste processo enquanto o tamanho e a data de
+    modificação do arquivo não mudarem, então as várias etapas que identificam
+    a mesma faixa leem o arquivo uma única vez.
+
+    Args:
+        caminho (str): Caminho do arquivo
+        tamanho_bloco (int): Bytes lidos por vez
+
+    Returns:
+        str: Hash hexadecimal (BLAKE2b de 128 bits)
+    """
+    estado = os.stat(caminho)
+    return _hash_conteudo(
+        os.path.realpath(caminho), estado.st_size, estado.st_mtime_ns, tamanho_bloco
+    )
+
+
+@lru_cache(maxsize=256)
+def _hash_conteudo(caminho, tamanho, modificado, tamanho_bloco):
+    h = hashlib.blake2b(digest_size=16)
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _caminho_cache(pasta, chave, sr):
+    return Path(pasta) / f'{chave}_{sr}.npy'
+
+
+def carregar_com_cache(
+    caminho,
+    sr,
+    decodificar,
+    pasta=config.PASTA_CACHE_AUDIO,
+    limite_mb=config.LIMITE_CACHE_AUDIO_MB,
+):
+    """
+    Retorna o sinal decodificado a partir do cache, decodificando se preciso.
+
+    Args:
+        caminho (str): Caminho do arquivo de áudio original
+        sr (int): Taxa de amostragem desejada
+        decodificar (callable): Função sem argumentos que retorna (sinal, taxa)
+        pasta (str): Pasta onde os .npy são guardados
+        limite_mb (float): Tamanho máximo do cache antes de remover os menos
+            usados recentemente
+
+    Returns:
+        tuple: (sinal, taxa), com o sinal como np.memmap somente leitura
+    """
+    arquivo = _caminho_cache(pasta, hash_arquivo(caminho), sr)
+
+    if arquivo.exists():
+        # Atualiza o instante de uso para a política LRU
+        os.utime(arquivo)
+    else:
+        sinal, _ = decodificar()
+        arquivo.parent.mkdir(parents=True, exist_ok=True)
+
+        # Escrita atômica: outro processo ou thread nunca vê um .npy pela metade
+        temporario = arquivo.with_name(
+            f'{arquivo.name}.{os.getpid()}.{threading.get_ident()}.tmp'
+        )
+        with open(temporario, 'wb') as f:
+            np.save(f, np.ascontiguousarray(sinal, dtype=np.float32))
+        os.replace(temporario, arquivo)
+
+        limpar_cache(pasta, limite_mb, manter=arquivo)
+
+    return np.load(arquivo, mmap_mode='r'), sr
+
+
+def limpar_cache(
+    pasta=config.PASTA_CACHE_AUDIO, limite_mb=0, manter=None, padrao='*.npy'
+):
+    """
+    Remove os arquivos menos usados recentemente até caber no limite.
+
+    Args:
+        pasta (str): Pasta do cache
+        limite_mb (float): Tamanho máximo permitido em MB
+        manter (Path): Arquivo que nunca deve ser removido nesta chamada
+        padrao (str): Padrão glob dos arquivos do cache
+
+    Returns:
+        int: Número de arquivos removidos
+    """
+    pasta = Path(pasta)
+    if not pasta.exists():
+        return 0
+
+    arquivos = sorted(pasta.glob(padrao), key=lambda a: a.stat().st_mtime)
+    total = sum(a.stat().st_size for a in arquivos)
+    limite = limite_mb * 1024 * 1024
+    removidos = 0
+
+    for arquivo in arquivos:
+        if total <= limite:
+            break
+        if manter is not None and arquivo == manter:
+            continue
+        tamanho = arquivo.stat().st_size
+        try:
+            arquivo.unlink()
+        except OSError:
+            # No Windows um arquivo ainda mapeado não pode ser removido
+            continue
+        total -= tamanho
+        removidos += 1
+
+    return removidos
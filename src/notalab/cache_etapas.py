@@ -0,0 +1,102 @@
+"""
+Módulo de cache em disco dos resultados das etapas do pipeline.
+
+Cada resultado é guardado (pickle) sob uma chave formada pelo nome da etapa,
+pela impressão do conteúdo da entrada (ver cache_audio.hash_arquivo) e pelos
+valores dos parâmetros que a etapa lê. Mudar um parâmetro só invalida as
+etapas que o usam, e um arquivo renomeado ou copiado cai nas mesmas chaves.
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+from pathlib import Path
+
+import config.config as config
+from src.notalab.cache_audio import limpar_cache
+from src.utils.perfil import contar
+
+# Versão do formato dos resultados guardados; aumentar quando a saída ou o
+# algoritmo de alguma etapa mudar, para não reaproveitar resultados antigos
+VERSAO_CACHE = 5
+
+
+def chave_etapa(etapa, impressao, parametros):
+    """
+    Calcula a chave de um resultado.
+
+    Args:
+        etapa (str): Nome da etapa
+        impressao (str): Impressão do conteúdo da entrada
+        parametros (dict): Parâmetros lidos pela etapa (valores serializáveis
+            em JSON; outros tipos entram pelo repr)
+
+    Returns:
+        str: Hash hexadecimal (BLAKE2b de 128 bits)
+    """
+    descricao = json.dumps(
+        [VERSAO_CACHE, etapa, impressao, parametros], sort_keys=True, default=repr
+    )
+    return hashlib.blake2b(descricao.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def memorizar(
+    etapa,
+    impressao,
+    parametros,
+    calcular,
+    valido=None,
+    ativar=config.MEMOIZAR_ETAPAS,
+    pasta=config.PASTA_CACHE_ETAPAS,
+    limite_mb=config.LIMITE_CACHE_ETAPAS_MB,
+):
+    """
+    Devolve o resultado guardado da etapa ou o calcula e guarda.
+
+    Args:
+        etapa (str): Nome da etapa (vira o prefixo do arquivo)
+        impressao (str): Impressão do conteúdo da entrada
+        parametros (dict): Parâmetros lidos pela etapa
+        calcular (callable): Função sem argumentos que produz o resultado
+        valido (callable): Confere um resultado lido do disco (ex.: se os
+            arquivos que ele aponta ainda existem); se devolver False, a
+            etapa é recalculada
+        ativar (bool): Se False, só chama calcular()
+        pasta (str): Pasta dos arquivos .pkl
+        limite_mb (float): Tamanho máximo do cache antes de remover os
+            resultados menos usados recentemente
+
+    Returns:
+        Resultado da etapa
+    """
+    if not ativar:
+        return calcular()
+
+    arquivo = Path(pasta) / f'{etapa}_{chave_etapa(etapa, impressao, parametros)}.pkl'
+    try:
+        with open(arquivo, 'rb') as f:
+            resultado = pickle.load(f)
+        if valido is None or valido(resultado):
+            os.utime(arquivo)   # Instante de uso para a política LRU
+            contar('etapas_reaproveitadas')
+            return resultado
+    except FileNotFoundError:
+        pass
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        # Arquivo corrompido ou de uma versão antiga do código: recalcula
+        pass
+
+    resultado = calcular()
+    arquivo.parent.mkdir(parents=True, exist_ok=True)
+
+    # Escrita atômica: outro processo ou thread nunca lê um resultado pela metade
+    temporario = arquivo.with_name(
+        f'{arquivo.name}.{os.getpid()}.{threading.get_ident()}.tmp'
+    )
+    with open(temporario, 'wb') as f:
+        pickle.dump(resultado, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporario, arquivo)
+
+    limpar_cache(pasta, limite_mb, manter=arquivo, padrao='*.pkl')
+    return resultado
@@ -0,0 +1,162 @@
+"""
+Módulo com o contexto de análise compartilhado entre os detectores.
+Cada feature espectral é calculada sob demanda uma única vez e reaproveitada.
+"""
+from functools import cached_property
+
+import librosa
+import numpy as np
+
+import config.config as config
+from src.utils.perfil import contar
+
+
+class ContextoAnalise:
+    """
+    Memoiza as features espectrais de um sinal para os detectores.
+
+    Os detectores (tom, BPM, acordes e onsets) recebem o mesmo contexto e
+    compartilham STFT, CQT, cromagrama, envelope de onset, separação HPSS e
+    estimativa de afinação, em vez de recalcular cada uma do zero.
+
+    Cada etapa pode trabalhar numa taxa de amostragem própria (ver
+    TAXAS_POR_ETAPA em config.py): o sinal é reamostrado uma única vez por
+    taxa e o contexto derivado é compartilhado por todas as etapas que a usam.
+
+    Args:
+        sinal (np.ndarray): Sinal de áudio
+        taxa (int): Taxa de amostragem
+        hop_length (int): Salto entre frames usado por todas as features
+        n_fft (int): Tamanho da janela da STFT
+        taxas_etapas (dict): Taxa de cada etapa (padrão: config.TAXAS_POR_ETAPA)
+    """
+
+    # Resolução da CQT usada pelo cromagrama (mesmos padrões do chroma_cqt)
+    BINS_POR_OITAVA = 36
+    N_OITAVAS = 7
+
+    def __init__(
+        self, sinal, taxa, hop_length=512, n_fft=2048, taxas_etapas=None
+    ):
+        self.sinal = sinal
+        self.taxa = taxa
+        self.hop_length = hop_length
+        self.n_fft = n_fft
+        self.taxas_etapas = (
+            config.TAXAS_POR_ETAPA if taxas_etapas is None else taxas_etapas
+        )
+        self._origem = None
+        self._derivados = {}
+
+    def para_taxa(self, taxa):
+        """
+        Retorna o contexto do mesmo sinal na taxa pedida.
+
+        A reamostragem é feita sempre a partir do sinal original e no máximo
+        uma vez por taxa; pedidos repetidos devolvem o mesmo contexto.
+        """
+        if self._origem is not None:
+            return self._origem.para_taxa(taxa)
+        if not taxa or taxa == self.taxa:
+            return self
+        if taxa not in self._derivados:
+            contar('reamostragens')
+            derivado = ContextoAnalise(
+                librosa.resample(self.sinal, orig_sr=self.taxa, target_sr=taxa),
+                taxa,
+                hop_length=self.hop_length,
+                n_fft=self.n_fft,
+                taxas_etapas=self.taxas_etapas,
+            )
+            derivado._origem = self
+            self._derivados[taxa] = derivado
+        return self._derivados[taxa]
+
+    def para_etapa(self, etapa):
+        """Retorna o contexto na taxa configurada para a etapa (ex: 'tom')."""
+        return self.para_taxa(self.taxas_etapas.get(etapa))
+
+    @cached_property
+    def duracao(self):
+        """Duração do sinal em segundos."""
+        return librosa.get_duration(y=self.sinal, sr=self.taxa)
+
+    @cached_property
+    def stft(self):
+        """STFT complexa do sinal."""
+        contar('stft')
+        return librosa.stft(
+            self.sinal, n_fft=self.n_fft, hop_length=self.hop_length
+        )
+
+    @cached_property
+    def espectro(self):
+        """Magnitude da STFT."""
+        return np.abs(self.stft)
+
+    @cached_property
+    def afinacao(self):
+        """Desvio de afinação estimado (em frações de bin da CQT)."""
+        return librosa.estimate_tuning(
+            S=self.espectro,
+            sr=self.taxa,
+            n_fft=self.n_fft,
+            bins_per_octave=self.BINS_POR_OITAVA,
+        )
+
+    @cached_property
+    def cqt(self):
+        """Magnitude da CQT, corrigida pela afinação estimada."""
+        contar('cqt')
+        return np.abs(
+            librosa.cqt(
+                self.sinal,
+                sr=self.taxa,
+                hop_length=self.hop_length,
+                n_bins=self.BINS_POR_OITAVA * self.N_OITAVAS,
+                bins_per_octave=self.BINS_POR_OITAVA,
+                tuning=self.afinacao,
+            )
+        )
+
+    @cached_property
+    def croma(self):
+        """Cromagrama (12, n_frames) derivado da CQT."""
+        contar('croma')
+        return librosa.feature.chroma_cqt(
+            C=self.cqt,
+            sr=self.taxa,
+            hop_length=self.hop_length,
+            bins_per_octave=self.BINS_POR_OITAVA,
+        )
+
+    @cached_property
+    def mel_db(self):
+        """Espectrograma mel em dB, base dos envelopes de onset."""
+        mel = librosa.feature.melspectrogram(S=self.espectro**2, sr=self.taxa)
+        return librosa.power_to_db(mel)
+
+    @cached_property
+    def envelope_onset(self):
+        """Envelope de onset (fluxo espectral médio por frame)."""
+        contar('envelope_onset')
+        return librosa.onset.onset_strength(
+            S=self.mel_db,
+            sr=self.taxa,
+            hop_length=self.hop_length,
+            n_fft=self.n_fft,
+        )
+
+    @cached_property
+    def hpss(self):
+        """Separação harmônico/percussivo como tupla de sinais no tempo."""
+        contar('hpss')
+        harmonico, percussivo = librosa.decompose.hpss(self.stft)
+        return (
+            librosa.istft(
+                harmonico, hop_length=self.hop_length, length=len(self.sinal)
+            ),
+            librosa.istft(
+                percussivo, hop_length=self.hop_length, length=len(self.sinal)
+            ),
+        )
@@ -0,0 +1,126 @@
+"""
+Módulo com tabelas de escala pré-calculadas em espaço MIDI.
+Permite ajustar arrays inteiros de frequências à escala de uma só vez.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+NOTAS = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# Intervalos (em semitons a partir da tônica) de cada modo
+INTERVALOS = {
+    'maior': (0, 2, 4, 5, 7, 9, 11),
+    'menor': (0, 2, 3, 5, 7, 8, 10),
+}
+
+# Nome com oitava de cada número MIDI (0-127), ex.: 61 -> 'C#4'
+NOMES_MIDI = tuple(f'{NOTAS[m % 12]}{m // 12 - 1}' for m in range(128))
+
+_ACIDENTES = {'#': 1, '♯': 1, 'b': -1, '-': -1, '♭': -1}
+
+
+@lru_cache(maxsize=None)
+def tabela_escala(tom, modo, oitava_min=2, oitava_max=5):
+    """
+    Retorna os números MIDI de todas as notas da escala no intervalo de oitavas.
+
+    Args:
+        tom (str): Tônica da escala (ex: 'C', 'F#')
+        modo (str): 'maior' ou 'menor'
+        oitava_min (int): Primeira oitava incluída
+        oitava_max (int): Última oitava incluída
+
+    Returns:
+        np.ndarray: Números MIDI em ordem crescente (somente leitura)
+    """
+    tom_idx = NOTAS.index(tom)
+    intervalos = INTERVALOS['maior'] if modo == 'maior' else INTERVALOS['menor']
+    classes = sorted((tom_idx + i) % 12 for i in intervalos)
+    midis = np.array(
+        [
+            12 * (oitava + 1) + classe
+            for oitava in range(oitava_min, oitava_max + 1)
+            for classe in classes
+        ],
+        dtype=np.int16,
+    )
+    midis.setflags(write=False)
+    return midis
+
+
+def hz_para_midi(freqs):
+    """Converte frequências em Hz para números MIDI fracionários."""
+    freqs = np.asarray(freqs, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 69.0 + 12.0 * np.log2(freqs / 440.0)
+
+
+def midi_para_hz(midis):
+    """Converte números MIDI (inteiros ou fracionários) para Hz."""
+    return 440.0 * 2.0 ** ((np.asarray(midis, dtype=np.float64) - 69.0) / 12.0)
+
+
+def ajustar_a_escala(freqs, tom, modo, oitava_min=2, oitava_max=5):
+    """
+    Ajusta um array de frequências à nota mais próxima da escala.
+
+    A busca é feita em espaço MIDI (cents) com uma única operação vetorizada.
+    A distância devolvida mantém a medida relativa em frequência
+    (|f_nota - f| / f_nota), usada como tolerância de afinação.
+
+    Args:
+        freqs (array-like): Frequências em Hz (NaN para segmentos sem pitch)
+        tom (str): Tônica da escala
+        modo (str): 'maior' ou 'menor'
+        oitava_min (int): Primeira oitava da escala
+        oitava_max (int): Última oitava da escala
+
+    Returns:
+        tuple: (midis, distancias) onde:
+            midis (np.ndarray): nota MIDI da escala mais próxima (-1 se NaN)
+            distancias (np.ndarray): distância relativa em frequência (inf se NaN)
+    """
+    tabela = tabela_escala(tom, modo, oitava_min, oitava_max)
+    alvo = hz_para_midi(freqs)
+    validos = np.isfinite(alvo)
+
+    idx = np.searchsorted(tabela, np.where(validos, alvo, 0.0))
+    abaixo = tabela[np.clip(idx - 1, 0, len(tabela) - 1)]
+    acima = tabela[np.clip(idx, 0, len(tabela) - 1)]
+    midis = np.where(np.abs(alvo - abaixo) <= np.abs(acima - alvo), abaixo, acima)
+
+    freqs_tabela = midi_para_hz(midis)
+    with np.errstate(invalid='ignore'):
+        distancias = np.abs(freqs_tabela - np.asarray(freqs)) / freqs_tabela
+
+    midis = np.where(validos, midis, -1).astype(np.int16)
+    distancias = np.where(validos, distancias, np.inf)
+    return midis, distancias
+
+
+@lru_cache(maxsize=None)
+def midi_de_nome(nome):
+    """
+    Converte um nome de nota com oitava (ex: 'C#4', 'E-3', 'Bb2') para MIDI.
+
+    Raises:
+        ValueError: Se o nome não for uma nota válida
+    """
+    if not nome or nome[0].upper() not in 'CDEFGAB':
+        raise ValueError(f'Nota inválida: {nome!r}')
+    classe = NOTAS.index(nome[0].upper())
+    pos = 1
+    while pos < len(nome) and nome[pos] in _ACIDENTES:
+        classe += _ACIDENTES[nome[pos]]
+        pos += 1
+    try:
+        oitava = int(nome[pos:])
+    except ValueError:
+        raise ValueError(f'Nota inválida: {nome!r}') from None
+    return 12 * (oitava + 1) + classe
+
+
+def nome_de_midi(midi):
+    """Converte um número MIDI (0-127) para nome com oitava, ex.: 61 -> 'C#4'."""
+    return NOMES_MIDI[int(midi)]
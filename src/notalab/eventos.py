@@ -0,0 +1,207 @@
+"""
+Contêiner compacto de eventos de nota (melodia ou voz) apoiado em arrays.
+
+Em vez de listas de tuplas (nome, duração), cada sequência guarda quatro
+arrays NumPy paralelos: número MIDI (-1 = pausa), início e duração em quarter
+notes e intensidade. O agrupamento e a quantização operam sobre os arrays, e
+a gravação usa o formato binário .npz do NumPy.
+
+Para não quebrar quem consome as listas antigas, um Eventos itera, indexa e
+compara como a lista de tuplas (nome, duração) equivalente.
+"""
+import numpy as np
+
+from src.notalab.escalas import NOMES_MIDI, midi_de_nome
+
+# Intensidade usada quando a origem dos eventos não informa uma
+VELOCIDADE_PADRAO = 90
+
+# Nome de cada número MIDI deslocado em 1, para que -1 (pausa) vire 'rest'
+_NOMES = np.array(('rest',) + NOMES_MIDI, dtype=object)
+
+
+class Eventos:
+    """
+    Sequência de notas e pausas consecutivas.
+
+    Atributos:
+        midi (np.ndarray): Números MIDI (int16), -1 para pausas
+        onset (np.ndarray): Início de cada evento em quarter notes (float64)
+        duracao (np.ndarray): Duração em quarter notes (float64)
+        velocidade (np.ndarray): Intensidade MIDI (uint8)
+    """
+
+    __slots__ = ('midi', 'onset', 'duracao', 'velocidade')
+
+    def __init__(self, midi=(), duracao=(), velocidade=None, onset=None):
+        self.midi = np.asarray(midi, dtype=np.int16).reshape(-1)
+        self.duracao = np.asarray(duracao, dtype=np.float64).reshape(-1)
+        if len(self.midi) != len(self.duracao):
+            raise ValueError('midi e duracao precisam ter o mesmo tamanho')
+        if velocidade is None:
+            velocidade = np.full(len(self.midi), VELOCIDADE_PADRAO)
+        self.velocidade = np.asarray(velocidade, dtype=np.uint8).reshape(-1)
+        if onset is None:
+            onset = inicios(self.duracao)
+        self.onset = np.asarray(onset, dtype=np.float64).reshape(-1)
+
+    @classmethod
+    def de_notas(cls, notas):
+        """
+        Converte uma lista de tuplas (nome, duração) em Eventos.
+
+        Pausas e nomes inválidos viram -1. Um Eventos é devolvido como está.
+        """
+        if isinstance(notas, cls):
+            return notas
+        midis = np.empty(len(notas), dtype=np.int16)
+        duracoes = np.empty(len(notas), dtype=np.float64)
+        for i, (nome, duracao) in enumerate(notas):
+            try:
+                midis[i] = midi_de_nome(nome)
+            except (TypeError, ValueError):
+                midis[i] = -1
+            duracoes[i] = duracao
+        return cls(midis, duracoes)
+
+    @classmethod
+    def carregar(cls, caminho):
+        """Lê eventos gravados com salvar."""
+        with np.load(caminho) as dados:
+            return cls(
+                dados['midi'],
+                dados['duracao'],
+                velocidade=dados['velocidade'],
+                onset=dados['onset'],
+            )
+
+    def salvar(self, caminho):
+        """Grava os arrays num arquivo .npz (sem compressão)."""
+        with open(caminho, 'wb') as f:
+            np.savez(
+                f,
+                midi=self.midi,
+                onset=self.onset,
+                duracao=self.duracao,
+                velocidade=self.velocidade,
+            )
+
+    @property
+    def nomes(self):
+        """Nome de cada evento ('rest' para pausas), como array de objetos."""
+        return _NOMES[self.midi.astype(np.intp) + 1]
+
+    @property
+    def pausas(self):
+        return self.midi < 0
+
+    @property
+    def nbytes(self):
+        return (
+            self.midi.nbytes
+            + self.onset.nbytes
+            + self.duracao.nbytes
+            + self.velocidade.nbytes
+        )
+
+    def com_midi(self, midi):
+        """Mesmos tempos e intensidades com outras alturas (ex.: outra voz)."""
+        return Eventos(midi, self.duracao, self.velocidade, self.onset)
+
+    def agrupar(self, limite_quarter):
+        """
+        Junta notas iguais consecutivas enquanto a duração acumulada for
+        menor que `limite_quarter` (a mesma regra de agrupar_notas).
+
+        As sequências de notas iguais são localizadas de uma vez sobre o
+        array de alturas.
+
+        Returns:
+            Eventos: Novos eventos agrupados
+        """
+        n = len(self.midi)
+        if n < 2:
+            return Eventos(self.midi, self.duracao, self.velocidade)
+
+        inicios_seq = np.flatnonzero(np.diff(self.midi) != 0) + 1
+        inicios_seq = np.concatenate(([0], inicios_seq))
+        fins_seq = np.append(inicios_seq[1:], n)
+
+        # Só as sequências com mais de um evento precisam ser percorridas; a
+        # soma é feita em float do Python, na mesma ordem do laço original
+        longas = fins_seq - inicios_seq > 1
+        duracoes = self.duracao.tolist()
+        removidos = []
+        for inicio, fim in zip(inicios_seq[longas].tolist(), fins_seq[longas].tolist()):
+            grupo = inicio
+            for k in range(inicio + 1, fim):
+                if duracoes[grupo] < limite_quarter:
+                    duracoes[grupo] += duracoes[k]
+                    removidos.append(k)
+                else:
+                    grupo = k
+
+        manter = np.ones(n, dtype=bool)
+        manter[removidos] = False
+        duracoes = np.asarray(duracoes)
+        return Eventos(
+            self.midi[manter], duracoes[manter], self.velocidade[manter]
+        )
+
+    def quantizar(self, grade=16):
+        """
+        Arredonda as durações para múltiplos da grade (mínimo de uma unidade).
+
+        Args:
+            grade (int): Divisão da grade (4=semínimas, 8=colcheias, 16=semicolcheias)
+
+        Returns:
+            Eventos: Novos eventos quantizados
+        """
+        unidade = 1.0 / (grade / 4)
+        duracoes = np.maximum(np.round(self.duracao / unidade) * unidade, unidade)
+        return Eventos(self.midi, duracoes, self.velocidade)
+
+    def para_lista(self):
+        """Lista de tuplas (nome, duração), o formato antigo."""
+        return list(zip(self.nomes.tolist(), self.duracao.tolist()))
+
+    def __len__(self):
+        return len(self.midi)
+
+    def __iter__(self):
+        return zip(self.nomes.tolist(), self.duracao.tolist())
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return Eventos(
+                self.midi[indice],
+                self.duracao[indice],
+                self.velocidade[indice],
+                self.onset[indice],
+            )
+        return (_NOMES[int(self.midi[indice]) + 1], float(self.duracao[indice]))
+
+    def __eq__(self, outro):
+        if isinstance(outro, Eventos):
+            return (
+                np.array_equal(self.midi, outro.midi)
+                and np.array_equal(self.duracao, outro.duracao)
+                and np.array_equal(self.velocidade, outro.velocidade)
+            )
+        if isinstance(outro, (list, tuple)):
+            return self.para_lista() == list(outro)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'Eventos({len(self)} eventos, {self.duracao.sum():g} quarter notes)'
+
+
+def inicios(duracoes):
+    """Início de cada evento consecutivo (soma acumulada exclusiva)."""
+    onset = np.zeros(len(duracoes), dtype=np.float64)
+    if len(duracoes) > 1:
+        np.cumsum(duracoes[:-1], out=onset[1:])
+    return onset
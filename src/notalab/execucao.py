@@ -0,0 +1,176 @@
+"""
+Pontos de retomada de uma execução do pipeline.
+
+Cada etapa concluída de uma faixa (análise, stems ou vocal, notas brutas,
+notas quantizadas, harmonias e MIDI) é gravada de forma atômica numa pasta
+de execução, ao lado do MIDI (<nome>.execucao/). Se o processo cair ou for
+interrompido, a próxima execução com a mesma pasta carrega o que já foi
+feito e continua da primeira etapa que faltava.
+
+A pasta vale só para o mesmo áudio (hash do conteúdo) e os mesmos
+parâmetros; se algum mudou, os pontos antigos são descartados. Quando a
+faixa termina, os resultados intermediários (como o vocal separado) são
+apagados e ficam só os que formam o resultado final.
+"""
+import json
+import os
+import pickle
+import shutil
+import threading
+from pathlib import Path
+
+from src.notalab.cache_etapas import chave_etapa
+from src.utils.perfil import contar
+
+NOME_ESTADO = 'estado.json'
+
+
+def pasta_execucao(caminho_midi):
+    """Retorna a pasta de execução associada a um arquivo MIDI."""
+    return Path(caminho_midi).with_suffix('.execucao')
+
+
+def ler_estado(pasta):
+    """Lê o estado.json de uma pasta de execução (None se não houver)."""
+    try:
+        with open(Path(pasta) / NOME_ESTADO, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def execucao_concluida(pasta, ultima='midi'):
+    """Confere se a etapa final de uma execução já foi gravada."""
+    estado = ler_estado(pasta)
+    return bool(estado) and ultima in estado.get('etapas', {})
+
+
+class Execucao:
+    """
+    Grava e recupera os resultados das etapas de uma faixa.
+
+    Args:
+        pasta (Path): Pasta da execução (ver pasta_execucao)
+        impressao (str): Impressão do conteúdo do áudio
+        parametros (dict): Parâmetros que afetam algum resultado
+        descricao (dict): Dados para retomar depois (caminhos, opções), gravados
+            no estado.json junto com as etapas concluídas
+    """
+
+    def __init__(self, pasta, impressao, parametros, descricao=None):
+        self.pasta = Path(pasta)
+        self.chave = chave_etapa('execucao', impressao, parametros)
+        self._trava = threading.Lock()
+
+        estado = ler_estado(self.pasta)
+        self.descartada = estado is not None and estado.get('chave') != self.chave
+        if self.descartada:
+            # Outro áudio ou outros parâmetros: nada aqui pode ser reaproveitado
+            shutil.rmtree(self.pasta, ignore_errors=True)
+            estado = None
+        self.estado = estado or {'chave': self.chave, 'etapas': {}}
+        self.estado.update(descricao or {})
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        self._gravar_estado()
+
+    @property
+    def concluidas(self):
+        return list(self.estado['etapas'])
+
+    def _gravar_estado(self):
+        temporario = self.pasta / (
+            f'{NOME_ESTADO}.{os.getpid()}.{threading.get_ident()}.tmp'
+        )
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(self.estado, f, indent=2, ensure_ascii=False)
+        os.replace(temporario, self.pasta / NOME_ESTADO)
+
+    def carregar(self, etapa):
+        """
+        Devolve o resultado gravado da etapa.
+
+        Raises:
+            KeyError: A etapa ainda não foi concluída (ou o arquivo sumiu)
+        """
+        if etapa not in self.estado['etapas']:
+            raise KeyError(etapa)
+        try:
+            with open(self.pasta / f'{etapa}.pkl', 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            raise KeyError(etapa) from e
+
+    def gravar(self, etapa, resultado):
+        """Grava o resultado e marca a etapa como concluída (atômico)."""
+        arquivo = self.pasta / f'{etapa}.pkl'
+        temporario = arquivo.with_name(
+            f'{arquivo.name}.{os.getpid()}.{threading.get_ident()}.tmp'
+        )
+        with open(temporario, 'wb') as f:
+            pickle.dump(resultado, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporario, arquivo)
+        with self._trava:
+            self.estado['etapas'][etapa] = f'{etapa}.pkl'
+            self._gravar_estado()
+
+    def recuperar(self, etapas, validos=None):
+        """
+        Carrega de uma vez os resultados gravados de várias etapas.
+
+        Args:
+            etapas (iterable): Nomes das etapas
+            validos (dict): Conferência opcional por etapa (ver envolver)
+
+        Returns:
+            dict: Resultado por etapa, ou None se faltar ou for recusado algum
+        """
+        validos = validos or {}
+        resultados = {}
+        for etapa in etapas:
+            try:
+                resultados[etapa] = self.carregar(etapa)
+            except KeyError:
+                return None
+            valido = validos.get(etapa)
+            if valido is not None and not valido(resultados[etapa]):
+                return None
+        return resultados
+
+    def descartar(self, etapas):
+        """
+        Apaga os resultados gravados das etapas, que deixam de constar como
+        concluídas (o estado.json continua valendo para as demais).
+        """
+        with self._trava:
+            for etapa in list(etapas):
+                if self.estado['etapas'].pop(etapa, None) is not None:
+                    (self.pasta / f'{etapa}.pkl').unlink(missing_ok=True)
+            self._gravar_estado()
+
+    def envolver(self, etapa, funcao, valido=None):
+        """
+        Envolve uma etapa do agendador: se ela já foi concluída, devolve o
+        resultado gravado; senão executa e grava.
+
+        Args:
+            etapa (str): Nome da etapa
+            funcao (callable): Função da etapa (recebe as dependências)
+            valido (callable): Confere um resultado recuperado (ex.: se o
+                arquivo que ele aponta ainda existe); se devolver False, a
+                etapa é executada de novo
+        """
+
+        def executar(**dependencias):
+            try:
+                resultado = self.carregar(etapa)
+            except KeyError:
+                pass
+            else:
+                if valido is None or valido(resultado):
+                    contar('etapas_retomadas')
+                    return resultado
+            resultado = funcao(**dependencias)
+            self.gravar(etapa, resultado)
+            return resultado
+
+        return executar
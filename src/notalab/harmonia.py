@@ -1,9 +1,54 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
 import librosa
 import numpy as np
-from music21 import pitch
 
 import config.config as config
 from src.notalab.audio import carregar_audio
+from src.notalab.cache_audio import hash_arquivo
+from src.notalab.cache_etapas import memorizar
+from src.notalab.contexto import ContextoAnalise
+from src.notalab.escalas import ajustar_a_escala, tabela_escala
+from src.notalab.eventos import Eventos
+from src.utils.perfil import contar, medir_etapa
+
+# Salto (em amostras) entre frames do rastreamento de pitch
+HOP_PITCH = 512
+
+# Janelas usadas quando a primeira busca encontra poucos onsets
+# (mais sensíveis a picos locais e a diferenças de energia menores)
+JANELAS_SENSIVEIS = {
+    'pre_max': 0.01,
+    'post_max': 0.01,
+    'pre_avg': 0.03,
+    'post_avg': 0.03,
+    'wait': 0.01,
+}
+
+# Janela (em amostras) do RMS que mede o silêncio antes de um corte do
+# rastreamento de pitch em blocos
+JANELA_CORTE_PITCH = 2048
+
+# Passos da busca binária pelo delta na busca adaptativa de onsets
+PASSOS_BUSCA_DELTA = 12
+
+# Menor delta aceito na busca adaptativa: abaixo dele o peak_pick marca
+# como onset as oscilações do ruído de fundo
+DELTA_MIN_BUSCA = 0.03
+
+# RMS (sinal normalizado) abaixo do qual um trecho do vocal é silêncio
+RMS_SILENCIO = 0.01
+
+# Graus da escala (negativo = abaixo da melodia) de cada voz de apoio, por
+# variação de harmonia: -2 = terça, -4 = quinta, -5 = sexta, -7 = oitava
+VARIACOES_HARMONIA = {
+    'tercas': {'Contralto': -2, 'Tenor': -5},
+    'triade': {'Contralto': -2, 'Tenor': -4},
+    'sextas': {'Contralto': -5, 'Tenor': -7},
+}
 
 
 def quantizar_notas(notas_duracao, bpm, grade=16, ativar=True):
@@ -11,129 +56,400 @@ def quantizar_notas(notas_duracao, bpm, grade=16, ativar=True):
     Quantiza as notas para alinhá-las à grade musical.
 
     Args:
-        notas_duracao (list): Lista de tuplas (nota, duração)
+        notas_duracao (Eventos | list): Eventos ou lista de tuplas (nota, duração)
         bpm (int): Andamento em batidas por minuto
         grade (int): Divisão da grade musical (4=semínimas, 8=colcheias, 16=semicolcheias)
         ativar (bool): Se False, retorna as notas inalteradas
 
     Returns:
-        list: Lista de tuplas (nota, duração) com ritmo quantizado
+        Eventos: Notas com ritmo quantizado (todas de uma vez, sobre o array
+        de durações)
     """
-    if not ativar or not notas_duracao:
-        return notas_duracao
+    eventos = Eventos.de_notas(notas_duracao)
+    if not ativar or not len(eventos):
+        return eventos
+    return eventos.quantizar(grade)
 
-    # Valor de uma batida em quarter notes
-    beat_duration = 1.0
 
-    # Duração de uma unidade da grade (em quarter notes)
-    grid_unit = beat_duration / (grade / 4)
+@medir_etapa('harmonia.rastrear_pitch')
+def rastrear_pitch(sinal, taxa, hop_length=HOP_PITCH):
+    """
+    Rastreia a frequência fundamental uma única vez sobre todo o sinal.
 
-    # Processar cada nota
-    quantizadas = []
-    for nota, duracao in notas_duracao:
-        # Quantizar posição: arredondar para o múltiplo mais próximo de grid_unit
-        qnt_duracao = round(duracao / grid_unit) * grid_unit
+    Args:
+        sinal (np.ndarray): Sinal de áudio (já normalizado)
+        taxa (int): Taxa de amostragem
+        hop_length (int): Salto entre frames em amostras
 
-        # Evitar notas com duração zero
-        if qnt_duracao < grid_unit:
-            qnt_duracao = grid_unit
+    Returns:
+        tuple: (f0, voiced_flag, voiced_prob), um valor por frame
+    """
+    contar('chamadas_pyin')
+    return librosa.pyin(
+        sinal,
+        fmin=librosa.note_to_hz('C2'),
+        fmax=librosa.note_to_hz('C6'),
+        sr=taxa,
+        hop_length=hop_length,
+        fill_na=None,
+    )
 
-        quantizadas.append((nota, qnt_duracao))
 
-    return quantizadas
+def pontos_de_corte(energia, onsets, n_blocos, janela=JANELA_CORTE_PITCH):
+    """
+    Escolhe onde cortar o vocal para rastrear o pitch em blocos.
 
+    Para cada corte ideal (k * n / n_blocos) vence, entre os onsets a no
+    máximo meio bloco de distância, o que tem o trecho mais silencioso antes
+    (os onsets já vêm recuados até o vale do envelope). Sem onsets por
+    perto, vale o ponto mais silencioso da grade de frames. Os cortes são
+    múltiplos de HOP_PITCH, para os frames de cada bloco coincidirem com os
+    do vocal inteiro.
 
-def extrair_notas_vocal(
+    Args:
+        energia (np.ndarray): Soma acumulada de sinal**2 (ver preparar_vocal)
+        onsets (np.ndarray): Onsets em amostras da taxa do pitch
+        n_blocos (int): Número de blocos desejado
+        janela (int): Amostras antes do corte usadas para medir o silêncio
+
+    Returns:
+        list: Posições dos cortes em amostras, crescentes, sem 0 e sem o fim
+    """
+    n = len(energia) - 1
+    passo = n / n_blocos
+    onsets = (np.asarray(onsets, dtype=np.int64) // HOP_PITCH) * HOP_PITCH
+    cortes = []
+    for k in range(1, n_blocos):
+        alvo = k * passo
+        anterior = cortes[-1] + HOP_PITCH if cortes else janela
+        inicio = max(int(alvo - passo / 2), anterior)
+        fim = min(int(alvo + passo / 2), n - HOP_PITCH)
+        candidatos = onsets[(onsets >= inicio) & (onsets <= fim)]
+        if not len(candidatos):
+            primeiro = -(-inicio // HOP_PITCH)
+            candidatos = np.arange(primeiro, fim // HOP_PITCH + 1) * HOP_PITCH
+        if not len(candidatos):
+            continue
+        antes = np.maximum(candidatos - janela, 0)
+        silencio = energia[candidatos] - energia[antes]
+        cortes.append(int(candidatos[np.argmin(silencio)]))
+    return cortes
+
+
+@medir_etapa('harmonia.rastrear_pitch_em_blocos')
+def rastrear_pitch_em_blocos(sinal, taxa, cortes, processos):
+    """
+    Rastreia o pitch de cada bloco num pool de processos e emenda os frames.
+
+    Com os cortes em múltiplos de HOP_PITCH, o último frame de cada bloco é
+    o mesmo instante do primeiro frame do bloco seguinte; ele é descartado e
+    o resultado tem exatamente os frames de rastrear_pitch sobre o vocal
+    inteiro.
+
+    Returns:
+        tuple: (f0, voiced_flag, voiced_prob), um valor por frame
+    """
+    limites = [0, *cortes, len(sinal)]
+    trechos = [sinal[a:b] for a, b in zip(limites, limites[1:])]
+    contar('blocos_pitch', len(trechos))
+    # spawn: um fork com o TensorFlow ou as threads do agendador ativas trava
+    with ProcessPoolExecutor(
+        max_workers=min(processos, len(trechos)),
+        mp_context=multiprocessing.get_context('spawn'),
+    ) as pool:
+        partes = list(pool.map(rastrear_pitch, trechos, repeat(taxa)))
+
+    # Sem o último frame de cada bloco, exceto do último
+    emendar = [tuple(c[:-1] for c in parte) for parte in partes[:-1]]
+    emendar.append(partes[-1])
+    return tuple(np.concatenate(coluna) for coluna in zip(*emendar))
+
+
+@medir_etapa('harmonia.preparar_vocal')
+def preparar_vocal(
     caminho_vocal,
-    sr=44100,
-    bpm=120,
-    min_dur=config.MIN_DURACAO_NOTA,
-    tom='C',
-    modo='maior',
+    sr=config.TAXAS_POR_ETAPA['pitch'],
+    passagem_unica=config.PITCH_PASSAGEM_UNICA,
+    memorizar_pitch=config.MEMOIZAR_ETAPAS,
+    sinal=None,
+    taxa_sinal=None,
+    impressao=None,
+    processos_pitch=config.PROCESSOS_PITCH,
+):
+    """
+    Calcula as etapas caras da extração vocal, que não dependem dos
+    parâmetros de onset, agrupamento ou quantização.
+
+    O resultado pode ser reaproveitado por várias chamadas de
+    detectar_onsets/segmentar_notas (ver src.notalab.varredura). O
+    rastreamento de pitch, a parte mais cara, também fica guardado em disco
+    (ver src.notalab.cache_etapas) pelo conteúdo do vocal e pelas taxas.
+
+    Args:
+        caminho_vocal (str): Caminho do stem vocal (None se `sinal` for dado)
+        sr (int): Taxa de amostragem do carregamento
+        passagem_unica (bool): Rastreia o pitch do vocal inteiro de uma vez
+        memorizar_pitch (bool): Reaproveita o pitch guardado em disco
+        sinal (np.ndarray): Vocal mono já em memória (ver
+            stems.separar_vocal); substitui a leitura de caminho_vocal
+        taxa_sinal (int): Taxa de amostragem de `sinal`
+        impressao (str): Impressão do vocal para o cache de pitch (padrão:
+            hash de caminho_vocal)
+        processos_pitch (int): Processos do rastreamento em blocos (1 = um
+            só pyin, 0 = um por núcleo); ver rastrear_pitch_em_blocos
+
+    Returns:
+        dict: 'contexto_onsets' (taxa e hop do envelope), 'envelope' (envelope
+        de onset normalizado em [0, 1]), 'sinal' e 'taxa' (taxa do pitch),
+        'duracao', 'pitch' ((f0, voiced_flag, voiced_prob) ou None sem
+        passagem única) e 'energia' (soma acumulada de sinal**2)
+    """
+    # Carregar e normalizar áudio
+    if sinal is None:
+        sinal, taxa = carregar_audio(caminho_vocal, sr)
+    elif sr and taxa_sinal != sr:
+        sinal, taxa = librosa.resample(sinal, orig_sr=taxa_sinal, target_sr=sr), sr
+    else:
+        taxa = taxa_sinal
+    sinal = librosa.util.normalize(sinal)
+
+    # Envelope de onset calculado uma vez e reaproveitado por todas as buscas
+    contexto = ContextoAnalise(sinal, taxa)
+    contexto_onsets = contexto.para_etapa('onsets')
+
+    # O restante trabalha na taxa do rastreamento de pitch
+    contexto_pitch = contexto.para_etapa('pitch')
+    sinal, taxa = contexto_pitch.sinal, contexto_pitch.taxa
+
+    # Energia acumulada: o RMS de qualquer segmento sai de duas leituras
+    energia = np.concatenate(([0.0], np.cumsum(np.square(sinal, dtype=np.float64))))
+
+    envelope = normalizar_envelope(contexto_onsets.envelope_onset)
+
+    # Rastreamento de pitch único, fatiado por segmento em segmentar_notas
+    pitch = None
+    if passagem_unica:
+        parametros = {
+            'taxa_carregamento': sr,
+            'taxa': taxa,
+            'hop_length': HOP_PITCH,
+        }
+        processos = processos_pitch or os.cpu_count() or 1
+        n_blocos = min(
+            processos, int(contexto.duracao // config.DURACAO_MIN_BLOCO_PITCH)
+        )
+
+        def rastrear():
+            if n_blocos < 2:
+                return rastrear_pitch(sinal, taxa)
+            # Os cortes caem em pontos de silêncio antes de um onset
+            onsets = escolher_picos(
+                envelope,
+                contexto_onsets.taxa,
+                contexto_onsets.hop_length,
+                delta=config.SENSIBILIDADE_ONSET,
+                pre_max=config.PRE_MAX,
+                post_max=config.POST_MAX,
+                pre_avg=config.PRE_AVG,
+                post_avg=config.POST_AVG,
+                wait=config.WAIT,
+            )
+            cortes = pontos_de_corte(energia, onsets * taxa, n_blocos)
+            return rastrear_pitch_em_blocos(sinal, taxa, cortes, processos)
+
+        if n_blocos >= 2:
+            # Os cortes mudam um pouco o pitch perto das emendas
+            parametros['blocos'] = (n_blocos, config.SENSIBILIDADE_ONSET)
+        pitch = memorizar(
+            'pitch',
+            impressao or hash_arquivo(caminho_vocal),
+            parametros,
+            rastrear,
+            ativar=memorizar_pitch,
+        )
+
+    return {
+        'contexto_onsets': contexto_onsets,
+        'envelope': envelope,
+        'sinal': sinal,
+        'taxa': taxa,
+        'duracao': contexto.duracao,
+        'pitch': pitch,
+        'energia': energia,
+    }
+
+
+def normalizar_envelope(envelope):
+    """Leva o envelope de onset para [0, 1], como o onset_detect faz."""
+    envelope = envelope - envelope.min()
+    return envelope / (envelope.max() + np.finfo(envelope.dtype).tiny)
+
+
+def escolher_picos(
+    envelope, taxa, hop_length, delta, pre_max, post_max, pre_avg, post_avg, wait
+):
+    """
+    Escolhe os onsets num envelope já normalizado (etapa barata).
+
+    Equivale ao librosa.onset.onset_detect com backtrack=True e
+    units='time', mas sem recalcular nem renormalizar o envelope, o que
+    permite testar vários limiares sobre o mesmo envelope.
+
+    Returns:
+        np.ndarray: Instantes dos onsets em segundos
+    """
+    contar('buscas_onset')
+    if not envelope.any() or not np.all(np.isfinite(envelope)):
+        return np.zeros(0)
+    picos = librosa.util.peak_pick(
+        envelope,
+        pre_max=pre_max,
+        post_max=post_max,
+        pre_avg=pre_avg,
+        post_avg=post_avg,
+        delta=delta,
+        wait=wait,
+    )
+    if len(picos) == 0:
+        return np.zeros(0)
+    picos = librosa.onset.onset_backtrack(picos, envelope)
+    return librosa.frames_to_time(picos, sr=taxa, hop_length=hop_length)
+
+
+def buscar_delta(
+    envelope, taxa, hop_length, alvo, delta_max, janelas, delta_min=0.0
+):
+    """
+    Busca binária do maior delta que ainda produz `alvo` onsets.
+
+    O número de picos cai à medida que o delta sobe, então o maior delta que
+    atinge o alvo é o limiar mais conservador com a densidade desejada. Se
+    nem delta_min chega ao alvo, devolve os onsets de delta_min.
+
+    Returns:
+        np.ndarray: Instantes dos onsets em segundos
+    """
+    melhor = escolher_picos(envelope, taxa, hop_length, delta_min, **janelas)
+    if len(melhor) < alvo or delta_max <= delta_min:
+        return melhor
+
+    baixo, alto = delta_min, delta_max
+    for _ in range(PASSOS_BUSCA_DELTA):
+        meio = (baixo + alto) / 2
+        onsets = escolher_picos(envelope, taxa, hop_length, meio, **janelas)
+        if len(onsets) >= alvo:
+            baixo, melhor = meio, onsets
+        else:
+            alto = meio
+    return melhor
+
+
+def duracao_ativa(vocal, janela=HOP_PITCH):
+    """
+    Soma a duração (segundos) dos trechos do vocal que não são silêncio.
+
+    Args:
+        vocal (dict): Resultado de preparar_vocal
+        janela (int): Amostras de cada trecho medido
+
+    Returns:
+        float: Duração dos trechos com RMS acima de RMS_SILENCIO
+    """
+    energia = vocal['energia']
+    n = (len(energia) - 1) // janela
+    if n == 0:
+        return 0.0
+    pontos = energia[: n * janela + 1 : janela]
+    rms = np.sqrt(np.maximum(np.diff(pontos), 0.0) / janela)
+    return float(np.count_nonzero(rms > RMS_SILENCIO) * janela / vocal['taxa'])
+
+
+def detectar_onsets(
+    vocal,
     sensibilidade_onset=config.SENSIBILIDADE_ONSET,
-    limite_agrupamento=config.LIMITE_AGRUPAMENTO,
-    quantizar=config.QUANTIZAR,
-    grade_quantizacao=config.GRADE_QUANTIZACAO,
     pre_max=config.PRE_MAX,
     post_max=config.POST_MAX,
     pre_avg=config.PRE_AVG,
     post_avg=config.POST_AVG,
     wait=config.WAIT,
+    min_onsets=config.MIN_ONSETS,
+    densidade_alvo=config.DENSIDADE_ONSETS_ALVO,
 ):
     """
-    Extrai notas vocais com ajustes para melhorar a precisão rítmica.
-    Todos os parâmetros de configuração estão documentados em config.py
-    """
-    # Carregar e normalizar áudio
-    sinal, taxa = carregar_audio(caminho_vocal, sr)
-    sinal = librosa.util.normalize(sinal)
+    Escolhe os picos do envelope de onset já calculado em preparar_vocal.
+
+    Se a primeira busca encontrar menos de `min_onsets` onsets, a
+    sensibilidade é ajustada por busca binária no delta, com janelas mais
+    sensíveis, até chegar perto de `densidade_alvo` onsets por segundo de
+    voz (o silêncio não conta). O delta não desce abaixo de
+    DELTA_MIN_BUSCA, para não transformar ruído em notas. Todas as buscas
+    reaproveitam o mesmo envelope.
 
-    # Definir escala baseada no tom e modo
-    notas_map = [
-        'C',
-        'C#',
-        'D',
-        'D#',
-        'E',
-        'F',
-        'F#',
-        'G',
-        'G#',
-        'A',
-        'A#',
-        'B',
-    ]
-    tom_idx = notas_map.index(tom)
-
-    # Selecionar escala apropriada
-    if modo == 'maior':
-        escala = [(tom_idx + i) % 12 for i in [0, 2, 4, 5, 7, 9, 11]]
-    else:  # modo menor
-        escala = [(tom_idx + i) % 12 for i in [0, 2, 3, 5, 7, 8, 10]]
-
-    # Criar mapa de frequências para cada nota da escala
-    freq_notas = {}
-    for i in escala:
-        nota_nome = notas_map[i]
-        for oitava in range(2, 6):  # Oitavas C2-B5
-            nota_completa = f'{nota_nome}{oitava}'
-            freq_notas[nota_completa] = librosa.note_to_hz(nota_completa)
+    Returns:
+        np.ndarray: Instantes (segundos) dos onsets, com o início (0) e o
+        fim do áudio nas pontas
+    """
+    envelope = vocal['envelope']
+    taxa = vocal['contexto_onsets'].taxa
+    hop_length = vocal['contexto_onsets'].hop_length
 
     # Detectar onsets com parâmetros configuráveis
-    onsets = librosa.onset.onset_detect(
-        y=sinal,
-        sr=taxa,
-        units='time',
-        backtrack=True,
+    onsets = escolher_picos(
+        envelope,
+        taxa,
+        hop_length,
+        delta=sensibilidade_onset,
         pre_max=pre_max,
         post_max=post_max,
         pre_avg=pre_avg,
         post_avg=post_avg,
-        delta=sensibilidade_onset,
         wait=wait,
     )
 
-    # Se temos poucos onsets, tentar novamente com parâmetros ainda mais sensíveis
-    if len(onsets) < 10:
-        onsets = librosa.onset.onset_detect(
-            y=sinal,
-            sr=taxa,
-            units='time',
-            backtrack=True,
-            pre_max=0.01,  # Reduzido: mais sensível a picos locais
-            post_max=0.01,  # Reduzido: mais sensível a picos locais
-            pre_avg=0.03,  # Reduzido: janela menor para média = mais sensível
-            post_avg=0.03,  # Reduzido: janela menor para média = mais sensível
-            delta=0.03,  # Reduzido: aceita diferenças de energia menores
-            wait=0.01,  # Mantido: ainda precisamos separar notas distintas
+    # Se temos poucos onsets, procurar o limiar que dá a densidade desejada
+    if len(onsets) < min_onsets:
+        alvo = max(min_onsets, int(densidade_alvo * duracao_ativa(vocal)))
+        onsets = buscar_delta(
+            envelope,
+            taxa,
+            hop_length,
+            alvo,
+            delta_max=max(sensibilidade_onset, DELTA_MIN_BUSCA),
+            janelas=JANELAS_SENSIVEIS,
+            delta_min=min(sensibilidade_onset, DELTA_MIN_BUSCA),
         )
 
     # Adicionar o início e fim do áudio
     onsets = np.append(np.array([0]), onsets)
-    onsets = np.append(onsets, librosa.get_duration(y=sinal, sr=taxa))
+    return np.append(onsets, vocal['duracao'])
+
+
+def segmentar_notas(
+    vocal,
+    onsets,
+    bpm=120,
+    min_dur=config.MIN_DURACAO_NOTA,
+    tom='C',
+    modo='maior',
+):
+    """
+    Atribui a cada segmento entre onsets a nota da escala mais próxima da
+    sua frequência mediana (ou pausa).
 
-    # Processar cada segmento entre onsets
-    notas_com_duracao = []
+    Returns:
+        Eventos: Notas e pausas (durações em quarter notes), antes do
+        agrupamento
+    """
+    sinal, taxa = vocal['sinal'], vocal['taxa']
+    energia = vocal['energia']
+    if vocal['pitch'] is not None:
+        f0_total, voiced_total, prob_total = vocal['pitch']
+
+    # Processar cada segmento entre onsets: primeiro coletamos a frequência
+    # mediana de cada um, depois ajustamos todas à escala de uma só vez
+    duracoes = []
+    medianas = []
+    energicos = []
 
     for i in range(len(onsets) - 1):
         inicio = int(onsets[i] * taxa)
@@ -146,83 +462,148 @@ def extrair_notas_vocal(
         if fim - inicio < taxa * min_dur and i > 0 and i < len(onsets) - 2:
             continue
 
-        # Extrair segmento de áudio
-        segmento = sinal[inicio:fim]
         duracao = onsets[i + 1] - onsets[i]
-        duracao_quarter = duracao * (bpm / 60)
+        duracoes.append(duracao * (bpm / 60))
 
         # Análise de frequência fundamental com threshold mais baixo
-        f0, voiced_flag, voiced_prob = librosa.pyin(
-            segmento,
-            fmin=librosa.note_to_hz('C2'),  # Limite inferior: C2 (aprox. 65Hz)
-            fmax=librosa.note_to_hz(
-                'C6'
-            ),  # Limite superior: C6 (aprox. 1047Hz)
-            sr=taxa,
-            fill_na=None,  # Não preenche valores ausentes
-        )
+        if vocal['pitch'] is not None:
+            # Frames cujo centro cai dentro do segmento (mínimo de um); o
+            # arredondamento para cima deixa de fora o frame centrado antes
+            # do onset, que costuma ainda ter a altura da nota anterior
+            q_ini = -(-inicio // HOP_PITCH)
+            q_fim = max(fim // HOP_PITCH, q_ini + 1)
+            f0 = f0_total[q_ini:q_fim]
+            voiced_flag = voiced_total[q_ini:q_fim]
+            voiced_prob = prob_total[q_ini:q_fim]
+        else:
+            contar('chamadas_pyin')
+            f0, voiced_flag, voiced_prob = librosa.pyin(
+                sinal[inicio:fim],
+                fmin=librosa.note_to_hz('C2'),  # Limite inferior: C2 (aprox. 65Hz)
+                fmax=librosa.note_to_hz(
+                    'C6'
+                ),  # Limite superior: C6 (aprox. 1047Hz)
+                sr=taxa,
+                fill_na=None,  # Não preenche valores ausentes
+            )
 
         # Threshold mais baixo para detectar mais nuances (0.4 em vez de 0.6)
+        freq_mediana = np.nan
         if f0 is not None and np.any(voiced_flag):
             valid_f0 = f0[voiced_flag & (voiced_prob > 0.4)]
-
             if len(valid_f0) > 0 and not np.all(np.isnan(valid_f0)):
                 freq_mediana = np.nanmedian(valid_f0)
+        medianas.append(freq_mediana)
 
-                # Encontrar a nota mais próxima na escala
-                nota_mais_proxima = None
-                menor_distancia = float('inf')
-
-                for nota, freq in freq_notas.items():
-                    distancia = abs(freq - freq_mediana) / freq
-                    if distancia < menor_distancia:
-                        menor_distancia = distancia
-                        nota_mais_proxima = nota
-
-                # Tolerância para considerar uma nota válida
-                if menor_distancia < 0.15:
-                    notas_com_duracao.append(
-                        (nota_mais_proxima, duracao_quarter)
-                    )
-                else:
-                    # Verificar se há energia suficiente para ser uma nota
-                    rms = np.sqrt(np.mean(segmento**2))
-                    if (
-                        rms > 0.01
-                    ):  # Se tiver energia mínima, tenta forçar para a escala
-                        notas_com_duracao.append(
-                            (nota_mais_proxima, duracao_quarter)
-                        )
-                    else:
-                        notas_com_duracao.append(('rest', duracao_quarter))
-            else:
-                notas_com_duracao.append(('rest', duracao_quarter))
-        else:
-            notas_com_duracao.append(('rest', duracao_quarter))
+        # Energia mínima para forçar notas desafinadas para a escala
+        fim_sinal = min(fim, len(sinal))
+        n_amostras = max(fim_sinal - inicio, 1)
+        rms = np.sqrt(max(energia[fim_sinal] - energia[inicio], 0.0) / n_amostras)
+        energicos.append(rms > RMS_SILENCIO)
 
-    # Pós-processamento: limitar o agrupamento para preservar nuances
-    if not notas_com_duracao:
-        return []
+    contar('segmentos_onset', len(duracoes))
+
+    # Encontrar a nota mais próxima na escala (oitavas C2-B5) para todos
+    # os segmentos numa única operação vetorizada
+    midis, distancias = ajustar_a_escala(medianas, tom, modo, 2, 5)
+
+    # Tolerância para considerar uma nota válida; fora dela, só aceita a
+    # nota se o segmento tiver energia suficiente
+    aceitas = (midis >= 0) & ((distancias < 0.15) | np.asarray(energicos, dtype=bool))
+    return Eventos(np.where(aceitas, midis, -1), duracoes)
 
-    notas_processadas = []
-    nota_atual, dur_atual = notas_com_duracao[0]
 
-    # Usar o valor de limite_agrupamento passado como parâmetro
+def agrupar_notas(
+    notas_com_duracao, bpm=120, limite_agrupamento=config.LIMITE_AGRUPAMENTO
+):
+    """
+    Junta notas iguais consecutivas enquanto a nota acumulada não passar do
+    limite de agrupamento.
+
+    Args:
+        notas_com_duracao (Eventos | list): Eventos ou tuplas (nota, duração)
+        bpm (int): Andamento em batidas por minuto
+        limite_agrupamento (float): Limite em segundos (convertido para
+            quarter notes pelo andamento)
+
+    Returns:
+        Eventos: Notas agrupadas
+    """
+    # Pós-processamento: limitar o agrupamento para preservar nuances
     limite_agrup_quarter = limite_agrupamento * (60 / bpm)
+    return Eventos.de_notas(notas_com_duracao).agrupar(limite_agrup_quarter)
 
-    for i in range(1, len(notas_com_duracao)):
-        nota, dur = notas_com_duracao[i]
 
-        # Agrupar apenas se for a mesma nota E a duração não exceder o limite
-        if nota == nota_atual and dur_atual < limite_agrup_quarter:
-            dur_atual += dur
-        else:
-            # Nova nota, registrar a anterior e começar nova
-            notas_processadas.append((nota_atual, dur_atual))
-            nota_atual, dur_atual = nota, dur
+@medir_etapa('harmonia.extrair_notas_vocal')
+def extrair_notas_vocal(
+    caminho_vocal,
+    sr=config.TAXAS_POR_ETAPA['pitch'],
+    bpm=120,
+    min_dur=config.MIN_DURACAO_NOTA,
+    tom='C',
+    modo='maior',
+    sensibilidade_onset=config.SENSIBILIDADE_ONSET,
+    limite_agrupamento=config.LIMITE_AGRUPAMENTO,
+    quantizar=config.QUANTIZAR,
+    grade_quantizacao=config.GRADE_QUANTIZACAO,
+    pre_max=config.PRE_MAX,
+    post_max=config.POST_MAX,
+    pre_avg=config.PRE_AVG,
+    post_avg=config.POST_AVG,
+    wait=config.WAIT,
+    passagem_unica=config.PITCH_PASSAGEM_UNICA,
+    memorizar_pitch=config.MEMOIZAR_ETAPAS,
+    sinal=None,
+    taxa_sinal=None,
+    impressao=None,
+    processos_pitch=config.PROCESSOS_PITCH,
+):
+    """
+    Extrai notas vocais com ajustes para melhorar a precisão rítmica.
+    Todos os parâmetros de configuração estão documentados em config.py
+
+    A extração é dividida em etapas: preparar_vocal (carregamento, envelope
+    de onset e pitch, as partes caras), detectar_onsets, segmentar_notas,
+    agrupar_notas e quantizar_notas (baratas, dependem dos parâmetros).
 
-    # Adicionar a última nota
-    notas_processadas.append((nota_atual, dur_atual))
+    Com passagem_unica=True o pyin roda uma vez sobre o vocal inteiro e cada
+    segmento entre onsets usa apenas a fatia de frames correspondente.
+    Onsets e pitch usam as taxas de 'onsets' e 'pitch' em TAXAS_POR_ETAPA.
+
+    Com `sinal` (e `taxa_sinal`) o vocal vem da memória em vez de
+    caminho_vocal; `impressao` o identifica no cache de pitch.
+
+    Com processos_pitch diferente de 1, vocais longos são cortados em
+    silêncios antes de onsets e o pyin de cada bloco roda num processo;
+    os frames são emendados antes da segmentação, então o agrupamento e a
+    quantização são os mesmos de uma passagem única.
+
+    Returns:
+        Eventos: Notas da melodia (itera como tuplas (nota, duração))
+    """
+    vocal = preparar_vocal(
+        caminho_vocal,
+        sr,
+        passagem_unica,
+        memorizar_pitch,
+        sinal=sinal,
+        taxa_sinal=taxa_sinal,
+        impressao=impressao,
+        processos_pitch=processos_pitch,
+    )
+    onsets = detectar_onsets(
+        vocal,
+        sensibilidade_onset=sensibilidade_onset,
+        pre_max=pre_max,
+        post_max=post_max,
+        pre_avg=pre_avg,
+        post_avg=post_avg,
+        wait=wait,
+    )
+    notas_com_duracao = segmentar_notas(
+        vocal, onsets, bpm=bpm, min_dur=min_dur, tom=tom, modo=modo
+    )
+    notas_processadas = agrupar_notas(notas_com_duracao, bpm, limite_agrupamento)
 
     # Quantização opcional das notas para alinhamento rítmico
     if quantizar:
@@ -233,50 +614,144 @@ def extrair_notas_vocal(
     return notas_processadas
 
 
-def gerar_harmonias_vocais(notas_melodia, tom='C', modo='maior'):
+def harmonizar_diatonico(midis, tom, modo, passos):
     """
-    Gera harmonias em uníssono, mantendo a mesma nota em diferentes oitavas.
+    Desloca cada nota `passos` graus dentro da escala (aritmética de graus).
+
+    Ex.: passos=-2 é uma terça diatônica abaixo, -5 uma sexta abaixo e -4
+    uma quinta abaixo; o tamanho do intervalo (maior/menor, justo ou não)
+    sai da própria escala. Notas fora da escala usam o grau logo abaixo.
+
+    Args:
+        midis (np.ndarray): Números MIDI da melodia (-1 = pausa)
+        tom (str): Tônica
+        modo (str): 'maior' ou 'menor'
+        passos (int): Graus da escala a deslocar (negativo = para baixo)
+
+    Returns:
+        np.ndarray: Números MIDI da voz harmonizada (-1 = pausa)
     """
-    harmonias = {'Soprano': [], 'Contralto': [], 'Tenor': []}
+    escala = tabela_escala(tom, modo, -1, 9)
+    escala = escala[escala < 128]
+    grau = np.searchsorted(escala, midis, side='right') - 1
+    grau = np.clip(grau + passos, 0, len(escala) - 1)
+    return np.where(midis < 0, -1, escala[grau])
 
-    for nota_str, duracao in notas_melodia:
-        if nota_str is None or nota_str.lower() == 'rest':
-            # Pausas para todas as vozes
-            harmonias['Soprano'].append(('rest', duracao))
-            harmonias['Contralto'].append(('rest', duracao))
-            harmonias['Tenor'].append(('rest', duracao))
-            continue
 
-        try:
-            # Criar objetos pitch para manipulação
-            soprano = pitch.Pitch(nota_str)
-
-            # Contralto é a mesma nota, mas uma oitava abaixo se necessário
-            contralto = pitch.Pitch(nota_str)
-            if contralto.midi > 65:  # Se for muito agudo
-                contralto.octave -= 1
-
-            # Tenor é tipicamente duas oitavas abaixo
-            tenor = pitch.Pitch(nota_str)
-            tenor.octave -= 1
-            if tenor.midi > 60:
-                tenor.octave -= 1
-
-            # Garantir tessitura vocal adequada
-            while contralto.midi < 48:
-                contralto.octave += 1
-            while tenor.midi < 36:
-                tenor.octave += 1
-
-            # Adicionar às vozes
-            harmonias['Soprano'].append((soprano.nameWithOctave, duracao))
-            harmonias['Contralto'].append((contralto.nameWithOctave, duracao))
-            harmonias['Tenor'].append((tenor.nameWithOctave, duracao))
-
-        except Exception:
-            # Em caso de erro, usar pausas
-            harmonias['Soprano'].append(('rest', duracao))
-            harmonias['Contralto'].append(('rest', duracao))
-            harmonias['Tenor'].append(('rest', duracao))
-
-    return harmonias
+def limitar_tessitura(midis, minimo, maximo):
+    """
+    Leva cada nota para dentro da tessitura deslocando oitavas inteiras.
+
+    Args:
+        midis (np.ndarray): Números MIDI (-1 = pausa, mantida)
+        minimo (int): Nota mais grave permitida
+        maximo (int): Nota mais aguda permitida (intervalo de pelo menos
+            uma oitava entre os limites)
+
+    Returns:
+        np.ndarray: Números MIDI dentro dos limites
+    """
+    midis = np.asarray(midis)
+    ajustados = midis + 12 * np.maximum(0, -((midis - minimo) // 12))
+    ajustados = ajustados - 12 * np.maximum(0, (ajustados - maximo + 11) // 12)
+    return np.where(midis < 0, -1, ajustados)
+
+
+def _vozes_unissono(soprano):
+    """Mesma nota em oitavas diferentes (a harmonização original)."""
+    # Contralto é a mesma nota, mas uma oitava abaixo se for muito aguda
+    contralto = np.where(soprano > 65, soprano - 12, soprano)
+
+    # Tenor é tipicamente duas oitavas abaixo
+    tenor = soprano - 12
+    tenor = np.where(tenor > 60, tenor - 12, tenor)
+
+    # Garantir tessitura vocal adequada (sobe oitavas inteiras até o limite)
+    contralto = contralto + 12 * np.maximum(0, -((contralto - 48) // 12))
+    tenor = tenor + 12 * np.maximum(0, -((tenor - 36) // 12))
+
+    pausas = soprano < 0
+    return {
+        'Soprano': soprano,
+        'Contralto': np.where(pausas, -1, contralto),
+        'Tenor': np.where(pausas, -1, tenor),
+    }
+
+
+def vozes_midi(soprano, tom='C', modo='maior', variacao=config.VARIACAO_HARMONIA):
+    """
+    Gera as vozes de apoio de uma melodia inteira em espaço MIDI.
+
+    Args:
+        soprano (np.ndarray): Números MIDI da melodia (-1 = pausa)
+        tom (str): Tônica
+        modo (str): 'maior' ou 'menor'
+        variacao (str): Chave de VARIACOES_HARMONIA
+
+    Returns:
+        dict: Array de números MIDI por voz ('Soprano', 'Contralto', 'Tenor')
+    """
+    if variacao == 'unissono':
+        return _vozes_unissono(soprano)
+    if variacao not in VARIACOES_HARMONIA:
+        raise ValueError(f'Variação de harmonia desconhecida: {variacao}')
+
+    vozes = {'Soprano': soprano}
+    for voz, passos in VARIACOES_HARMONIA[variacao].items():
+        minimo, maximo = config.TESSITURAS[voz]
+        midis = limitar_tessitura(
+            harmonizar_diatonico(soprano, tom, modo, passos), minimo, maximo
+        )
+        # Evita cruzar acima da melodia quando cabe uma oitava abaixo
+        cruzadas = (midis > soprano) & (midis - 12 >= minimo)
+        vozes[voz] = np.where(cruzadas, midis - 12, midis)
+    return vozes
+
+
+@medir_etapa('harmonia.gerar_harmonias_vocais')
+def gerar_harmonias_vocais(
+    notas_melodia, tom='C', modo='maior', variacao=config.VARIACAO_HARMONIA
+):
+    """
+    Gera as vozes de Soprano (a melodia), Contralto e Tenor.
+
+    Toda a melodia é processada de uma vez em arrays de números MIDI: os
+    intervalos são contados em graus da escala de `tom`/`modo` e cada voz é
+    trazida para a sua tessitura (TESSITURAS em config.py).
+
+    Args:
+        notas_melodia (Eventos | list): Eventos ou tuplas (nota, duração)
+        tom (str): Tônica
+        modo (str): 'maior' ou 'menor'
+        variacao (str): 'unissono', 'tercas', 'triade' ou 'sextas' (ver
+            VARIACOES_HARMONIA)
+
+    Returns:
+        dict: Eventos de cada voz, com os tempos da melodia
+    """
+    melodia = Eventos.de_notas(notas_melodia)
+    return {
+        voz: melodia.com_midi(midis)
+        for voz, midis in vozes_midi(melodia.midi, tom, modo, variacao).items()
+    }
+
+
+@medir_etapa('harmonia.gerar_variacoes')
+def gerar_variacoes(notas_melodia, tom='C', modo='maior', variacoes=None):
+    """
+    Gera várias harmonizações da mesma melodia, convertendo-a uma só vez.
+
+    Args:
+        notas_melodia (Eventos | list): Eventos ou tuplas (nota, duração)
+        tom (str): Tônica
+        modo (str): 'maior' ou 'menor'
+        variacoes (list): Variações desejadas (padrão: todas)
+
+    Returns:
+        dict: Resultado de gerar_harmonias_vocais para cada variação
+    """
+    melodia = Eventos.de_notas(notas_melodia)
+    return {
+        variacao: gerar_harmonias_vocais(melodia, tom, modo, variacao)
+        for variacao in (variacoes or ('unissono',) + tuple(VARIACOES_HARMONIA))
+    }
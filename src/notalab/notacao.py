@@ -1,52 +1,58 @@
 """
 Módulo para geração de partituras e notação musical.
+O music21 só é importado quando uma partitura é de fato montada.
 """
-from music21 import chord, note, stream
+import numpy as np
 
+from src.notalab.acordes import TEMPLATES, notas_acorde
+from src.notalab.escalas import NOMES_MIDI
+from src.notalab.eventos import Eventos
+from src.utils.perfil import contar, medir_etapa
 
+
+@medir_etapa('notacao.montar_harmonia')
 def montar_harmonia(notas_por_voz):
     """
     Monta a partitura, respeitando pausas e evitando notas inválidas.
+
+    As alturas de todas as vozes são comparadas de uma vez numa matriz
+    (vozes x eventos) de números MIDI; em cada evento sai uma pausa, uma nota
+    (todas as vozes iguais) ou um acorde com as notas das vozes que cantam.
+
+    Args:
+        notas_por_voz (dict): Eventos (ou listas de tuplas (nota, duração))
+            por voz, com os tempos da primeira voz
     """
+    from music21 import chord, note, stream
+
+    vozes = [Eventos.de_notas(notas) for notas in notas_por_voz.values()]
+    n_eventos = min((len(voz) for voz in vozes), default=0)
+    midis = np.array([voz.midi[:n_eventos] for voz in vozes]).reshape(-1, n_eventos)
+    duracoes = vozes[0].duracao[:n_eventos].tolist() if vozes else []
+    pausas = (midis < 0).all(axis=0)
+    unissonos = (midis == midis[:1]).all(axis=0)
+
     partitura = stream.Score()
-    vozes = list(notas_por_voz.keys())
-    sequencias = [notas_por_voz[v] for v in vozes]
     parte = stream.Part()
     parte.id = 'Coral'
-    for eventos in zip(*sequencias):
-        notas = [n for n, _ in eventos]
-        duracoes = [d for _, d in eventos]
-        dur = duracoes[0]
-        notas_unicas = set(notas)
-        if all(n is None or n.lower() == 'rest' for n in notas):
+    for i, dur in enumerate(duracoes):
+        if pausas[i]:
             nobj = note.Rest()
-            nobj.quarterLength = dur
-            parte.append(nobj)
-        elif len(notas_unicas) == 1:
-            n = list(notas_unicas)[0]
-            try:
-                nobj = note.Note(n)
-            except Exception:
-                nobj = note.Rest()
-            nobj.quarterLength = dur
-            parte.append(nobj)
+        elif unissonos[i]:
+            nobj = note.Note(NOMES_MIDI[midis[0, i]])
         else:
-            notas_validas = [
-                n for n in notas if n is not None and n.lower() != 'rest'
-            ]
-            try:
-                c = chord.Chord(notas_validas)
-                c.quarterLength = dur
-                parte.append(c)
-            except Exception:
-                nobj = note.Rest()
-                nobj.quarterLength = dur
-                parte.append(nobj)
+            nobj = chord.Chord(
+                [NOMES_MIDI[midi] for midi in midis[:, i].tolist() if midi >= 0]
+            )
+        nobj.quarterLength = dur
+        parte.append(nobj)
     partitura.append(parte)
+    contar('eventos_partitura', len(parte))
     return partitura
 
 
-def montar_acordes(acordes_idx, notas, duracao=2):
+@medir_etapa('notacao.montar_acordes')
+def montar_acordes(acordes_idx, notas, duracao=2, completo=False):
     """
     Gera uma partitura com os acordes detectados, sincronizados por segmento maior.
 
@@ -54,16 +60,23 @@ def montar_acordes(acordes_idx, notas, duracao=2):
         acordes_idx (list): Lista de índices dos acordes detectados
         notas (list): Lista de nomes das notas (ex: ['C', 'C#', ...])
         duracao (int): Duração padrão para cada acorde ou pausa
+        completo (bool): Se True, os índices são acordes completos (0-35,
+            ver src.notalab.acordes) e são escritos com todas as notas
 
     Returns:
         music21.stream.Part: Partitura com os acordes
     """
+    from music21 import chord, note, stream
+
     acordes_part = stream.Part()
     acordes_part.id = 'Acordes'
 
+    limite = len(TEMPLATES) if completo else len(notas)
     for idx in acordes_idx:
-        if idx is None or idx < 0 or idx >= len(notas):
+        if idx is None or idx < 0 or idx >= limite:
             acorde = note.Rest()
+        elif completo:
+            acorde = chord.Chord(notas_acorde(idx))
         else:
             acorde = chord.Chord([notas[idx]])
         acorde.quarterLength = duracao
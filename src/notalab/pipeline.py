@@ -0,0 +1,601 @@
+"""
+Módulo com o pipeline completo de uma faixa: análise da mixagem, separação
+de stems, extração da melodia vocal, geração de harmonias e exportação MIDI.
+Usado tanto pela interface interativa quanto pelo processamento em lote.
+
+Spleeter/TensorFlow e music21 são importados apenas nas etapas que os usam,
+então a análise sem stems nunca carrega o TensorFlow. O MIDI é gravado
+diretamente (src.notalab.smf); o music21 só entra para exportar MusicXML.
+"""
+import os
+from contextlib import nullcontext
+from pathlib import Path
+
+import config.config as config
+from src.notalab.acordes import nome_acorde
+from src.notalab.agendador import Agendador
+from src.notalab.audio import (carregar_audio, detectar_acordes, detectar_bpm,
+                               detectar_tom)
+from src.notalab.cache_audio import hash_arquivo
+from src.notalab.cache_etapas import chave_etapa, memorizar
+from src.notalab.contexto import ContextoAnalise
+from src.notalab.harmonia import (extrair_notas_vocal, gerar_harmonias_vocais,
+                                  quantizar_notas)
+from src.notalab.escalas import NOTAS
+from src.notalab.execucao import Execucao, pasta_execucao
+from src.notalab.notacao import montar_harmonia
+from src.notalab.smf import (VELOCIDADE_ACORDES, eventos_de_acordes,
+                             eventos_de_voz, gravar_smf)
+from src.utils.perfil import gravar_relatorio, medir_etapa, perfilar
+
+
+def _silencioso(*args, **kwargs):
+    pass
+
+
+def analisar_mix(sinal, taxa):
+    """
+    Analisa tonalidade, BPM e acordes da mixagem completa.
+
+    Args:
+        sinal (np.ndarray): Sinal de áudio
+        taxa (int): Taxa de amostragem
+
+    Returns:
+        dict: Chaves 'tonica', 'modo', 'bpm', 'batidas', 'acordes' e
+        'inicios_acordes' (início de cada compasso em segundos)
+    """
+    contexto = ContextoAnalise(sinal, taxa)
+    tonica, modo = detectar_tom(sinal, taxa, contexto=contexto)
+    bpm, batidas = detectar_bpm(
+        sinal, taxa, retornar_batidas=True, contexto=contexto
+    )
+    acordes, inicios_acordes = detectar_acordes(
+        sinal,
+        taxa,
+        bpm=bpm,
+        batidas=batidas,
+        completo=True,
+        contexto=contexto,
+        retornar_tempos=True,
+    )
+    return {
+        'tonica': tonica,
+        'modo': modo,
+        'bpm': bpm,
+        'batidas': batidas,
+        'acordes': acordes,
+        'inicios_acordes': inicios_acordes,
+    }
+
+
+# Etapas que formam o resultado de processar_faixa: numa faixa concluída só
+# elas continuam gravadas na pasta de execução
+ETAPAS_RESULTADO = ('analise', 'notas', 'midi')
+
+
+def parametros_analise(taxa=None):
+    """Parâmetros do config.py lidos pela decodificação e por analisar_mix."""
+    parametros = {
+        etapa: config.TAXAS_POR_ETAPA[etapa] for etapa in ('tom', 'bpm', 'acordes')
+    }
+    parametros['decodificacao'] = taxa or config.TAXAS_POR_ETAPA['decodificacao']
+    return parametros
+
+
+def parametros_transcricao():
+    """Parâmetros de extrair_notas_vocal lidos do config.py."""
+    return {
+        'sr': config.TAXAS_POR_ETAPA['pitch'],
+        'sensibilidade_onset': config.SENSIBILIDADE_ONSET,
+        'limite_agrupamento': config.LIMITE_AGRUPAMENTO,
+        'min_dur': config.MIN_DURACAO_NOTA,
+        'quantizar': config.QUANTIZAR,
+        'grade_quantizacao': config.GRADE_QUANTIZACAO,
+        # Parâmetros avançados
+        'pre_max': config.PRE_MAX,
+        'post_max': config.POST_MAX,
+        'pre_avg': config.PRE_AVG,
+        'post_avg': config.POST_AVG,
+        'wait': config.WAIT,
+        'passagem_unica': config.PITCH_PASSAGEM_UNICA,
+        'processos_pitch': config.PROCESSOS_PITCH,
+    }
+
+
+def parametros_notas(quantizar=config.QUANTIZAR):
+    """Chave do cache de notas: transcrição e padrões de detectar_onsets."""
+    return {
+        **parametros_transcricao(),
+        'quantizar': quantizar,
+        'min_onsets': config.MIN_ONSETS,
+        'densidade_alvo': config.DENSIDADE_ONSETS_ALVO,
+        'taxa_onsets': config.TAXAS_POR_ETAPA['onsets'],
+    }
+
+
+def parametros_vocal():
+    """Parâmetros de separar_vocal lidos do config.py."""
+    return {
+        'modelo': config.MODELO_VOCAL,
+        'sr': config.TAXAS_POR_ETAPA['pitch'],
+        'duracao_bloco': config.DURACAO_BLOCO_STEMS,
+        'sobreposicao': config.SOBREPOSICAO_STEMS,
+    }
+
+
+def parametros_stems():
+    """Parâmetros de separar_stems lidos do config.py."""
+    return {'modelo': config.MODELO_STEMS}
+
+
+def parametros_quantizacao():
+    """Parâmetros da quantização das notas brutas."""
+    return {'ativar': config.QUANTIZAR, 'grade': config.GRADE_QUANTIZACAO}
+
+
+def parametros_harmonias():
+    """Parâmetros de gerar_harmonias_vocais lidos do config.py."""
+    return {'variacao': config.VARIACAO_HARMONIA, 'tessituras': config.TESSITURAS}
+
+
+def parametros_exportacao():
+    """O que a etapa final grava além das vozes."""
+    return {
+        'acordes': config.EXPORTAR_ACORDES_MIDI,
+        'musicxml': config.EXPORTAR_MUSICXML,
+    }
+
+
+def transcrever_vocal(
+    caminho_vocal,
+    analise,
+    memorizar_notas=config.MEMOIZAR_ETAPAS,
+    sinal=None,
+    taxa=None,
+    impressao=None,
+    quantizar=config.QUANTIZAR,
+):
+    """
+    Extrai a melodia do stem vocal usando as configurações do config.py.
+
+    O resultado fica guardado em disco (ver src.notalab.cache_etapas) pelo
+    conteúdo do vocal, pelo tom/BPM da análise e pelos parâmetros de
+    extração; o pitch do vocal é guardado à parte, então mudar só um
+    parâmetro de onset ou de quantização não repete o pyin.
+
+    Args:
+        caminho_vocal (str): Caminho do stem vocal (None se `sinal` for dado)
+        analise (dict): Resultado de analisar_mix
+        memorizar_notas (bool): Reaproveita resultados guardados em disco
+        sinal (np.ndarray): Vocal já em memória (ver stems.separar_vocal)
+        taxa (int): Taxa de amostragem de `sinal`
+        impressao (str): Impressão do vocal em memória para o cache
+        quantizar (bool): Quantiza as notas (False = notas brutas, para
+            quantizar depois com quantizar_notas)
+
+    Returns:
+        Eventos: Notas da melodia
+    """
+    parametros = {**parametros_transcricao(), 'quantizar': quantizar}
+    musica = {'bpm': analise['bpm'], 'tom': analise['tonica'], 'modo': analise['modo']}
+    impressao = impressao or hash_arquivo(caminho_vocal)
+    return memorizar(
+        'notas',
+        impressao,
+        {**parametros_notas(quantizar), **musica},
+        lambda: extrair_notas_vocal(
+            caminho_vocal,
+            memorizar_pitch=memorizar_notas,
+            sinal=sinal,
+            taxa_sinal=taxa,
+            impressao=impressao,
+            **parametros,
+            **musica,
+        ),
+        ativar=memorizar_notas,
+    )
+
+
+def parametros_execucao(taxa=None, com_stems=True, somente_vocal=True):
+    """
+    Parâmetros que afetam algum resultado gravado na pasta de execução.
+
+    Usa as mesmas funções que montam as chaves do cache e os argumentos de
+    cada etapa em processar_faixa, para que não haja parâmetro de fora.
+    """
+    parametros = {
+        'analise': parametros_analise(taxa),
+        'com_stems': com_stems,
+        'somente_vocal': somente_vocal,
+    }
+    if not com_stems:
+        return parametros
+    if somente_vocal:
+        # Com o vocal gravado a etapa também deixa o vocals.wav em disco
+        parametros['vocal'] = {**parametros_vocal(), 'gravar': config.GRAVAR_VOCAL}
+    else:
+        parametros['stems'] = parametros_stems()
+    parametros.update(
+        notas_brutas=parametros_notas(quantizar=False),
+        notas=parametros_quantizacao(),
+        harmonias=parametros_harmonias(),
+        midi=parametros_exportacao(),
+    )
+    return parametros
+
+
+@medir_etapa('pipeline.exportar_midi')
+def exportar_midi(
+    harmonias, caminho_midi, bpm=120, acordes=None, inicios_acordes=None
+):
+    """
+    Grava as harmonias como arquivo MIDI, uma trilha por voz.
+
+    Args:
+        harmonias (dict): Vozes geradas por gerar_harmonias_vocais
+        caminho_midi (str): Caminho do arquivo .mid de saída
+        bpm (int): Andamento gravado no arquivo (as durações das notas estão
+            em quarter notes calculadas com este BPM)
+        acordes (list): Índices de acordes completos (0-35), um por compasso;
+            se informados, viram uma trilha 'Acordes'
+        inicios_acordes (list): Início de cada compasso em segundos (ver
+            detectar_acordes); sem eles, blocos de 4 quarter notes desde 0
+    """
+    trilhas = [(voz, eventos_de_voz(notas)) for voz, notas in harmonias.items()]
+    if acordes:
+        inicios = None
+        if inicios_acordes is not None:
+            inicios = [t * bpm / 60 for t in inicios_acordes]
+        trilhas.append(
+            (
+                'Acordes',
+                eventos_de_acordes(
+                    acordes, NOTAS, duracao=4, completo=True, inicios=inicios
+                ),
+                VELOCIDADE_ACORDES,
+            )
+        )
+    Path(caminho_midi).parent.mkdir(parents=True, exist_ok=True)
+    gravar_smf(caminho_midi, trilhas, bpm=bpm)
+
+
+@medir_etapa('pipeline.exportar_musicxml')
+def exportar_musicxml(harmonias, caminho_xml):
+    """
+    Monta a partitura das harmonias com o music21 e grava como MusicXML.
+
+    Args:
+        harmonias (dict): Vozes geradas por gerar_harmonias_vocais
+        caminho_xml (str): Caminho do arquivo .musicxml de saída
+    """
+    partitura = montar_harmonia(harmonias)
+    Path(caminho_xml).parent.mkdir(parents=True, exist_ok=True)
+    partitura.write('musicxml', fp=str(caminho_xml))
+
+
+def processar_faixa(
+    caminho_audio,
+    caminho_midi,
+    sinal=None,
+    taxa=None,
+    saida_stems='stems',
+    log=print,
+    com_stems=True,
+    concorrente=config.ETAPAS_CONCORRENTES,
+    perfil=config.PERFILAR,
+    memorizar_etapas=config.MEMOIZAR_ETAPAS,
+    somente_vocal=config.SOMENTE_VOCAL,
+    retomar=config.SALVAR_EXECUCAO,
+    nome_stems=None,
+):
+    """
+    Executa o pipeline completo para uma faixa.
+
+    As etapas são organizadas num grafo de dependências (ver
+    src.notalab.agendador): a análise da mixagem e a separação de stems (ou
+    só do vocal, com somente_vocal) são independentes e rodam ao mesmo
+    tempo; a extração vocal espera as duas.
+
+    Com retomar=True cada etapa concluída fica gravada em <midi>.execucao/
+    (ver src.notalab.execucao); se a execução for interrompida, chamar de
+    novo com o mesmo MIDI continua da primeira etapa que faltava.
+
+    Args:
+        caminho_audio (str): Caminho do arquivo de áudio
+        caminho_midi (str): Caminho do arquivo .mid a ser gerado
+        sinal (np.ndarray): Sinal já decodificado (opcional, evita recarregar)
+        taxa (int): Taxa de amostragem do sinal já decodificado
+        saida_stems (str): Pasta onde os stems são salvos
+        log (callable): Função usada para mensagens de progresso
+        com_stems (bool): Se False, só analisa a mixagem (sem separação,
+            transcrição ou MIDI) e nunca importa o TensorFlow
+        concorrente (bool): Se False, executa as etapas uma de cada vez
+        perfil (bool): Mede tempo, memória e contagens de cada etapa (ver
+            src.utils.perfil) e grava <midi>.perfil.json
+        memorizar_etapas (bool): Reaproveita do disco os resultados das
+            etapas cujas entradas e parâmetros não mudaram (ver
+            src.notalab.cache_etapas)
+        somente_vocal (bool): Separa só o vocal (MODELO_VOCAL) e o passa em
+            memória para a extração de notas, sem reler stems do disco
+        retomar (bool): Grava e reaproveita os pontos de retomada da faixa
+        nome_stems (str): Nome da pasta dos stems dentro de saida_stems
+            (padrão: o nome do arquivo de áudio)
+
+    Returns:
+        dict: Resultado da análise com 'notas', 'caminho_midi' (None se não
+        foi possível extrair notas do vocal), 'tempos' (relatório do
+        agendador) e, com perfil=True, 'perfil'
+    """
+    log = log or _silencioso
+    agendador = Agendador(max_threads=None if concorrente else 1)
+
+    def etapa_impressao():
+        # Identifica a faixa pelo conteúdo (chave do cache de etapas)
+        return hash_arquivo(caminho_audio)
+
+    def etapa_analise(impressao):
+        def analisar():
+            # Analisa características do áudio
+            log('\nAnalisando áudio...')
+            if sinal is not None:
+                return analisar_mix(sinal, taxa)
+            return analisar_mix(
+                *carregar_audio(
+                    caminho_audio, sr=config.TAXAS_POR_ETAPA['decodificacao']
+                )
+            )
+
+        analise = memorizar(
+            'analise',
+            impressao,
+            parametros_analise(taxa if sinal is not None else None),
+            analisar,
+            ativar=memorizar_etapas,
+        )
+        log(f"Tonalidade: {analise['tonica']} {analise['modo']}")
+        log('BPM:', analise['bpm'])
+        log(
+            'Acordes detectados:',
+            ', '.join(nome_acorde(idx) for idx in analise['acordes']),
+        )
+        return analise
+
+    def etapa_stems(impressao):
+        from src.notalab.stems import manifesto_valido, pasta_stems, separar_stems
+
+        parametros = parametros_stems()
+
+        def separar():
+            # Separar os stems
+            log('\nSeparando vozes e instrumentos...')
+            log(
+                separar_stems(
+                    caminho_audio,
+                    saida_stems,
+                    parametros['modelo'],
+                    nome=nome_stems,
+                )
+            )
+
+            # Caminho para o arquivo vocal extraído pelo spleeter
+            return os.path.join(
+                pasta_stems(caminho_audio, saida_stems, nome_stems), 'vocals.wav'
+            )
+
+        # Uma cópia renomeada da faixa reaproveita a pasta de stems da original
+        return memorizar(
+            'stems',
+            impressao,
+            parametros,
+            separar,
+            valido=lambda vocal: manifesto_valido(
+                Path(vocal).parent, impressao, parametros['modelo']
+            ),
+            ativar=memorizar_etapas,
+        )
+
+    def vocal_gravado(impressao):
+        # Com GRAVAR_VOCAL o vocals.wav também faz parte do resultado da etapa
+        from src.notalab.stems import manifesto_valido, pasta_stems
+
+        return not config.GRAVAR_VOCAL or manifesto_valido(
+            pasta_stems(caminho_audio, saida_stems, nome_stems),
+            impressao,
+            config.MODELO_VOCAL,
+        )
+
+    def etapa_vocal(impressao):
+        from src.notalab.stems import pasta_stems, separar_vocal
+
+        parametros = parametros_vocal()
+
+        def separar():
+            log('\nSeparando o vocal...')
+            pasta = None
+            if config.GRAVAR_VOCAL:
+                pasta = pasta_stems(caminho_audio, saida_stems, nome_stems)
+            vocal = separar_vocal(
+                caminho_audio,
+                parametros['modelo'],
+                sr=parametros['sr'],
+                pasta=pasta,
+                duracao_bloco=parametros['duracao_bloco'],
+                sobreposicao=parametros['sobreposicao'],
+            )
+            if pasta is not None:
+                log(f"Vocal salvo em '{pasta}'")
+            return vocal
+
+        # O arquivo só é gravado pela separação: um vocal guardado sem ele
+        # (ou cujo arquivo sumiu) não serve quando GRAVAR_VOCAL está ativo
+        sinal_vocal, taxa_vocal = memorizar(
+            'vocal',
+            impressao,
+            {**parametros, 'gravar': config.GRAVAR_VOCAL},
+            separar,
+            valido=lambda _: vocal_gravado(impressao),
+            ativar=memorizar_etapas,
+        )
+        return {
+            'sinal': sinal_vocal,
+            'taxa': taxa_vocal,
+            # O vocal vem da faixa e do modelo: identifica o pitch e as notas
+            'impressao': chave_etapa('vocal', impressao, parametros),
+        }
+
+    def etapa_notas_vocal(analise, vocal):
+        if not len(vocal['sinal']):
+            log('O vocal separado está vazio.')
+            return []
+
+        log('\nExtraindo notas do vocal...')
+        return transcrever_vocal(
+            None, analise, memorizar_notas=memorizar_etapas, quantizar=False, **vocal
+        )
+
+    def etapa_notas(analise, stems):
+        # Verifica se o arquivo de vocal existe
+        if not os.path.exists(stems):
+            log(f'Arquivo vocal não encontrado em: {stems}')
+            return []
+
+        # Extrair notas do vocal (a quantização é a etapa seguinte)
+        log('\nExtraindo notas do vocal...')
+        return transcrever_vocal(
+            stems, analise, memorizar_notas=memorizar_etapas, quantizar=False
+        )
+
+    def etapa_quantizar(analise, notas_brutas):
+        parametros = parametros_quantizacao()
+        return quantizar_notas(
+            notas_brutas,
+            analise['bpm'],
+            parametros['grade'],
+            ativar=parametros['ativar'],
+        )
+
+    def etapa_harmonias(analise, notas):
+        if not notas:
+            log('Não foi possível extrair notas do vocal.')
+            return None
+
+        log(f'Extraídas {len(notas)} notas da melodia vocal; gerando harmonias...')
+        return gerar_harmonias_vocais(
+            notas,
+            tom=analise['tonica'],
+            modo=analise['modo'],
+            variacao=parametros_harmonias()['variacao'],
+        )
+
+    def etapa_midi(analise, harmonias):
+        if harmonias is None:
+            return None
+
+        parametros = parametros_exportacao()
+        exportar_midi(
+            harmonias,
+            caminho_midi,
+            bpm=analise['bpm'],
+            acordes=analise['acordes'] if parametros['acordes'] else None,
+            inicios_acordes=analise.get('inicios_acordes'),
+        )
+        log(f'Arquivo MIDI salvo em: {caminho_midi}')
+        if parametros['musicxml']:
+            caminho_xml = Path(caminho_midi).with_suffix('.musicxml')
+            exportar_musicxml(harmonias, caminho_xml)
+            log(f'Partitura MusicXML salva em: {caminho_xml}')
+        return str(caminho_midi)
+
+    etapas = [('analise', etapa_analise, ['impressao'], None)]
+    if com_stems and somente_vocal:
+        etapas += [
+            (
+                'vocal',
+                etapa_vocal,
+                ['impressao'],
+                lambda _: vocal_gravado(hash_arquivo(caminho_audio)),
+            ),
+            ('notas_brutas', etapa_notas_vocal, ['analise', 'vocal'], None),
+        ]
+    elif com_stems:
+        etapas += [
+            ('stems', etapa_stems, ['impressao'], os.path.exists),
+            ('notas_brutas', etapa_notas, ['analise', 'stems'], None),
+        ]
+    if com_stems:
+        etapas += [
+            ('notas', etapa_quantizar, ['analise', 'notas_brutas'], None),
+            ('harmonias', etapa_harmonias, ['analise', 'notas'], None),
+            (
+                'midi',
+                etapa_midi,
+                ['analise', 'harmonias'],
+                lambda midi: midi is None or os.path.exists(midi),
+            ),
+        ]
+
+    execucao = None
+    if retomar and caminho_midi is not None:
+        execucao = Execucao(
+            pasta_execucao(caminho_midi),
+            hash_arquivo(caminho_audio),
+            parametros_execucao(
+                taxa if sinal is not None else None, com_stems, somente_vocal
+            ),
+            descricao={
+                'audio': str(caminho_audio),
+                'midi': str(caminho_midi),
+                'stems': str(saida_stems),
+                'nome_stems': nome_stems,
+                'com_stems': com_stems,
+                'somente_vocal': somente_vocal,
+            },
+        )
+        if execucao.descartada:
+            log('Áudio ou parâmetros mudaram; a execução anterior foi descartada.')
+        elif execucao.concluidas:
+            log(f"Retomando: {', '.join(execucao.concluidas)} já concluída(s)")
+
+    # Faixa já concluída: os resultados gravados bastam, sem rodar etapa alguma
+    recuperadas = None
+    if execucao is not None and com_stems:
+        recuperadas = execucao.recuperar(
+            ETAPAS_RESULTADO,
+            {nome: valido for nome, _, _, valido in etapas if valido is not None},
+        )
+
+    if recuperadas is None:
+        agendador.adicionar('impressao', etapa_impressao)
+        for nome, funcao, dependencias, valido in etapas:
+            if execucao is not None:
+                funcao = execucao.envolver(nome, funcao, valido)
+            agendador.adicionar(nome, funcao, dependencias)
+
+    with perfilar(caminho_audio) if perfil else nullcontext() as medicao:
+        etapas = {**agendador.executar(), **(recuperadas or {})}
+
+    if execucao is not None and com_stems:
+        # Os intermediários (o vocal separado é o maior) não servem mais
+        execucao.descartar(
+            n for n in execucao.concluidas if n not in ETAPAS_RESULTADO
+        )
+    resultado = etapas['analise']
+    resultado['notas'] = etapas.get('notas', [])
+    resultado['caminho_midi'] = etapas.get('midi')
+    resultado['tempos'] = agendador.relatorio()
+
+    if medicao is not None:
+        resultado['perfil'] = medicao.relatorio()
+        resultado['perfil']['agendador'] = resultado['tempos']
+        caminho_perfil = Path(caminho_midi).with_suffix('.perfil.json')
+        gravar_relatorio(resultado['perfil'], caminho_perfil)
+        log(f'Perfil de desempenho salvo em: {caminho_perfil}')
+
+    tempos = resultado['tempos']
+    log(
+        f"\nTempo total: {tempos['total']:.1f} s; caminho crítico: "
+        f"{' -> '.join(tempos['caminho_critico'])} "
+        f"({tempos['duracao_caminho_critico']:.1f} s)"
+    )
+    return resultado
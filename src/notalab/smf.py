@@ -0,0 +1,195 @@
+"""
+Gravação direta de arquivos MIDI (Standard MIDI File, formato 1).
+
+Escreve os bytes do arquivo a partir das listas de (nota, duração), sem
+montar objetos de partitura: uma trilha por voz e, opcionalmente, uma trilha
+com os acordes detectados. O custo é linear no número de notas; o music21 só
+é necessário para exportar MusicXML (ver src.notalab.notacao).
+"""
+import os
+import struct
+import threading
+
+from src.notalab.acordes import TEMPLATES, notas_acorde
+from src.notalab.escalas import midi_de_nome
+from src.notalab.eventos import Eventos
+
+# Resolução (ticks por quarter note) dos arquivos gravados
+TICKS_POR_QUARTER = 480
+
+# Intensidade das notas das vozes e dos acordes
+VELOCIDADE_VOZES = 90
+VELOCIDADE_ACORDES = 70
+
+
+def _vlq(valor):
+    """Codifica um inteiro como quantidade de tamanho variável (delta-time)."""
+    saida = bytearray([valor & 0x7F])
+    valor >>= 7
+    while valor:
+        saida.insert(0, (valor & 0x7F) | 0x80)
+        valor >>= 7
+    return bytes(saida)
+
+
+def _nota_midi(midi):
+    """
+    Traz a nota para a faixa do MIDI (0-127) em oitavas, preservando a
+    classe da nota; fora dela o byte viraria um status e corromperia a trilha.
+    """
+    midi = int(midi)
+    while midi > 127:
+        midi -= 12
+    while midi < 0:
+        midi += 12
+    return midi
+
+
+def _meta(tipo, dados):
+    """Evento meta com delta-time zero."""
+    return b'\x00\xff' + bytes([tipo]) + _vlq(len(dados)) + dados
+
+
+def _bloco_trilha(dados):
+    return b'MTrk' + struct.pack('>I', len(dados) + 4) + dados + b'\x00\xff\x2f\x00'
+
+
+def eventos_de_voz(notas):
+    """
+    Converte Eventos (ou tuplas (nome, duração)) em (lista de notas MIDI,
+    duração).
+
+    Pausas e nomes inválidos viram listas vazias.
+    """
+    eventos = Eventos.de_notas(notas)
+    return [
+        ([midi] if midi >= 0 else [], duracao)
+        for midi, duracao in zip(eventos.midi.tolist(), eventos.duracao.tolist())
+    ]
+
+
+def eventos_de_acordes(
+    acordes_idx, notas, duracao=4, completo=True, inicios=None
+):
+    """
+    Converte índices de acordes em (lista de notas MIDI, duração).
+
+    Segue as mesmas regras de notacao.montar_acordes: com completo=True os
+    índices são acordes completos (0-35); sem ele, só a raiz em `notas`.
+
+    Args:
+        acordes_idx (list): Índices de acordes, um por compasso
+        notas (list): Nomes das notas (usados sem completo)
+        duracao (float): Duração de cada acorde em quarter notes (sem
+            `inicios`, e a do último acorde com eles)
+        completo (bool): Índices de acordes completos (0-35)
+        inicios (list): Início de cada acorde em quarter notes (ex: os
+            compassos de detectar_acordes); cada acorde vai até o seguinte
+
+    Returns:
+        list: Tuplas (lista de notas MIDI, duração em quarter notes)
+    """
+    limite = len(TEMPLATES) if completo else len(notas)
+    eventos = []
+    duracoes = [duracao] * len(acordes_idx)
+    if inicios is not None and len(inicios):
+        fins = list(inicios[1:]) + [inicios[-1] + duracao]
+        duracoes = [max(fim - inicio, 0.0) for inicio, fim in zip(inicios, fins)]
+        if inicios[0] > 0:
+            # Silêncio até o primeiro compasso detectado
+            eventos.append(([], inicios[0]))
+    for idx, duracao in zip(acordes_idx, duracoes):
+        if idx is None or idx < 0 or idx >= limite:
+            eventos.append(([], duracao))
+        elif completo:
+            eventos.append(
+                ([midi_de_nome(n) for n in notas_acorde(idx)], duracao)
+            )
+        else:
+            eventos.append(([midi_de_nome(f'{notas[idx]}3')], duracao))
+    return eventos
+
+
+def trilha_midi(
+    eventos,
+    nome,
+    canal=0,
+    velocidade=VELOCIDADE_VOZES,
+    ticks_por_quarter=TICKS_POR_QUARTER,
+):
+    """
+    Monta o bloco MTrk de uma sequência de eventos.
+
+    As posições são acumuladas em quarter notes e convertidas para ticks
+    absolutos, então o arredondamento não se acumula ao longo da faixa.
+
+    Args:
+        eventos (list): Tuplas (lista de notas MIDI, duração em quarter notes)
+        nome (str): Nome da trilha
+        canal (int): Canal MIDI (0-15)
+        velocidade (int): Intensidade das notas
+
+    Returns:
+        bytes: Bloco da trilha
+    """
+    nota_on = 0x90 | canal
+    nota_off = 0x80 | canal
+    velocidade = min(max(int(velocidade), 1), 127)
+    dados = bytearray(_meta(0x03, nome.encode('utf-8')))
+
+    posicao = 0.0
+    tick_anterior = 0
+    for midis, duracao in eventos:
+        inicio = round(posicao * ticks_por_quarter)
+        posicao += duracao
+        fim = round(posicao * ticks_por_quarter)
+        if not midis or fim <= inicio:
+            continue
+        midis = list(dict.fromkeys(_nota_midi(m) for m in midis))
+        delta = inicio - tick_anterior
+        for midi in midis:
+            dados += _vlq(delta) + bytes((nota_on, midi, velocidade))
+            delta = 0
+        delta = fim - inicio
+        for midi in midis:
+            dados += _vlq(delta) + bytes((nota_off, midi, 0))
+            delta = 0
+        tick_anterior = fim
+    return _bloco_trilha(bytes(dados))
+
+
+def gravar_smf(
+    caminho, trilhas, bpm=120, ticks_por_quarter=TICKS_POR_QUARTER
+):
+    """
+    Grava um arquivo MIDI formato 1.
+
+    Args:
+        caminho (str): Caminho do arquivo .mid
+        trilhas (list): Tuplas (nome, eventos) ou (nome, eventos, velocidade);
+            cada uma vai para o seu próprio canal
+        bpm (float): Andamento gravado na trilha de tempo
+        ticks_por_quarter (int): Resolução do arquivo
+    """
+    microsegundos = round(60_000_000 / bpm)
+    tempo = (
+        _meta(0x51, microsegundos.to_bytes(3, 'big'))
+        + _meta(0x58, bytes((4, 2, 24, 8)))   # Compasso 4/4
+    )
+    blocos = [_bloco_trilha(tempo)]
+    for canal, trilha in enumerate(trilhas):
+        nome, eventos = trilha[0], trilha[1]
+        velocidade = trilha[2] if len(trilha) > 2 else VELOCIDADE_VOZES
+        # O canal 10 (índice 9) é reservado para percussão
+        canal = canal if canal < 9 else canal + 1
+        blocos.append(
+            trilha_midi(eventos, nome, canal % 16, velocidade, ticks_por_quarter)
+        )
+
+    cabecalho = b'MThd' + struct.pack('>IHHH', 6, 1, len(blocos), ticks_por_quarter)
+    temporario = f'{caminho}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporario, 'wb') as f:
+        f.write(cabecalho)
+        for bloco in blocos:
+            f.write(bloco)
+    os.replace(temporario, caminho)
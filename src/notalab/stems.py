@@ -1,20 +1,434 @@
 """
 Módulo para separação de stems (partes instrumentais) de um arquivo de áudio.
+O Spleeter (e com ele o TensorFlow) só é importado quando um separador é criado.
+
+Faixas longas são separadas em blocos com sobreposição (ver
+separar_em_blocos): cada bloco passa pelo modelo sozinho e os stems são
+emendados com crossfade e gravados à medida que ficam prontos. Quando só o
+vocal interessa, separar_vocal o devolve em memória, sem passar pelo disco.
 """
-from spleeter.separator import Separator
+import json
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from pathlib import Path
+
+import numpy as np
+
+import config.config as config
+from src.notalab.cache_audio import hash_arquivo
+from src.utils.perfil import contar, medir_etapa
+
+# Stems gerados por cada modelo do Spleeter
+INSTRUMENTOS = {
+    'spleeter:2stems': ('vocals', 'accompaniment'),
+    'spleeter:4stems': ('vocals', 'drums', 'bass', 'other'),
+    'spleeter:5stems': ('vocals', 'drums', 'bass', 'piano', 'other'),
+}
+
+NOME_MANIFESTO = 'manifesto.json'
+
+# Taxa de amostragem dos modelos do Spleeter
+TAXA_SPLEETER = 44100
+
+# Separadores já carregados neste processo, um por modelo
+_separadores = {}
+
+# O grafo do TensorFlow de um Separator não aceita duas separações ao mesmo
+# tempo; threads do mesmo processo (ex: o serviço local) se revezam
+_trava_separador = threading.RLock()
+
+
+def _configurar_threads(threads_intra, threads_inter):
+    """Ajusta as threads do TensorFlow antes de ele ser inicializado."""
+    if not threads_intra and not threads_inter:
+        return
+    import tensorflow as tf
+
+    try:
+        if threads_intra:
+            tf.config.threading.set_intra_op_parallelism_threads(threads_intra)
+        if threads_inter:
+            tf.config.threading.set_inter_op_parallelism_threads(threads_inter)
+    except RuntimeError:
+        # O runtime já foi inicializado; mantém a configuração atual
+        pass
+
+
+@medir_etapa('stems.obter_separador')
+def obter_separador(
+    modelo=config.MODELO_STEMS,
+    threads_intra=config.THREADS_TF_INTRA,
+    threads_inter=config.THREADS_TF_INTER,
+    multiprocess=config.SPLEETER_MULTIPROCESS,
+):
+    """
+    Retorna o Separator do modelo, criando-o só na primeira chamada.
+
+    O grafo e os pesos do TensorFlow são carregados uma única vez por
+    processo e reaproveitados em todas as separações seguintes.
+
+    Args:
+        modelo (str): Modelo do Spleeter (ex: 'spleeter:4stems')
+        threads_intra (int): Threads por operação do TensorFlow (0 = padrão)
+        threads_inter (int): Operações paralelas do TensorFlow (0 = padrão)
+        multiprocess (bool): Usa processos auxiliares do Spleeter para gravar
+
+    Returns:
+        Separator: Instância pronta para uso
+    """
+    with _trava_separador:
+        if modelo not in _separadores:
+            _configurar_threads(threads_intra, threads_inter)
+            from spleeter.separator import Separator
+
+            _separadores[modelo] = Separator(modelo, multiprocess=multiprocess)
+        return _separadores[modelo]
+
+
+def pasta_stems(caminho, saida='stems', nome=None):
+    """
+    Retorna a pasta onde ficam os stems de um arquivo de áudio.
+
+    Por padrão a pasta leva o nome do arquivo; `nome` a substitui quando
+    arquivos de pastas diferentes têm o mesmo nome (ver src.cli.lote).
+    """
+    return Path(saida) / (nome or Path(caminho).stem)
+
+
+def manifesto_valido(pasta, impressao, modelo):
+    """Confere se os stems na pasta vieram deste arquivo e deste modelo."""
+    try:
+        with open(pasta / NOME_MANIFESTO, 'r', encoding='utf-8') as f:
+            manifesto = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    if manifesto.get('hash') != impressao or manifesto.get('modelo') != modelo:
+        return False
+    return all(
+        (pasta / nome).is_file() and (pasta / nome).stat().st_size > 0
+        for nome in manifesto.get('arquivos', {}).values()
+    )
+
+
+def _gravar_manifesto(pasta, impressao, modelo, instrumentos=None):
+    """Grava o manifesto de forma atômica."""
+    if instrumentos is None:
+        instrumentos = INSTRUMENTOS.get(modelo, ())
+    manifesto = {
+        'hash': impressao,
+        'modelo': modelo,
+        'arquivos': {i: f'{i}.wav' for i in instrumentos},
+    }
+    temporario = pasta / f'{NOME_MANIFESTO}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2)
+    os.replace(temporario, pasta / NOME_MANIFESTO)
+
+
+def _ler_trecho(caminho, inicio, n_amostras):
+    """
+    Lê n_amostras a partir da amostra `inicio` (na taxa do Spleeter).
+
+    Returns:
+        np.ndarray: Forma de onda estéreo (n_amostras, 2) em float32
+    """
+    import librosa
+
+    onda, _ = librosa.load(
+        caminho,
+        sr=TAXA_SPLEETER,
+        mono=False,
+        offset=inicio / TAXA_SPLEETER,
+        duration=n_amostras / TAXA_SPLEETER,
+    )
+    onda = np.atleast_2d(onda)
+    if onda.shape[0] == 1:
+        onda = np.repeat(onda, 2, axis=0)
+
+    # A reamostragem pode errar o tamanho em uma amostra; o bloco precisa do
+    # tamanho exato para as emendas caírem no lugar certo
+    estereo = np.zeros((n_amostras, 2), dtype=np.float32)
+    n = min(n_amostras, onda.shape[1])
+    estereo[:n] = onda[:2, :n].T
+    return estereo
+
+
+def _separar_trecho(caminho, modelo, inicio, n_amostras):
+    """Separa um bloco da faixa e devolve {instrumento: onda (n, 2)}."""
+    onda = _ler_trecho(caminho, inicio, n_amostras)
+    separador = obter_separador(modelo)
+    with _trava_separador:
+        stems = separador.separate(onda, f'{caminho}@{inicio}')
+    contar('blocos_stems')
+    return {
+        instrumento: np.asarray(stem[:n_amostras], dtype=np.float32)
+        for instrumento, stem in stems.items()
+    }
+
+
+def _iniciar_trabalhador(modelo, threads_tf):
+    """Carrega o Separator de cada processo antes do primeiro bloco."""
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    obter_separador(
+        modelo, threads_intra=threads_tf, threads_inter=1, multiprocess=False
+    )
 
 
-def separar_stems(caminho, saida='stems'):
+def _blocos_separados(caminho, modelo, trechos, processos):
+    """
+    Separa os trechos (inicio, n_amostras) e os devolve na ordem da faixa.
+
+    Com vários processos, no máximo `processos` blocos ficam em andamento ao
+    mesmo tempo, então a memória continua limitada.
+    """
+    if processos <= 1:
+        for inicio, n_amostras in trechos:
+            yield _separar_trecho(caminho, modelo, inicio, n_amostras)
+        return
+
+    threads_tf = max(1, (os.cpu_count() or 1) // processos)
+    # spawn: um fork depois de o TensorFlow ter sido carregado aqui trava
+    with ProcessPoolExecutor(
+        max_workers=processos,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_iniciar_trabalhador,
+        initargs=(modelo, threads_tf),
+    ) as pool:
+        pendentes = deque()
+        for trecho in trechos:
+            pendentes.append(pool.submit(_separar_trecho, caminho, modelo, *trecho))
+            if len(pendentes) >= processos:
+                yield pendentes.popleft().result()
+        while pendentes:
+            yield pendentes.popleft().result()
+
+
+def _emendar_blocos(caminho, modelo, duracao_bloco, sobreposicao, processos):
+    """
+    Separa a faixa em janelas de tamanho fixo e emenda os stems.
+
+    Blocos vizinhos se sobrepõem em `sobreposicao` segundos; nesse trecho o
+    fim de um bloco e o começo do seguinte são somados com pesos cos²/sen²
+    (que somam 1). Cada bloco é devolvido assim que a sua parte sem
+    sobreposição fica pronta, então só um bloco (por processo) e as caudas
+    de sobreposição ficam na memória.
+
+    Yields:
+        dict: {instrumento: onda (n, 2)} com trechos consecutivos da faixa
+    """
+    import librosa
+
+    total = int(round(librosa.get_duration(path=caminho) * TAXA_SPLEETER))
+    if duracao_bloco:
+        bloco = max(1, int(round(duracao_bloco * TAXA_SPLEETER)))
+    else:
+        bloco = max(1, total)
+    n_sobre = min(int(round(sobreposicao * TAXA_SPLEETER)), bloco // 2)
+    passo = bloco - n_sobre
+    n_blocos = 1 + max(0, -(-(total - bloco) // passo))
+    trechos = [
+        (i * passo, min(bloco, total - i * passo)) for i in range(n_blocos)
+    ]
+
+    fase = (np.arange(n_sobre, dtype=np.float32) + 0.5) / max(n_sobre, 1)
+    entrada = (np.sin(0.5 * np.pi * fase) ** 2)[:, None]
+    saida = 1.0 - entrada
+
+    caudas = {}
+    for i, stems in enumerate(
+        _blocos_separados(caminho, modelo, trechos, processos)
+    ):
+        ultimo = i == n_blocos - 1
+        for instrumento, onda in stems.items():
+            cauda = caudas.pop(instrumento, None)
+            if cauda is not None:
+                n = min(len(cauda), len(onda))
+                onda[:n] = cauda[:n] * saida[:n] + onda[:n] * entrada[:n]
+            if not ultimo and n_sobre:
+                caudas[instrumento] = onda[-n_sobre:].copy()
+                stems[instrumento] = onda[:-n_sobre]
+        yield stems
+
+
+def separar_em_blocos(
+    caminho,
+    pasta,
+    modelo=config.MODELO_STEMS,
+    duracao_bloco=config.DURACAO_BLOCO_STEMS,
+    sobreposicao=config.SOBREPOSICAO_STEMS,
+    processos=config.PROCESSOS_STEMS,
+):
+    """
+    Separa a faixa em blocos (ver _emendar_blocos) e grava cada stem em
+    <pasta>/<instrumento>.wav à medida que os blocos ficam prontos.
+
+    Args:
+        caminho (str): Caminho para o arquivo de áudio
+        pasta (Path): Pasta dos stems (ver pasta_stems)
+        modelo (str): Modelo do Spleeter
+        duracao_bloco (float): Duração de cada bloco em segundos
+        sobreposicao (float): Sobreposição entre blocos em segundos
+        processos (int): Blocos separados ao mesmo tempo
+
+    Returns:
+        int: Número de blocos separados
+    """
+    import soundfile as sf
+
+    pasta = Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+    n_blocos = 0
+    with ExitStack() as arquivos:
+        gravadores = {}
+        for stems in _emendar_blocos(
+            caminho, modelo, duracao_bloco, sobreposicao, processos
+        ):
+            n_blocos += 1
+            for instrumento, onda in stems.items():
+                if instrumento not in gravadores:
+                    gravadores[instrumento] = arquivos.enter_context(
+                        sf.SoundFile(
+                            pasta / f'{instrumento}.wav',
+                            'w',
+                            samplerate=TAXA_SPLEETER,
+                            channels=onda.shape[1],
+                            subtype='PCM_16',
+                        )
+                    )
+                gravadores[instrumento].write(np.clip(onda, -1.0, 1.0))
+    return n_blocos
+
+
+@medir_etapa('stems.separar_vocal')
+def separar_vocal(
+    caminho,
+    modelo=config.MODELO_VOCAL,
+    sr=None,
+    pasta=None,
+    duracao_bloco=config.DURACAO_BLOCO_STEMS,
+    sobreposicao=config.SOBREPOSICAO_STEMS,
+    processos=config.PROCESSOS_STEMS,
+):
+    """
+    Separa só o vocal e o devolve em memória, sem gravar os outros stems.
+
+    O Separator recebe a forma de onda direto (Separator.separate), nos
+    mesmos blocos de separar_em_blocos; só o vocal é guardado, já em mono
+    (a memória fica em um bloco mais o vocal mono da faixa).
+
+    Args:
+        caminho (str): Caminho para o arquivo de áudio
+        modelo (str): Modelo do Spleeter (o 2stems é o mais barato)
+        sr (int): Taxa do vocal devolvido (None = taxa do Spleeter)
+        pasta (Path): Se informada, grava também <pasta>/vocals.wav e um
+            manifesto só com o vocal
+        duracao_bloco (float): Duração dos blocos em segundos (0 = a faixa
+            inteira de uma vez)
+        sobreposicao (float): Sobreposição entre blocos em segundos
+        processos (int): Blocos separados ao mesmo tempo
+
+    Returns:
+        tuple: (sinal, taxa) com o vocal mono em float32
+    """
+    contar('separacoes')
+    trechos = []
+    with ExitStack() as arquivos:
+        gravador = None
+        if pasta is not None:
+            import soundfile as sf
+
+            pasta = Path(pasta)
+            pasta.mkdir(parents=True, exist_ok=True)
+            gravador = arquivos.enter_context(
+                sf.SoundFile(
+                    pasta / 'vocals.wav',
+                    'w',
+                    samplerate=TAXA_SPLEETER,
+                    channels=2,
+                    subtype='PCM_16',
+                )
+            )
+        for stems in _emendar_blocos(
+            caminho, modelo, duracao_bloco, sobreposicao, processos
+        ):
+            vocal = stems['vocals']
+            if gravador is not None:
+                gravador.write(np.clip(vocal, -1.0, 1.0))
+            # Mesma mixagem para mono que o librosa.load faz ao reler o stem
+            trechos.append(vocal.mean(axis=1, dtype=np.float32))
+    if pasta is not None:
+        _gravar_manifesto(pasta, hash_arquivo(caminho), modelo, ('vocals',))
+
+    sinal = np.concatenate(trechos) if trechos else np.zeros(0, np.float32)
+    taxa = TAXA_SPLEETER
+    if sr and sr != taxa:
+        import librosa
+
+        sinal, taxa = librosa.resample(sinal, orig_sr=taxa, target_sr=sr), sr
+    return sinal, taxa
+
+
+@medir_etapa('stems.separar_stems')
+def separar_stems(
+    caminho,
+    saida='stems',
+    modelo=config.MODELO_STEMS,
+    reaproveitar=config.REAPROVEITAR_STEMS,
+    duracao_bloco=config.DURACAO_BLOCO_STEMS,
+    sobreposicao=config.SOBREPOSICAO_STEMS,
+    processos=config.PROCESSOS_STEMS,
+    nome=None,
+):
     """
     Separa um arquivo de áudio em stems (vocal, baixo, bateria, outros).
 
+    Se já existirem stems válidos em stems/<nome>/ para o mesmo conteúdo
+    (hash do arquivo) e o mesmo modelo, a separação é pulada. Faixas mais
+    longas que `duracao_bloco` são separadas em blocos (ver separar_em_blocos).
+
     Args:
         caminho (str): Caminho para o arquivo de áudio
         saida (str): Pasta para salvar os stems extraídos
+        modelo (str): Modelo do Spleeter
+        reaproveitar (bool): Pula a separação se o manifesto for válido
+        duracao_bloco (float): Duração dos blocos em segundos (0 = a faixa
+            inteira de uma vez)
+        sobreposicao (float): Sobreposição entre blocos em segundos
+        processos (int): Blocos separados ao mesmo tempo
+        nome (str): Nome da pasta dos stems (padrão: o nome do arquivo)
 
     Returns:
         str: Mensagem de confirmação
     """
-    sep = Separator('spleeter:4stems')
-    sep.separate_to_file(caminho, saida)
-    return f"Stems salvos em '{saida}'"
+    pasta = pasta_stems(caminho, saida, nome)
+    impressao = hash_arquivo(caminho)
+
+    if reaproveitar and manifesto_valido(pasta, impressao, modelo):
+        contar('stems_reaproveitados')
+        return f"Stems já existentes em '{pasta}'"
+
+    contar('separacoes')
+    if duracao_bloco:
+        import librosa
+
+        if librosa.get_duration(path=caminho) > duracao_bloco:
+            n_blocos = separar_em_blocos(
+                caminho, pasta, modelo, duracao_bloco, sobreposicao, processos
+            )
+            _gravar_manifesto(pasta, impressao, modelo)
+            return f"Stems salvos em '{saida}' ({n_blocos} blocos)"
+
+    sep = obter_separador(modelo)
+    with _trava_separador:
+        # O Spleeter usa o nome do arquivo por padrão; fixa a pasta escolhida
+        formato = pasta.name.replace('{', '{{').replace('}', '}}')
+        sep.separate_to_file(
+            caminho, saida, filename_format=f'{formato}/{{instrument}}.{{codec}}'
+        )
+    _gravar_manifesto(pasta, impressao, modelo)
+    return f"Stems salvos em '{pasta}'"
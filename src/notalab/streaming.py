@@ -0,0 +1,261 @@
+"""
+Análise em blocos com memória limitada para gravações muito longas.
+
+O arquivo é lido em blocos de tamanho fixo (com a sobreposição de uma janela
+de FFT) e as features de tom, andamento, cromagrama e onsets são acumuladas
+bloco a bloco. Nenhum estágio guarda o sinal inteiro, então o pico de memória
+não depende da duração da gravação.
+"""
+import librosa
+import numpy as np
+
+import config.config as config
+from src.notalab.acordes import (pontuacao_compassos, pontuar_acordes,
+                                 viterbi_acordes)
+from src.notalab.audio import tom_por_distribuicao
+
+# Janela (em frames do envelope) do tempograma usado na estimativa de BPM
+JANELA_TEMPOGRAMA = 384
+
+# Resolução (em segundos) com que o cromagrama é guardado até o BPM ser conhecido
+CELULA_CROMA = 0.25
+
+# Duração mínima da janela da STFT do cromagrama: notas graves vizinhas só se
+# separam com resolução de frequência fina (8192 amostras a 22050 Hz)
+JANELA_CROMA = 0.35
+
+
+class DetectorOnsetsIncremental:
+    """
+    Escolhe picos do envelope de onset bloco a bloco.
+
+    Os últimos frames de cada bloco só são decididos no bloco seguinte, quando
+    as janelas de máximo/média já enxergam o futuro necessário. O envelope é
+    normalizado pelo maior valor visto até agora, nunca menor que `piso`
+    (evita que o ruído do começo da gravação vire onset).
+    """
+
+    def __init__(self, pre_max, post_max, pre_avg, post_avg, delta, wait, piso=0.0):
+        self.parametros = dict(
+            pre_max=pre_max,
+            post_max=post_max,
+            pre_avg=pre_avg,
+            post_avg=post_avg,
+            delta=delta,
+            wait=wait,
+        )
+        self.margem = int(np.ceil(max(pre_max, post_max, pre_avg, post_avg, wait))) + 1
+        self.buffer = np.zeros(0)
+        self.inicio_buffer = 0  # índice global do primeiro frame do buffer
+        self.decidido_ate = 0  # frames globais < este já foram decididos
+        self.maximo = piso
+        self.onsets = []
+
+    def adicionar(self, envelope, final=False):
+        self.buffer = np.concatenate([self.buffer, envelope])
+        self.maximo = max(self.maximo, float(np.max(envelope, initial=0.0)))
+        if self.maximo <= 0 or len(self.buffer) == 0:
+            return
+
+        # Normalização pelo máximo visto até agora (a global não é conhecida)
+        normalizado = self.buffer / self.maximo
+        picos = librosa.util.peak_pick(normalizado, **self.parametros)
+        if len(picos):
+            picos = librosa.onset.onset_backtrack(picos, normalizado)
+
+        fim_buffer = self.inicio_buffer + len(self.buffer)
+        limite = fim_buffer if final else fim_buffer - self.margem
+        for pico in picos + self.inicio_buffer:
+            if self.decidido_ate <= pico < limite:
+                if not self.onsets or pico - self.onsets[-1] > self.parametros['wait']:
+                    self.onsets.append(int(pico))
+        self.decidido_ate = max(self.decidido_ate, limite)
+
+        # Mantém só o histórico necessário para as janelas do próximo bloco
+        manter = min(len(self.buffer), 4 * self.margem)
+        self.inicio_buffer = fim_buffer - manter
+        self.buffer = self.buffer[len(self.buffer) - manter:]
+
+
+def analisar_em_blocos(
+    caminho,
+    duracao_bloco=config.DURACAO_BLOCO_STREAMING,
+    n_fft=2048,
+    hop_length=512,
+    sensibilidade_onset=config.SENSIBILIDADE_ONSET,
+    pre_max=config.PRE_MAX,
+    post_max=config.POST_MAX,
+    pre_avg=config.PRE_AVG,
+    post_avg=config.POST_AVG,
+    wait=config.WAIT,
+):
+    """
+    Analisa tom, BPM, acordes e onsets lendo o arquivo em blocos.
+
+    Args:
+        caminho (str): Caminho para o arquivo de áudio
+        duracao_bloco (float): Duração aproximada de cada bloco em segundos
+        n_fft (int): Tamanho da janela da STFT
+        hop_length (int): Salto entre frames
+        sensibilidade_onset (float): delta da escolha de picos de onset
+        pre_max, post_max, pre_avg, post_avg, wait: ver config.py
+
+    Returns:
+        dict: Chaves 'tonica', 'modo', 'bpm', 'acordes' (índices completos,
+        ver src.notalab.acordes), 'onsets' (segundos) e 'duracao' (segundos)
+    """
+    taxa = librosa.get_samplerate(caminho)
+    frames_por_bloco = max(1, int(duracao_bloco * taxa / hop_length))
+    n_fft_croma = max(n_fft, 2 ** int(np.ceil(np.log2(JANELA_CROMA * taxa))))
+    tamanho_bloco = (frames_por_bloco - 1) * hop_length + n_fft_croma
+
+    # Blocos consecutivos se sobrepõem em n_fft_croma - hop_length amostras,
+    # então o frame j de cada bloco continua exatamente o bloco anterior
+    fluxo = librosa.stream(
+        caminho,
+        block_length=frames_por_bloco,
+        frame_length=n_fft_croma,
+        hop_length=hop_length,
+        mono=True,
+    )
+
+    # Acumuladores de tamanho fixo
+    soma_croma = np.zeros(12)
+    soma_tempograma = np.zeros(JANELA_TEMPOGRAMA)
+    n_tempograma = 0
+    historico_envelope = np.zeros(JANELA_TEMPOGRAMA - 1)
+    ultimo_mel = None
+    frames_total = 0
+
+    # Cromagrama reduzido a células curtas; agregado por compasso no final
+    frames_por_celula = max(1, int(round(CELULA_CROMA * taxa / hop_length)))
+    celulas = []
+    celula_atual = np.zeros(12)
+    frames_celula = 0
+
+    onsets = DetectorOnsetsIncremental(
+        pre_max, post_max, pre_avg, post_avg, sensibilidade_onset, wait
+    )
+
+    for bloco in fluxo:
+        if len(bloco) < n_fft:
+            continue
+
+        # Frames sem centralização; nos blocos completos, só os frames que
+        # começam antes do próximo bloco (os demais pertencem a ele)
+        potencia = (
+            np.abs(
+                librosa.stft(
+                    bloco, n_fft=n_fft, hop_length=hop_length, center=False
+                )
+            )
+            ** 2
+        )
+        if len(bloco) == tamanho_bloco:
+            potencia = potencia[:, :frames_por_bloco]
+        n_frames = potencia.shape[1]
+
+        # Tom e acordes: cromagrama com janela longa e afinação fixa (igual
+        # em todos os blocos)
+        if len(bloco) >= n_fft_croma:
+            croma = librosa.feature.chroma_stft(
+                S=np.abs(
+                    librosa.stft(
+                        bloco,
+                        n_fft=n_fft_croma,
+                        hop_length=hop_length,
+                        center=False,
+                    )
+                )
+                ** 2,
+                sr=taxa,
+                tuning=0.0,
+            )
+        else:
+            croma = np.zeros((12, 0))
+        soma_croma += croma.sum(axis=1)
+        for coluna in croma.T:
+            celula_atual += coluna
+            frames_celula += 1
+            if frames_celula == frames_por_celula:
+                celulas.append(celula_atual / frames_celula)
+                celula_atual = np.zeros(12)
+                frames_celula = 0
+
+        # Envelope de onset: fluxo espectral mel, emendado com o bloco anterior
+        mel = librosa.power_to_db(
+            librosa.feature.melspectrogram(S=potencia, sr=taxa), top_db=None
+        )
+        anterior = mel[:, :1] if ultimo_mel is None else ultimo_mel
+        envelope = np.maximum(
+            0.0, np.diff(np.concatenate([anterior, mel], axis=1), axis=1)
+        ).mean(axis=0)
+        ultimo_mel = mel[:, -1:]
+        onsets.adicionar(envelope)
+
+        # Andamento: soma das colunas do tempograma terminadas neste bloco
+        janela = np.concatenate([historico_envelope, envelope])
+        tempograma = librosa.feature.tempogram(
+            onset_envelope=janela,
+            sr=taxa,
+            hop_length=hop_length,
+            win_length=JANELA_TEMPOGRAMA,
+            center=False,
+        )
+        soma_tempograma += tempograma.sum(axis=1)
+        n_tempograma += tempograma.shape[1]
+        historico_envelope = janela[-(JANELA_TEMPOGRAMA - 1):]
+
+        frames_total += n_frames
+
+    onsets.adicionar(np.zeros(0), final=True)
+    if frames_celula:
+        celulas.append(celula_atual / frames_celula)
+
+    # Tom a partir da distribuição média de notas
+    dist_notas = soma_croma / max(np.sum(soma_croma), 1e-12)
+    tonica, modo = tom_por_distribuicao(dist_notas)
+
+    # BPM a partir do tempograma médio, com o mesmo prior log-normal do librosa
+    bpm = 120
+    if n_tempograma:
+        tempograma_medio = soma_tempograma / n_tempograma
+        bpms = librosa.tempo_frequencies(
+            JANELA_TEMPOGRAMA, hop_length=hop_length, sr=taxa
+        )
+        with np.errstate(divide='ignore'):
+            log_prior = -0.5 * ((np.log2(bpms) - np.log2(120.0)) / 1.0) ** 2
+        log_prior[: int(np.argmax(bpms < 320.0))] = -np.inf
+        melhor = np.argmax(np.log1p(1e6 * tempograma_medio) + log_prior)
+        bpm = round(float(bpms[melhor]))
+
+    # Acordes: células agrupadas em compassos 4/4 na grade do BPM. Sem as
+    # batidas, a fase do compasso é procurada entre as células de um
+    # compasso, como as 4 fases de detectar_acordes
+    acordes = []
+    if celulas:
+        celulas = np.array(celulas).T
+        segundos_celula = frames_por_celula * hop_length / taxa
+        celulas_por_compasso = max(1.0, 4 * 60 / bpm / segundos_celula)
+        candidatos = []
+        for fase in range(min(int(np.ceil(celulas_por_compasso)), celulas.shape[1])):
+            limites = np.unique(
+                np.round(
+                    np.arange(fase, celulas.shape[1], celulas_por_compasso)
+                ).astype(int)
+            )
+            croma_compassos = librosa.util.sync(celulas, limites, aggregate=np.mean)
+            candidatos.append((pontuar_acordes(croma_compassos), limites))
+        pontuacoes, _ = max(candidatos, key=lambda c: pontuacao_compassos(*c))
+        acordes = [int(i) for i in viterbi_acordes(pontuacoes)]
+
+    return {
+        'tonica': tonica,
+        'modo': modo,
+        'bpm': bpm,
+        'acordes': acordes,
+        'onsets': librosa.frames_to_time(
+            np.array(onsets.onsets, dtype=int), sr=taxa, hop_length=hop_length
+        ),
+        'duracao': frames_total * hop_length / taxa,
+    }
@@ -0,0 +1,402 @@
+"""
+Módulo de varredura e ajuste automático dos parâmetros da extração vocal.
+
+As etapas caras (carregamento, envelope de onset e pitch) são calculadas uma
+única vez por faixa com preparar_vocal; cada combinação de parâmetros só
+refaz a escolha de picos, a segmentação, o agrupamento e a quantização, e é
+pontuada contra um MIDI de referência. A combinação com a melhor pontuação
+média vira um preset no formato de CONFIGS_POR_ESTILO.
+"""
+import itertools
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+import config.config as config
+from src.notalab.audio import tom_por_distribuicao
+from src.notalab.eventos import Eventos
+from src.notalab.harmonia import (agrupar_notas, detectar_onsets,
+                                  preparar_vocal, quantizar_notas,
+                                  segmentar_notas)
+
+# Parâmetros da escolha de picos (uma busca de onsets por combinação)
+PARAMETROS_ONSET = (
+    'sensibilidade_onset',
+    'pre_max',
+    'post_max',
+    'pre_avg',
+    'post_avg',
+    'wait',
+)
+
+
+def _monofonia(notas):
+    """Fração das notas que começam sozinhas (1.0 = trilha monofônica)."""
+    return len({inicio for inicio, _, _ in notas}) / len(notas)
+
+
+def escolher_trilha_melodia(trilhas, nomes=config.NOMES_TRILHA_MELODIA):
+    """
+    Escolhe a trilha que guarda a melodia num MIDI de referência.
+
+    Vale a primeira trilha com notas cujo nome contenha um dos `nomes`;
+    sem nenhuma assim, a mais monofônica (em empate, a mais aguda), para que
+    uma trilha de acordes ou de acompanhamento não vire a melodia só por
+    ter mais notas.
+
+    Args:
+        trilhas (list): Tuplas (nome, notas) de cada trilha
+        nomes (tuple): Trechos de nome que identificam a melodia
+
+    Returns:
+        int: Índice da trilha escolhida
+    """
+    com_notas = [i for i, (_, notas) in enumerate(trilhas) if notas]
+    if not com_notas:
+        raise ValueError('o MIDI de referência não tem notas')
+    for i in com_notas:
+        nome = trilhas[i][0].casefold()
+        if any(trecho in nome for trecho in nomes):
+            return i
+    return max(
+        com_notas,
+        key=lambda i: (
+            round(_monofonia(trilhas[i][1]), 1),
+            np.mean([midi for _, midi, _ in trilhas[i][1]]),
+        ),
+    )
+
+
+def ler_midi_referencia(caminho, trilha=None):
+    """
+    Lê a melodia de um arquivo MIDI de referência.
+
+    Args:
+        caminho (str): Caminho do arquivo .mid
+        trilha (int | str): Índice ou nome da trilha com a melodia (padrão:
+            a escolhida por escolher_trilha_melodia)
+
+    Returns:
+        dict: 'notas' (lista de tuplas (início, midi, duração) em quarter
+        notes, monofônica: em notas simultâneas fica a mais aguda), 'bpm'
+        (do primeiro set_tempo, ou None se não houver) e 'trilha' (nome da
+        trilha lida)
+    """
+    import mido
+
+    arquivo = mido.MidiFile(caminho)
+    por_quarter = arquivo.ticks_per_beat
+
+    bpm = None
+    trilhas = []
+    for faixa in arquivo.tracks:
+        notas = []
+        abertas = {}
+        tick = 0
+        for mensagem in faixa:
+            tick += mensagem.time
+            if mensagem.type == 'set_tempo' and bpm is None:
+                bpm = round(mido.tempo2bpm(mensagem.tempo))
+            elif mensagem.type == 'note_on' and mensagem.velocity > 0:
+                abertas.setdefault(mensagem.note, tick)
+            elif mensagem.type in ('note_off', 'note_on'):
+                inicio = abertas.pop(mensagem.note, None)
+                if inicio is not None and tick > inicio:
+                    notas.append(
+                        (
+                            inicio / por_quarter,
+                            mensagem.note,
+                            (tick - inicio) / por_quarter,
+                        )
+                    )
+        trilhas.append((faixa.name, notas))
+
+    if trilha is None:
+        trilha = escolher_trilha_melodia(trilhas)
+    elif isinstance(trilha, str) and not trilha.isdigit():
+        por_nome = [i for i, (nome, _) in enumerate(trilhas) if nome == trilha]
+        if not por_nome:
+            disponiveis = ', '.join(repr(nome) for nome, _ in trilhas)
+            raise ValueError(
+                f"trilha '{trilha}' não encontrada em {caminho} "
+                f'(trilhas: {disponiveis})'
+            )
+        trilha = por_nome[0]
+    trilha = int(trilha)
+    if not -len(trilhas) <= trilha < len(trilhas):
+        raise ValueError(f'{caminho} tem só {len(trilhas)} trilha(s)')
+    nome, notas = trilhas[trilha]
+
+    # Melodia monofônica: em cada início, só a nota mais aguda
+    melodia = {}
+    for inicio, midi, duracao in notas:
+        if inicio not in melodia or midi > melodia[inicio][1]:
+            melodia[inicio] = (inicio, midi, duracao)
+    return {
+        'notas': sorted(melodia.values()),
+        'bpm': bpm,
+        'trilha': nome or str(trilha),
+    }
+
+
+def tom_da_referencia(notas):
+    """Estima a tonalidade pela duração total de cada classe de nota."""
+    distribuicao = np.zeros(12)
+    for _, midi, duracao in notas:
+        distribuicao[midi % 12] += duracao
+    return tom_por_distribuicao(distribuicao / max(distribuicao.sum(), 1e-12))
+
+
+def pontuar_transcricao(
+    notas, referencia, tolerancia=config.TOLERANCIA_ONSET_AJUSTE
+):
+    """
+    Compara as notas extraídas com a referência nota a nota.
+
+    Uma nota extraída acerta quando tem a mesma altura de uma nota da
+    referência ainda não usada e começa a até `tolerancia` quarter notes dela.
+
+    Args:
+        notas (Eventos | list): Notas de extrair_notas_vocal
+        referencia (list): Tuplas (início, midi, duração) de ler_midi_referencia
+        tolerancia (float): Diferença máxima de início em quarter notes
+
+    Returns:
+        float: Medida F (0 a 1) entre precisão e revocação
+    """
+    # Pausas não entram na comparação
+    eventos = Eventos.de_notas(notas)
+    cantadas = ~eventos.pausas
+    extraidas = list(
+        zip(eventos.onset[cantadas].tolist(), eventos.midi[cantadas].tolist())
+    )
+
+    if not extraidas or not referencia:
+        return 0.0
+
+    # Inícios da referência separados por altura, em ordem, para a busca
+    # binária da janela de tolerância
+    por_altura = {}
+    for inicio_ref, midi, _ in referencia:
+        por_altura.setdefault(midi, []).append(inicio_ref)
+    usadas = set()
+    acertos = 0
+    for inicio, midi in extraidas:
+        inicios_ref = por_altura.get(midi)
+        if not inicios_ref:
+            continue
+        melhor = None
+        for j in range(
+            bisect_left(inicios_ref, inicio - tolerancia),
+            bisect_right(inicios_ref, inicio + tolerancia),
+        ):
+            distancia = abs(inicios_ref[j] - inicio)
+            if (midi, j) not in usadas and (melhor is None or distancia < melhor[0]):
+                melhor = (distancia, j)
+        if melhor is not None:
+            usadas.add((midi, melhor[1]))
+            acertos += 1
+
+    if acertos == 0:
+        return 0.0
+    precisao = acertos / len(extraidas)
+    revocacao = acertos / len(referencia)
+    return 2 * precisao * revocacao / (precisao + revocacao)
+
+
+def _combinacoes(grade, nomes):
+    """Produto cartesiano dos valores da grade para os parâmetros dados."""
+    valores = [grade[nome] for nome in nomes]
+    return [dict(zip(nomes, combinacao)) for combinacao in itertools.product(*valores)]
+
+
+def _combinacoes_agrupamento(grade):
+    """Como _combinacoes, mas sem repetir grades quando quantizar=False."""
+    combinacoes = []
+    for limite in grade['limite_agrupamento']:
+        for quantizar in grade['quantizar']:
+            for grade_q in grade['grade_quantizacao'] if quantizar else [None]:
+                combinacoes.append(
+                    {
+                        'limite_agrupamento': limite,
+                        'quantizar': quantizar,
+                        'grade_quantizacao': grade_q,
+                    }
+                )
+    return combinacoes
+
+
+def preparar_faixas(
+    pares, bpm=None, tom=None, modo=None, trilha=None, log=print
+):
+    """
+    Calcula uma única vez as etapas caras de cada par (vocal, referência).
+
+    Args:
+        pares (list): Tuplas (caminho do vocal, caminho do MIDI de referência)
+        bpm (int): Andamento (padrão: o do MIDI de referência, ou 120)
+        tom (str): Tônica (padrão: estimada a partir da referência)
+        modo (str): 'maior' ou 'menor' (padrão: estimado junto com o tom)
+        trilha (int | str): Trilha da melodia nas referências (ver
+            ler_midi_referencia)
+        log (callable): Função usada para mensagens de progresso
+
+    Returns:
+        list: Um dicionário por faixa com 'vocal', 'referencia', 'bpm', 'tom'
+        e 'modo'
+    """
+    faixas = []
+    for caminho_vocal, caminho_referencia in pares:
+        referencia = ler_midi_referencia(caminho_referencia, trilha)
+        tom_faixa, modo_faixa = tom_da_referencia(referencia['notas'])
+        faixa = {
+            'vocal': preparar_vocal(caminho_vocal),
+            'referencia': referencia['notas'],
+            'bpm': bpm or referencia['bpm'] or 120,
+            'tom': tom or tom_faixa,
+            'modo': modo or modo_faixa,
+        }
+        log(
+            f"{caminho_vocal}: {len(faixa['referencia'])} notas na trilha "
+            f"'{referencia['trilha']}' da referência, "
+            f"{faixa['bpm']} BPM, {faixa['tom']} {faixa['modo']}"
+        )
+        faixas.append(faixa)
+    return faixas
+
+
+def avaliar(faixas, parametros):
+    """
+    Pontua um conjunto de parâmetros (nomes como em GRADE_VARREDURA).
+
+    Returns:
+        float: Pontuação média das faixas
+    """
+    pontuacoes = []
+    for faixa in faixas:
+        onsets = detectar_onsets(
+            faixa['vocal'], **{p: parametros[p] for p in PARAMETROS_ONSET}
+        )
+        segmentos = segmentar_notas(
+            faixa['vocal'],
+            onsets,
+            bpm=faixa['bpm'],
+            min_dur=parametros['min_duracao'],
+            tom=faixa['tom'],
+            modo=faixa['modo'],
+        )
+        notas = agrupar_notas(segmentos, faixa['bpm'], parametros['limite_agrupamento'])
+        notas = quantizar_notas(
+            notas,
+            faixa['bpm'],
+            parametros['grade_quantizacao'],
+            ativar=parametros['quantizar'],
+        )
+        pontuacoes.append(pontuar_transcricao(notas, faixa['referencia']))
+    return float(np.mean(pontuacoes))
+
+
+def varrer_parametros(faixas, grade=config.GRADE_VARREDURA, log=print):
+    """
+    Testa todas as combinações da grade reaproveitando as etapas caras.
+
+    Os laços são aninhados do mais caro para o mais barato: cada combinação
+    de onset escolhe os picos uma vez, cada duração mínima segmenta uma vez e
+    só o agrupamento e a quantização rodam para todas as combinações.
+
+    Args:
+        faixas (list): Resultado de preparar_faixas
+        grade (dict): Valores a testar para cada parâmetro
+        log (callable): Função usada para mensagens de progresso
+
+    Returns:
+        list: Tuplas (pontuação média, parâmetros), da melhor para a pior
+    """
+    combinacoes_onset = _combinacoes(grade, PARAMETROS_ONSET)
+    combinacoes_agrupamento = _combinacoes_agrupamento(grade)
+    total = (
+        len(combinacoes_onset)
+        * len(grade['min_duracao'])
+        * len(combinacoes_agrupamento)
+    )
+    log(f'Testando {total} combinações em {len(faixas)} faixa(s)...')
+
+    # Combinações de onset diferentes costumam escolher os mesmos picos: as
+    # pontuações de agrupamento de uma faixa são guardadas pelos onsets
+    # obtidos e pela duração mínima, e reaproveitadas quando se repetem
+    memoria = {}
+    pontuacoes = {}
+    for i, onset in enumerate(combinacoes_onset):
+        onsets = [detectar_onsets(f['vocal'], **onset) for f in faixas]
+        for min_duracao in grade['min_duracao']:
+            por_faixa = []
+            for n, (f, o) in enumerate(zip(faixas, onsets)):
+                chave_memoria = (n, o.tobytes(), min_duracao)
+                if chave_memoria not in memoria:
+                    segmentos = segmentar_notas(
+                        f['vocal'],
+                        o,
+                        bpm=f['bpm'],
+                        min_dur=min_duracao,
+                        tom=f['tom'],
+                        modo=f['modo'],
+                    )
+                    memoria[chave_memoria] = [
+                        pontuar_transcricao(
+                            quantizar_notas(
+                                agrupar_notas(
+                                    segmentos,
+                                    f['bpm'],
+                                    agrupamento['limite_agrupamento'],
+                                ),
+                                f['bpm'],
+                                agrupamento['grade_quantizacao'],
+                                ativar=agrupamento['quantizar'],
+                            ),
+                            f['referencia'],
+                        )
+                        for agrupamento in combinacoes_agrupamento
+                    ]
+                por_faixa.append(memoria[chave_memoria])
+
+            medias = np.mean(por_faixa, axis=0)
+            for agrupamento, media in zip(combinacoes_agrupamento, medias):
+                chave = tuple(
+                    {**onset, 'min_duracao': min_duracao, **agrupamento}.items()
+                )
+                pontuacoes[chave] = float(media)
+        if (i + 1) % 50 == 0:
+            log(f'  {i + 1}/{len(combinacoes_onset)} combinações de onset')
+
+    ranking = sorted(pontuacoes.items(), key=lambda item: -item[1])
+    return [(pontuacao, dict(chave)) for chave, pontuacao in ranking]
+
+
+def parametros_atuais():
+    """Parâmetros atuais do config.py, com os nomes de GRADE_VARREDURA."""
+    return {
+        'sensibilidade_onset': config.SENSIBILIDADE_ONSET,
+        'pre_max': config.PRE_MAX,
+        'post_max': config.POST_MAX,
+        'pre_avg': config.PRE_AVG,
+        'post_avg': config.POST_AVG,
+        'wait': config.WAIT,
+        'min_duracao': config.MIN_DURACAO_NOTA,
+        'limite_agrupamento': config.LIMITE_AGRUPAMENTO,
+        'quantizar': config.QUANTIZAR,
+        'grade_quantizacao': config.GRADE_QUANTIZACAO,
+    }
+
+
+def montar_preset(parametros):
+    """
+    Converte parâmetros da varredura num preset de CONFIGS_POR_ESTILO.
+
+    Returns:
+        dict: Preset com as chaves de CONFIGS_POR_ESTILO mais os parâmetros
+        avançados de onset
+    """
+    preset = dict(parametros)
+    if preset['grade_quantizacao'] is None:
+        preset['grade_quantizacao'] = config.GRADE_QUANTIZACAO
+    return preset
@@ -0,0 +1,68 @@
+"""
+Medição do tempo de inicialização (importação) dos módulos do NotaLAB.
+Usada para garantir que a linha de comando abre rápido e que as dependências
+pesadas só são carregadas pelas etapas que precisam delas.
+"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import config.config as config
+
+# Dependências pesadas que não devem ser carregadas só por abrir o programa
+MODULOS_PESADOS = ('tensorflow', 'spleeter', 'music21', 'librosa')
+
+_SCRIPT_MEDICAO = '''
+import json, sys, time
+inicio = time.perf_counter()
+import {modulo}
+duracao = time.perf_counter() - inicio
+print(json.dumps({{
+    'segundos': duracao,
+    'pesados': [m for m in {pesados!r} if m in sys.modules],
+}}))
+'''
+
+
+def medir_importacao(modulo='src.cli.app'):
+    """
+    Mede, num interpretador novo, quanto tempo leva para importar um módulo.
+
+    Args:
+        modulo (str): Nome do módulo a importar
+
+    Returns:
+        dict: 'segundos' (tempo de importação) e 'pesados' (dependências
+        pesadas que acabaram carregadas)
+    """
+    raiz = Path(__file__).resolve().parent.parent.parent
+    processo = subprocess.run(
+        [
+            sys.executable,
+            '-c',
+            _SCRIPT_MEDICAO.format(modulo=modulo, pesados=MODULOS_PESADOS),
+        ],
+        cwd=raiz,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(processo.stdout.strip().splitlines()[-1])
+
+
+def verificar_orcamento_importacao(
+    modulo='src.cli.app', orcamento=config.ORCAMENTO_IMPORTACAO_S
+):
+    """
+    Confere se a importação cabe no orçamento e não carrega nada pesado.
+
+    Returns:
+        bool: True se estiver dentro do orçamento
+    """
+    medicao = medir_importacao(modulo)
+    print(f"Importação de {modulo}: {medicao['segundos']:.3f} s "
+          f'(orçamento: {orcamento:.3f} s)')
+    if medicao['pesados']:
+        print('Dependências pesadas carregadas:', ', '.join(medicao['pesados']))
+    return medicao['segundos'] <= orcamento and not medicao['pesados']
@@ -0,0 +1,290 @@
+"""
+Perfil de desempenho opcional das etapas do NotaLAB.
+
+As funções marcadas com @medir_etapa registram tempo de relógio, tempo de CPU
+e pico de memória de cada chamada, e contar() acumula contagens de laços
+internos (chamadas do pyin, segmentos entre onsets, cromagramas calculados...).
+Fora de um bloco perfilar() o decorador só confere uma variável e chama a
+função, então a instrumentação não custa nada quando desligada.
+
+O perfil ativo vale só para o contexto (contextvars) de quem chamou
+perfilar(): outras threads, como a de um segundo pedido do serviço ou uma
+leitura antecipada de áudio, não registram nada nele. O agendador repassa
+o contexto às threads das etapas (ver src.notalab.agendador).
+
+Uso:
+    with perfilar('musica.mp3') as perfil:
+        processar(...)
+    gravar_relatorio(perfil.relatorio(), 'musica.perfil.json')
+"""
+import contextvars
+import functools
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+import config.config as config
+
+try:
+    import resource
+except ImportError:   # Windows não tem o módulo resource
+    resource = None
+
+_MB = 1024 * 1024
+
+# Perfil da faixa em andamento neste contexto (None = instrumentação desligada)
+_perfil_ativo = contextvars.ContextVar('perfil_ativo', default=None)
+
+
+def _pico_rss_mb():
+    """Pico de memória residente do processo em MB (None se indisponível)."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return round(pico / (_MB if sys.platform == 'darwin' else 1024), 1)
+
+
+class Perfil:
+    """
+    Acumula as medições de uma faixa.
+
+    As etapas podem rodar em threads diferentes (ver src.notalab.agendador),
+    então todo registro passa por uma trava. O tempo de CPU é o da thread
+    que executou a etapa; com etapas concorrentes, o pico de memória de uma
+    etapa inclui o que as outras alocaram no mesmo intervalo.
+
+    Args:
+        faixa (str): Identificação da faixa (normalmente o caminho do áudio)
+        memoria (bool): Mede o pico de memória por etapa com tracemalloc
+    """
+
+    def __init__(self, faixa, memoria=config.PERFIL_TRACEMALLOC):
+        self.faixa = str(faixa)
+        self.memoria = memoria
+        self.etapas = {}
+        self.contagens = {}
+        self._trava = threading.Lock()
+        # [memória no início, pico absoluto] de cada etapa em andamento
+        self._abertas = []
+        self._inicio = time.perf_counter()
+        self._inicio_cpu = time.process_time()
+        self._fim = self._fim_cpu = None
+
+    def _abrir_memoria(self):
+        if not self.memoria:
+            return None
+        with self._trava:
+            # Guarda o pico até aqui nas etapas abertas antes de zerá-lo
+            _, pico = tracemalloc.get_traced_memory()
+            for aberta in self._abertas:
+                aberta[1] = max(aberta[1], pico)
+            tracemalloc.reset_peak()
+            atual, _ = tracemalloc.get_traced_memory()
+            marca = [atual, atual]
+            self._abertas.append(marca)
+        return marca
+
+    def _fechar_memoria(self, marca):
+        if marca is None:
+            return None
+        with self._trava:
+            _, pico = tracemalloc.get_traced_memory()
+            marca[1] = max(marca[1], pico)
+            self._abertas.remove(marca)
+            for aberta in self._abertas:
+                aberta[1] = max(aberta[1], marca[1])
+        return (marca[1] - marca[0]) / _MB
+
+    @contextmanager
+    def etapa(self, nome):
+        """Mede o bloco como uma chamada da etapa `nome`."""
+        marca = self._abrir_memoria()
+        inicio = time.perf_counter()
+        inicio_cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            segundos = time.perf_counter() - inicio
+            cpu = time.thread_time() - inicio_cpu
+            pico_mb = self._fechar_memoria(marca)
+            with self._trava:
+                registro = self.etapas.setdefault(
+                    nome,
+                    {
+                        'chamadas': 0,
+                        'segundos': 0.0,
+                        'cpu_segundos': 0.0,
+                        'pico_mb': None,
+                    },
+                )
+                registro['chamadas'] += 1
+                registro['segundos'] += segundos
+                registro['cpu_segundos'] += cpu
+                if pico_mb is not None:
+                    registro['pico_mb'] = max(registro['pico_mb'] or 0.0, pico_mb)
+
+    def contar(self, nome, n=1):
+        """Soma `n` à contagem `nome`."""
+        with self._trava:
+            self.contagens[nome] = self.contagens.get(nome, 0) + n
+
+    def encerrar(self):
+        self._fim = time.perf_counter()
+        self._fim_cpu = time.process_time()
+
+    def relatorio(self):
+        """
+        Monta o relatório da faixa.
+
+        Returns:
+            dict: 'faixa', 'total_segundos', 'cpu_segundos' (todas as threads),
+            'pico_rss_mb', 'etapas' (por nome: chamadas, segundos,
+            cpu_segundos e pico_mb) e 'contagens'
+        """
+        fim = self._fim or time.perf_counter()
+        fim_cpu = self._fim_cpu or time.process_time()
+        with self._trava:
+            etapas = {
+                nome: {
+                    'chamadas': r['chamadas'],
+                    'segundos': round(r['segundos'], 4),
+                    'cpu_segundos': round(r['cpu_segundos'], 4),
+                    'pico_mb': None if r['pico_mb'] is None else round(r['pico_mb'], 2),
+                }
+                for nome, r in sorted(
+                    self.etapas.items(), key=lambda item: -item[1]['segundos']
+                )
+            }
+            contagens = dict(sorted(self.contagens.items()))
+        return {
+            'faixa': self.faixa,
+            'total_segundos': round(fim - self._inicio, 4),
+            'cpu_segundos': round(fim_cpu - self._inicio_cpu, 4),
+            'pico_rss_mb': _pico_rss_mb(),
+            'etapas': etapas,
+            'contagens': contagens,
+        }
+
+
+@contextmanager
+def perfilar(faixa, memoria=config.PERFIL_TRACEMALLOC):
+    """
+    Ativa a instrumentação durante o bloco.
+
+    Args:
+        faixa (str): Identificação da faixa
+        memoria (bool): Mede o pico de memória por etapa com tracemalloc
+
+    Yields:
+        Perfil: Medições acumuladas (use .relatorio() ao final)
+    """
+    perfil = Perfil(faixa, memoria)
+    iniciou_tracemalloc = memoria and not tracemalloc.is_tracing()
+    if iniciou_tracemalloc:
+        tracemalloc.start()
+    marca = _perfil_ativo.set(perfil)
+    try:
+        yield perfil
+    finally:
+        perfil.encerrar()
+        _perfil_ativo.reset(marca)
+        if iniciou_tracemalloc:
+            tracemalloc.stop()
+
+
+def medir_etapa(nome):
+    """
+    Decorador que mede cada chamada da função como a etapa `nome`.
+
+    Args:
+        nome (str): Nome da etapa no relatório (ex: 'audio.detectar_tom')
+    """
+
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            perfil = _perfil_ativo.get()
+            if perfil is None:
+                return funcao(*args, **kwargs)
+            with perfil.etapa(nome):
+                return funcao(*args, **kwargs)
+
+        return envolvida
+
+    return decorador
+
+
+def contar(nome, n=1):
+    """Soma `n` à contagem `nome` do perfil ativo (nada faz se desligado)."""
+    perfil = _perfil_ativo.get()
+    if perfil is not None:
+        perfil.contar(nome, n)
+
+
+def gravar_relatorio(relatorio, caminho):
+    """Grava um relatório (ou resumo) de perfil em JSON."""
+    Path(caminho).parent.mkdir(parents=True, exist_ok=True)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, indent=2, ensure_ascii=False)
+
+
+def resumir_perfis(relatorios, n_mais_lentas=5):
+    """
+    Resume os relatórios de várias faixas (modo lote).
+
+    Args:
+        relatorios (list): Relatórios gerados por Perfil.relatorio
+        n_mais_lentas (int): Quantas faixas mais lentas listar
+
+    Returns:
+        dict: Totais por etapa (soma, média e máximo por faixa), contagens
+        somadas, pico de memória e as faixas mais lentas
+    """
+    etapas = {}
+    contagens = {}
+    for relatorio in relatorios:
+        for nome, r in relatorio['etapas'].items():
+            resumo = etapas.setdefault(
+                nome,
+                {
+                    'faixas': 0,
+                    'chamadas': 0,
+                    'segundos': 0.0,
+                    'max_segundos': 0.0,
+                    'cpu_segundos': 0.0,
+                    'pico_mb': None,
+                },
+            )
+            resumo['faixas'] += 1
+            resumo['chamadas'] += r['chamadas']
+            resumo['segundos'] += r['segundos']
+            resumo['max_segundos'] = max(resumo['max_segundos'], r['segundos'])
+            resumo['cpu_segundos'] += r['cpu_segundos']
+            if r['pico_mb'] is not None:
+                resumo['pico_mb'] = max(resumo['pico_mb'] or 0.0, r['pico_mb'])
+        for nome, n in relatorio['contagens'].items():
+            contagens[nome] = contagens.get(nome, 0) + n
+
+    for resumo in etapas.values():
+        resumo['media_segundos'] = round(resumo['segundos'] / resumo['faixas'], 4)
+        resumo['segundos'] = round(resumo['segundos'], 4)
+        resumo['cpu_segundos'] = round(resumo['cpu_segundos'], 4)
+
+    picos_rss = [r['pico_rss_mb'] for r in relatorios if r['pico_rss_mb'] is not None]
+    mais_lentas = sorted(relatorios, key=lambda r: -r['total_segundos'])
+    return {
+        'faixas': len(relatorios),
+        'total_segundos': round(sum(r['total_segundos'] for r in relatorios), 4),
+        'pico_rss_mb': max(picos_rss) if picos_rss else None,
+        'etapas': dict(sorted(etapas.items(), key=lambda item: -item[1]['segundos'])),
+        'contagens': dict(sorted(contagens.items())),
+        'mais_lentas': [
+            {'faixa': r['faixa'], 'total_segundos': r['total_segundos']}
+            for r in mais_lentas[:n_mais_lentas]
+        ],
+    }